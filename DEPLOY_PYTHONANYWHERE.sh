@@ -19,6 +19,7 @@ python manage.py collectstatic --noinput
 
 # Run migrations
 python manage.py migrate
+python manage.py createcachetable
 
 # Create superuser (interactive)
 echo "Creating superuser..."
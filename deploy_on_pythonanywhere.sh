@@ -57,6 +57,7 @@ pip install --quiet -r "$REPO_DIR/requirements.txt"
 # Step 5: Run migrations
 echo -e "${YELLOW}🗄️  Step 5: Running database migrations...${NC}"
 python manage.py migrate --noinput
+python manage.py createcachetable
 
 # Step 6: Collect static files (IMPORTANT for UI updates!)
 echo -e "${YELLOW}📁 Step 6: Collecting static files...${NC}"
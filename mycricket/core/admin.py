@@ -1,8 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
 from .models import (
-    Team, Player, Match, PlayerMatchStats, Wallet, Transaction,
+    Team, Player, PlayerAlias, Match, MatchPollSchedule, SettlementCheckpoint, PlayerMatchStats, Wallet, Transaction,
     BettingSession, PickedPlayer, Bet, MatchBet, MatchBetBalance, MatchUserExposure
 )
+from .scorecard import Scorecard
+from .session_events import publish_session_event
+from .settlement import settle_match, SettlementError
 
 
 @admin.register(Team)
@@ -24,12 +29,61 @@ class PlayerAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(PlayerAlias)
+class PlayerAliasAdmin(admin.ModelAdmin):
+    list_display = ['player', 'provider', 'external_id', 'created_at']
+    search_fields = ['player__name', 'external_id']
+    list_filter = ['provider']
+    raw_id_fields = ['player']
+
+
 @admin.register(Match)
 class MatchAdmin(admin.ModelAdmin):
     list_display = ['match_title', 'team_a', 'team_b', 'status', 'winner', 'is_settled', 'match_date', 'venue']
     search_fields = ['match_title', 'venue']
     list_filter = ['status', 'is_settled', 'match_date']
     raw_id_fields = ['team_a', 'team_b', 'winner']
+    readonly_fields = ['scorecard']
+    actions = ['settle_sessions']
+
+    @admin.action(description='Settle betting sessions of selected completed matches')
+    def settle_sessions(self, request, queryset):
+        for match in queryset:
+            try:
+                result = settle_match(match)
+            except SettlementError as e:
+                self.message_user(request, f'{match}: {str(e)}', messages.ERROR)
+                continue
+            self.message_user(request, f'{match}: {result}', messages.SUCCESS)
+
+    @admin.display(description='Scorecard')
+    def scorecard(self, obj):
+        """Stored player stats for the match, highest run scorers first"""
+        if not obj.pk:
+            return '-'
+        scorecard = Scorecard.from_match_stats(obj)
+        names = dict(Player.objects.filter(id__in=list(scorecard)).values_list('id', 'name'))
+        lines = sorted(scorecard.items(), key=lambda item: item[1].runs, reverse=True)
+        return format_html_join(
+            mark_safe('<br>'), '{}: {} ({}), {} wkts',
+            ((names.get(player_id, player_id), line.runs, line.balls, line.wickets or 0) for player_id, line in lines)
+        ) or '-'
+
+
+@admin.register(MatchPollSchedule)
+class MatchPollScheduleAdmin(admin.ModelAdmin):
+    list_display = ['match', 'next_poll_at', 'last_polled_at', 'final_poll_done', 'failed_polls']
+    list_filter = ['final_poll_done']
+    raw_id_fields = ['match']
+
+
+@admin.register(SettlementCheckpoint)
+class SettlementCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['match', 'sessions_settled_at', 'match_bets_settled_at', 'sessions_settled', 'bets_settled',
+                    'attempts', 'updated_at']
+    search_fields = ['match__match_title', 'last_error']
+    raw_id_fields = ['match']
+    readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(PlayerMatchStats)
@@ -39,6 +93,12 @@ class PlayerMatchStatsAdmin(admin.ModelAdmin):
     list_filter = ['match', 'player__team']
     raw_id_fields = ['player', 'match']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Settled session pages show these stats; bump their versions so cached pages are rebuilt
+        for session_id in BettingSession.objects.filter(match_id=obj.match_id, status='completed').values_list('id', flat=True):
+            publish_session_event(session_id, 'updated')
+
 
 @admin.register(Wallet)
 class WalletAdmin(admin.ModelAdmin):
@@ -63,7 +123,13 @@ class BettingSessionAdmin(admin.ModelAdmin):
     search_fields = ['better_a__username', 'better_b__username', 'match__match_title']
     list_filter = ['status', 'picks_completed', 'bets_completed', 'created_at']
     raw_id_fields = ['match', 'better_a', 'better_b', 'current_turn', 'toss_winner']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['better_a_team_a_picks', 'better_a_team_b_picks', 'better_b_team_a_picks',
+                       'better_b_team_b_picks', 'total_picks', 'version', 'created_at', 'updated_at']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Let open session pages know about the edit
+        publish_session_event(obj.id, 'updated')
 
 
 @admin.register(PickedPlayer)
@@ -84,6 +150,11 @@ class BetAdmin(admin.ModelAdmin):
     raw_id_fields = ['session', 'better', 'picked_player']
     readonly_fields = ['created_at', 'updated_at']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Settlement corrections: refresh open and cached session pages
+        publish_session_event(obj.session_id, 'updated')
+
 
 @admin.register(MatchBet)
 class MatchBetAdmin(admin.ModelAdmin):
@@ -0,0 +1,135 @@
+"""
+Bulk ingestion helpers for provider data.
+
+Existing rows are loaded by api_id in one query per batch, diffed in memory
+and written with bulk_create/bulk_update, so a sync costs a few queries per
+batch instead of one get_or_create round trip per row.
+"""
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from .models import Team, Player, Match
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+class UpsertResult:
+    """Outcome of an upsert: saved objects by api_id and which keys were created/updated/unchanged"""
+
+    def __init__(self):
+        self.objects = {}
+        self.created = []
+        self.updated = []
+        self.unchanged = []
+
+    def summary(self):
+        return f'{len(self.created)} created, {len(self.updated)} updated, {len(self.unchanged)} unchanged'
+
+
+def bulk_upsert(model, rows, batch_size=BATCH_SIZE):
+    """
+    Create or update model rows keyed by api_id.
+    rows is a list of (api_id, defaults, updates):
+      - defaults: field values used when the row does not exist yet (like get_or_create)
+      - updates: field values applied to an existing row, written only if they differ
+    ForeignKeys are passed by attname (e.g. 'team_id'). When an api_id appears more
+    than once, the first defaults and the merged updates are used.
+    """
+    merged = {}
+    for api_id, defaults, updates in rows:
+        api_id = str(api_id)
+        if api_id in merged:
+            merged[api_id][1].update(updates or {})
+        else:
+            merged[api_id] = (dict(defaults or {}), dict(updates or {}))
+
+    result = UpsertResult()
+    keys = list(merged)
+    for start in range(0, len(keys), batch_size):
+        _upsert_batch(model, keys[start:start + batch_size], merged, result)
+    return result
+
+
+def _upsert_batch(model, keys, merged, result):
+    existing = {obj.api_id: obj for obj in model.objects.filter(api_id__in=keys).order_by()}
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    update_fields = set()
+    for api_id in keys:
+        defaults, updates = merged[api_id]
+        obj = existing.get(api_id)
+        if obj is None:
+            to_create.append(model(api_id=api_id, **defaults))
+            continue
+
+        changed = [field for field, value in updates.items() if getattr(obj, field) != value]
+        if changed:
+            for field in changed:
+                setattr(obj, field, updates[field])
+            # bulk_update does not apply auto_now
+            obj.updated_at = now
+            update_fields.update(changed)
+            to_update.append(obj)
+            result.updated.append(api_id)
+        else:
+            result.unchanged.append(api_id)
+        result.objects[api_id] = obj
+
+    if not to_create and not to_update:
+        return
+
+    with transaction.atomic():
+        if to_create:
+            # ignore_conflicts: another sync may have created the same api_id meanwhile
+            model.objects.bulk_create(to_create, ignore_conflicts=True)
+            created_keys = [obj.api_id for obj in to_create]
+            for obj in model.objects.filter(api_id__in=created_keys).order_by():
+                result.objects[obj.api_id] = obj
+            result.created.extend(created_keys)
+        if to_update:
+            model.objects.bulk_update(to_update, sorted(update_fields | {'updated_at'}))
+
+
+def upsert_teams(rows, batch_size=BATCH_SIZE):
+    """Upsert Team rows: [(api_id, defaults, updates)]"""
+    return bulk_upsert(Team, rows, batch_size)
+
+
+def upsert_players(rows, batch_size=BATCH_SIZE):
+    """Upsert Player rows: [(api_id, defaults, updates)]"""
+    return bulk_upsert(Player, rows, batch_size)
+
+
+def upsert_matches(rows, batch_size=BATCH_SIZE):
+    """Upsert Match rows: [(api_id, defaults, updates)]"""
+    return bulk_upsert(Match, rows, batch_size)
+
+
+def squad_player_rows(squad_data, team_a, team_b):
+    """
+    Build Player upsert rows from a provider squad dict
+    ({'team_a_players': [...], 'team_b_players': [...]}).
+    New players get name/team/role; existing players are moved to the squad's team.
+    Malformed entries (no id or name) are skipped one at a time.
+    """
+    rows = []
+    for team, players in ((team_a, squad_data.get('team_a_players', [])),
+                          (team_b, squad_data.get('team_b_players', []))):
+        for player_data in players:
+            if not isinstance(player_data, dict) or not player_data.get('id') or not player_data.get('name'):
+                continue
+            rows.append((
+                player_data['id'],
+                {
+                    'name': player_data['name'],
+                    'team_id': team.id,
+                    'role': player_data.get('role', 'Player'),
+                },
+                {'team_id': team.id},
+            ))
+    return rows
@@ -0,0 +1,115 @@
+"""
+Live score snapshot helpers.
+
+Scores are fetched from the providers by the poll_live_scores management
+command as a Scorecard and stored in PlayerMatchStats, so request handlers
+only ever read the local snapshot.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+import logging
+
+from .models import PlayerMatchStats, BettingSession
+from .scorecard import Scorecard
+from .session_events import publish_session_events
+from .services import cricket_api, entitysport_api
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TIMEOUT = 30 * 60  # seconds
+
+
+def fetch_scorecard(match):
+    """
+    Fetch the current Scorecard for a match.
+    Tries EntitySport API first (production API), then falls back to cricket_api.
+    Returns an empty Scorecard if no provider had stats.
+    """
+    for api in (entitysport_api, cricket_api):
+        try:
+            score_data = api.get_match_score(match.api_id)
+        except Exception as e:
+            logger.warning(f"{api.provider} score fetch failed for match {match.api_id}: {str(e)}")
+            continue
+        if score_data and score_data.get('player_stats'):
+            return Scorecard.from_player_stats(match, score_data['player_stats'], api.provider)
+
+    return Scorecard(match.id)
+
+
+def _snapshot_key(match_id):
+    return f'scorecard_snapshot:{match_id}'
+
+
+def store_scorecard(match, scorecard):
+    """
+    Delta stage: write a match Scorecard into PlayerMatchStats.
+    The last ingested Scorecard is kept in the cache, so only lines that differ from
+    it are loaded and written (one bulk_create plus one bulk_update). Wickets are only
+    written when the provider gave some.
+    Completed sessions of the match get a new version when stats change, so their
+    cached pages (session_view.get_session_view) are rebuilt with the final runs.
+    Returns the list of Player ids whose stats changed.
+    """
+    if not scorecard:
+        return []
+
+    try:
+        snapshot = cache.get(_snapshot_key(match.id))
+    except Exception as e:
+        logger.warning(f"Scorecard snapshot unavailable for match {match.id}: {str(e)}")
+        snapshot = None
+    if not isinstance(snapshot, Scorecard):
+        # Missing, or left in the cache in an older format
+        snapshot = None
+
+    changed = scorecard.diff(snapshot)
+    if not changed:
+        return []
+
+    existing = {
+        stats.player_id: stats
+        for stats in PlayerMatchStats.objects.filter(match=match, player_id__in=list(changed)).order_by()
+    }
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for player_id, (runs, balls, wickets) in changed.items():
+        stats = existing.get(player_id)
+        if stats is None:
+            to_create.append(PlayerMatchStats(
+                player_id=player_id,
+                match=match,
+                runs_scored=runs,
+                balls_faced=balls,
+                wickets=wickets or 0,
+            ))
+        elif (stats.runs_scored, stats.balls_faced) != (runs, balls) or (wickets is not None and stats.wickets != wickets):
+            stats.runs_scored = runs
+            stats.balls_faced = balls
+            if wickets is not None:
+                stats.wickets = wickets
+            stats.updated_at = now
+            to_update.append(stats)
+
+    with transaction.atomic():
+        if to_create:
+            # ignore_conflicts: sync_matches may have created the row in the meantime
+            PlayerMatchStats.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_update:
+            PlayerMatchStats.objects.bulk_update(to_update, ['runs_scored', 'balls_faced', 'wickets', 'updated_at'])
+        settled = BettingSession.objects.filter(match_id=match.id, status='completed')
+        if settled.update(version=F('version') + 1, updated_at=now):
+            publish_session_events(dict(settled.order_by().values_list('id', 'version')), 'updated')
+
+    # Remember what is now stored, only once the write succeeded
+    snapshot = snapshot.merged(scorecard) if snapshot is not None else scorecard
+    try:
+        cache.set(_snapshot_key(match.id), snapshot, timeout=SNAPSHOT_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not save scorecard snapshot for match {match.id}: {str(e)}")
+
+    return [stats.player_id for stats in to_create] + [stats.player_id for stats in to_update]
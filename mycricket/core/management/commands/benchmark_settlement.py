@@ -0,0 +1,110 @@
+"""
+Django management command to benchmark parallel settlement on generated data.
+Usage: python manage.py benchmark_settlement [--matches 8] [--sessions 500] [--workers 1,2,4]
+
+For each worker count, generates completed matches with betting sessions,
+bets and player stats (api ids prefixed 'bench-'), settles them with
+settle_matches from the stored stats, prints the throughput and removes the
+generated data. Run it against a scratch database. SQLite allows one writer
+at a time (settle_matches then uses a single worker), so throughput only
+scales with workers on Postgres.
+"""
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.utils import timezone
+from decimal import Decimal
+import time
+
+from core.models import Team, Player, Match, PlayerMatchStats, BettingSession, PickedPlayer, Bet
+from core.settlement import settle_matches, summarize
+
+PREFIX = 'bench-'
+PLAYERS_PER_TEAM = 11
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks settle_matches on generated matches for several worker counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matches', type=int, default=8, help='Matches to settle per run (default: 8)')
+        parser.add_argument('--sessions', type=int, default=500, help='Betting sessions per match (default: 500)')
+        parser.add_argument('--picks', type=int, default=5, help='Picks per better (default: 5)')
+        parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts (default: 1,2,4)')
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options['workers'].split(',') if count.strip()]
+        picks = min(options['picks'], PLAYERS_PER_TEAM)
+        self.clear()
+
+        rows = []
+        for workers in worker_counts:
+            match_ids = self.generate(options['matches'], options['sessions'], picks)
+            self.stdout.write(f'Settling {len(match_ids)} matches x {options["sessions"]} sessions '
+                              f'with {workers} workers...')
+            started = time.monotonic()
+            reports = settle_matches(match_ids, workers=workers, fetch_scores=False)
+            rows.append((workers, summarize(reports, time.monotonic() - started)))
+            self.clear()
+
+        self.stdout.write(self.style.SUCCESS('\nworkers  sessions/s  elapsed  p50 match  p95 match  failed'))
+        for workers, summary in rows:
+            self.stdout.write(
+                f"{workers:>7}  {summary['sessions_per_second']:>10.0f}  {summary['elapsed']:>6.2f}s  "
+                f"{summary['p50']:>8.2f}s  {summary['p95']:>8.2f}s  {summary['failed']:>6}"
+            )
+
+    def generate(self, match_count, session_count, picks):
+        """Completed matches with settled-ready sessions; returns the match ids"""
+        now = timezone.now()
+        User.objects.bulk_create([
+            User(username=f'{PREFIX}user-{number}') for number in range(2 * session_count)
+        ])
+        users = list(User.objects.filter(username__startswith=PREFIX).order_by('id'))
+
+        match_ids = []
+        for number in range(match_count):
+            team_a, team_b = Team.objects.bulk_create([
+                Team(api_id=f'{PREFIX}{number}-a', name=f'Bench {number} A'),
+                Team(api_id=f'{PREFIX}{number}-b', name=f'Bench {number} B'),
+            ])
+            match = Match.objects.create(
+                api_id=f'{PREFIX}{number}', team_a=team_a, team_b=team_b, match_title=f'Bench match {number}',
+                match_date=now, status='completed'
+            )
+            Player.objects.bulk_create([
+                Player(api_id=f'{PREFIX}{number}-{team.id}-{index}', name=f'Player {index}', team=team)
+                for team in (team_a, team_b) for index in range(PLAYERS_PER_TEAM)
+            ])
+            players = list(Player.objects.filter(team__in=[team_a, team_b]).order_by('id'))
+            PlayerMatchStats.objects.bulk_create([
+                PlayerMatchStats(player=player, match=match, runs_scored=(index * 7) % 90, balls_faced=index * 3)
+                for index, player in enumerate(players)
+            ])
+
+            BettingSession.objects.bulk_create([
+                BettingSession(
+                    match=match, better_a=users[2 * index], better_b=users[2 * index + 1],
+                    players_per_side=picks, status='betting', picks_completed=True, bets_completed=True,
+                    total_picks=2 * picks
+                )
+                for index in range(session_count)
+            ])
+            sessions = list(BettingSession.objects.filter(match=match).order_by('id'))
+            PickedPlayer.objects.bulk_create([
+                PickedPlayer(session=session, better_id=better_id, player=players[(2 * pick + side) % len(players)])
+                for session in sessions
+                for side, better_id in enumerate((session.better_a_id, session.better_b_id))
+                for pick in range(picks)
+            ])
+            Bet.objects.bulk_create([
+                Bet(session_id=picked.session_id, better_id=picked.better_id, picked_player=picked,
+                    amount_per_run=Decimal('10.00'))
+                for picked in PickedPlayer.objects.filter(session__match=match)
+            ])
+            match_ids.append(match.id)
+        return match_ids
+
+    def clear(self):
+        Match.objects.filter(api_id__startswith=PREFIX).delete()
+        Team.objects.filter(api_id__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
@@ -0,0 +1,179 @@
+"""
+Django management command to benchmark sync_matches --workers against a stub provider.
+Usage: python manage.py benchmark_sync [--matches 30] [--latency 200] [--workers 1,2,4] [--rate 50]
+
+Starts a local HTTP server that answers the EntitySport endpoints sync_matches
+uses (auth, match lists, squads, live scorecards) after a fixed delay, points
+entitysport_api at it and, for each worker count, syncs a fresh set of live
+matches (api ids prefixed 'bench-'), prints the throughput and removes the
+generated data. Requests still go through the shared rate limiter (--rate
+overrides the EntitySport limit for the run) and workers are capped by the
+provider's max_concurrency (settings.PROVIDER_HTTP). Run it against a scratch database.
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import urlsplit, parse_qs
+import json
+import threading
+import time
+
+from core.models import Team, Player, Match
+from core.services import entitysport_api
+from core.management.commands.sync_matches import Command as SyncMatchesCommand
+
+PREFIX = 'bench-'
+PLAYERS_PER_TEAM = 11
+
+
+class StubEntitySport(BaseHTTPRequestHandler):
+    """EntitySport lookalike: every response is delayed by the server's latency"""
+
+    def do_POST(self):
+        self.server.count()
+        expires = (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        self.reply({'token': 'bench', 'expires': expires})
+
+    def do_GET(self):
+        self.server.count()
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')[-3:]
+        if parts[-1] == 'matches':
+            live = parse_qs(url.query).get('status') == ['1']
+            self.reply({'items': self.server.matches() if live else []})
+        elif parts[-1] == 'squads':
+            self.reply({'squad': {side: {'players': self.server.players(parts[-2], side)} for side in ('teama', 'teamb')}})
+        elif parts[-1] == 'live':
+            self.reply({'status': 1, 'scorecard': {'innings': [{'batting': [
+                {'player_id': player['player_id'], 'name': player['name'], 'runs': index * 3, 'balls': index * 2}
+                for index, player in enumerate(self.server.players(parts[-2], 'teama'))
+            ]}]}})
+        else:
+            self.send_error(404)
+
+    def reply(self, response):
+        time.sleep(self.server.latency)
+        body = json.dumps({'status': 'ok', 'response': response}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), StubEntitySport)
+        self.latency = latency
+        self.prefix = PREFIX
+        self.match_count = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v2'
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def matches(self):
+        date = timezone.now().strftime('%Y-%m-%d %H:%M:%S')
+        return [
+            {
+                'match_id': f'{self.prefix}{number}', 'title': f'Bench match {number}', 'status': 1, 'date_start': date,
+                'teama': {'team_id': f'{self.prefix}{number}-a', 'name': f'Bench {number} A'},
+                'teamb': {'team_id': f'{self.prefix}{number}-b', 'name': f'Bench {number} B'},
+            }
+            for number in range(self.match_count)
+        ]
+
+    def players(self, match_id, side):
+        return [
+            {'player_id': f'{match_id}-{side}-{index}', 'name': f'Player {index}', 'role': 'Batsman'}
+            for index in range(PLAYERS_PER_TEAM)
+        ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks sync_matches against a local stub EntitySport server for several worker counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matches', type=int, default=30, help='Live matches to sync per run (default: 30)')
+        parser.add_argument('--latency', type=int, default=200, help='Stub response delay in ms (default: 200)')
+        parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts (default: 1,2,4)')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='EntitySport requests per second for the run (default: settings.PROVIDER_RATE_LIMITS)')
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options['workers'].split(',') if count.strip()]
+        server = StubServer(options['latency'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        rate_limits = None
+        if options['rate']:
+            rate = options['rate']
+            rate_limits = override_settings(PROVIDER_RATE_LIMITS={'entitysport': {'rate': rate, 'burst': max(1, int(rate))}})
+            rate_limits.enable()
+
+        base_url, blocking = entitysport_api.base_url, entitysport_api.blocking
+        token = entitysport_api._token, entitysport_api._token_expires_at
+        shared_token = cache.get(entitysport_api.TOKEN_CACHE_KEY)
+        entitysport_api.base_url, entitysport_api.blocking = server.url, True
+        entitysport_api._token = entitysport_api._token_expires_at = None
+        cache.delete(entitysport_api.TOKEN_CACHE_KEY)
+        # Squads and live data are cached per match id, so every run syncs new ids
+        stamp = int(time.time())
+        rows = []
+        try:
+            self.clear()
+            for run, workers in enumerate(worker_counts):
+                server.prefix = f'{PREFIX}{stamp}-{run}-'
+                server.match_count = options['matches']
+                server.requests = 0
+                self.stdout.write(f'Syncing {options["matches"]} live matches with {workers} workers...')
+
+                command = SyncMatchesCommand(stdout=StringIO(), stderr=StringIO())
+                command.workers = workers
+                started = time.monotonic()
+                command.sync_from_entitysport(update_existing=True)
+                elapsed = time.monotonic() - started
+
+                synced = Match.objects.filter(api_id__startswith=server.prefix).count()
+                players = Player.objects.filter(api_id__startswith=f'entitysport_player_{server.prefix}').count()
+                rows.append((workers, synced, players, server.requests, elapsed))
+                self.clear()
+        finally:
+            # Put back the real token, so the stub's token is never sent to the provider
+            entitysport_api.base_url, entitysport_api.blocking = base_url, blocking
+            entitysport_api._token, entitysport_api._token_expires_at = token
+            if shared_token:
+                cache.set(entitysport_api.TOKEN_CACHE_KEY, shared_token, timeout=None)
+            else:
+                cache.delete(entitysport_api.TOKEN_CACHE_KEY)
+            if rate_limits:
+                rate_limits.disable()
+            server.shutdown()
+            server.server_close()
+
+        baseline = rows[0][4] if rows else 0
+        self.stdout.write(self.style.SUCCESS('\nworkers  matches  players  requests  matches/s  elapsed  speedup'))
+        for workers, synced, players, requests, elapsed in rows:
+            self.stdout.write(
+                f"{workers:>7}  {synced:>7}  {players:>7}  {requests:>8}  {synced / elapsed:>9.1f}  "
+                f"{elapsed:>6.2f}s  {baseline / elapsed:>6.1f}x"
+            )
+
+    def clear(self):
+        Match.objects.filter(api_id__startswith=PREFIX).delete()
+        Team.objects.filter(api_id__startswith=f'entitysport_team_{PREFIX}').delete()
@@ -0,0 +1,68 @@
+"""
+Django management command to poll live match scores into PlayerMatchStats.
+Usage: python manage.py poll_live_scores [--interval 15] [--once]
+
+Each live match is fetched once per interval, so session pages never have to
+call the score APIs themselves.
+"""
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import time
+
+from core.models import Match
+from core.live_scores import fetch_scorecard, store_scorecard
+from core.services import entitysport_api
+
+
+class Command(BaseCommand):
+    help = 'Polls live match scores and stores player stats locally'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=15,
+            help='Seconds between polls of each live match (default: 15)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Poll every live match once and exit',
+        )
+
+    def handle(self, *args, **options):
+        interval = max(1, options['interval'])
+        once = options['once']
+        # Background poller: wait for rate limit tokens and retry with backoff instead of failing fast
+        entitysport_api.blocking = True
+
+        self.stdout.write(self.style.SUCCESS(f'Polling live scores every {interval}s...'))
+
+        try:
+            while True:
+                started = time.monotonic()
+                # Long-running process: drop connections the DB may have closed
+                close_old_connections()
+                self.poll_live_matches()
+
+                if once:
+                    break
+
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nLive score polling stopped.'))
+
+    def poll_live_matches(self):
+        """Fetch the score for every live match and store the changed stats"""
+        live_matches = Match.objects.filter(status='live').select_related('team_a', 'team_b')
+
+        for match in live_matches:
+            try:
+                changed = store_scorecard(match, fetch_scorecard(match))
+                if changed:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✓ {match.team_a.name} vs {match.team_b.name}: {len(changed)} player stats updated'
+                    ))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'✗ Error polling match {match.api_id}: {str(e)}'))
+                continue
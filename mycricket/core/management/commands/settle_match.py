@@ -0,0 +1,62 @@
+"""
+Django management command to settle all betting sessions of completed matches.
+Usage: python manage.py settle_match <match_id> [<match_id> ...] [--chunk-size 500]
+       python manage.py settle_match --all
+
+The final scorecard is fetched once per match and the sessions are settled in
+chunked transactions, so an interrupted run can simply be started again.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+
+from core.models import Match, BettingSession
+from core.settlement import settle_match, SettlementError, CLOSED_STATUSES, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Settles every open betting session of completed matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'match_ids',
+            nargs='*',
+            type=int,
+            help='Match ids to settle',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Settle every completed match that still has open sessions',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Sessions settled per transaction (default: {DEFAULT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            open_sessions = BettingSession.objects.filter(match=OuterRef('pk')).exclude(status__in=CLOSED_STATUSES)
+            matches = Match.objects.filter(status='completed').filter(Exists(open_sessions))
+        elif options['match_ids']:
+            matches = Match.objects.filter(id__in=options['match_ids'])
+        else:
+            raise CommandError('Give match ids or --all')
+
+        chunk_size = max(1, options['chunk_size'])
+        failed = 0
+        for match in matches.select_related('team_a', 'team_b').order_by('match_date'):
+            try:
+                result = settle_match(match, chunk_size=chunk_size, progress=self.report_progress)
+            except SettlementError as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'✗ {match}: {str(e)}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(f'✓ {match}: {result}'))
+
+        if failed:
+            raise CommandError(f'{failed} match(es) could not be settled')
+
+    def report_progress(self, result):
+        self.stdout.write(f'  {result.match}: {result.sessions} sessions settled...')
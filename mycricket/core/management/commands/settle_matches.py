@@ -0,0 +1,96 @@
+"""
+Django management command to settle several completed matches in parallel.
+Usage: python manage.py settle_matches <match_id> [<match_id> ...] [--workers 4]
+       python manage.py settle_matches --all [--stored-stats]
+
+Each match (its betting sessions, then its match bets) is settled by one
+worker process with its own database connection. Progress is kept per match
+in SettlementCheckpoint, so after a crash the same command resumes where it
+stopped. Ends with a throughput and per-match latency summary.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef, Q
+import os
+import time
+
+from core.models import Match, BettingSession
+from core.settlement import settle_matches, summarize, CLOSED_STATUSES, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Settles betting sessions and match bets of completed matches across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'match_ids',
+            nargs='*',
+            type=int,
+            help='Match ids to settle',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Settle every completed match with open sessions or unsettled match bets',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Sessions settled per transaction (default: {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--stored-stats',
+            action='store_true',
+            help='Settle from the stored player stats instead of fetching final scorecards',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            open_sessions = BettingSession.objects.filter(match=OuterRef('pk')).exclude(status__in=CLOSED_STATUSES)
+            match_ids = list(
+                Match.objects.filter(status='completed')
+                .filter(Q(Exists(open_sessions)) | Q(is_settled=False))
+                .order_by('match_date').values_list('id', flat=True)
+            )
+        elif options['match_ids']:
+            match_ids = options['match_ids']
+        else:
+            raise CommandError('Give match ids or --all')
+
+        workers = max(1, options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Settling {len(match_ids)} matches with {workers} workers...'))
+
+        started = time.monotonic()
+        reports = settle_matches(
+            match_ids,
+            workers=workers,
+            chunk_size=max(1, options['chunk_size']),
+            fetch_scores=not options['stored_stats'],
+            progress=self.report_match,
+        )
+        summary = summarize(reports, time.monotonic() - started)
+
+        self.stdout.write(
+            f"\n{summary['matches']} matches ({summary['failed']} failed), {summary['sessions']} sessions, "
+            f"{summary['bets']} bets in {summary['elapsed']:.2f}s: {summary['sessions_per_second']:.0f} sessions/s"
+        )
+        self.stdout.write(
+            f"Per-match latency: p50 {summary['p50']:.2f}s, p95 {summary['p95']:.2f}s, max {summary['max']:.2f}s"
+        )
+        if summary['failed']:
+            raise CommandError(f"{summary['failed']} match(es) could not be settled (see their checkpoints)")
+
+    def report_match(self, report):
+        if report['error']:
+            self.stdout.write(self.style.ERROR(f"✗ {report.get('match', report['match_id'])}: {report['error']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ {report['match']}: {report['sessions']} sessions, {report['bets']} bets, "
+                f"{report['exposures']} match bet users ({report['elapsed']:.2f}s)"
+            ))
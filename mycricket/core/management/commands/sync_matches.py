@@ -1,8 +1,17 @@
 """
 Django management command to sync match data from cricket APIs.
-Usage: python manage.py sync_matches
+Usage: python manage.py sync_matches [--workers 4]
+       python manage.py sync_matches --daemon
+
+--daemon keeps running and polls each match on its own schedule
+(MatchPollSchedule): live matches every few seconds, matches about to start
+every minute, later fixtures hourly, and finished matches once more for the
+final scorecard (retried until one arrives). Failed polls are retried with an
+exponential backoff. Next-due times are stored, so a restart resumes where it left off.
 """
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -11,9 +20,14 @@ try:
 except ImportError:
     requests = None
 import json
+import time
 
-from core.models import Team, Player, Match
-from core.services import cricket_api, odds_api, entitysport_api
+from core.models import Match, MatchPollSchedule
+from core.services import cricket_api, odds_api, entitysport_api, http_transport
+from core.ingestion import upsert_teams, upsert_matches, upsert_players, squad_player_rows
+from core.player_index import invalidate_player_index
+from core.live_scores import store_scorecard
+from core.scorecard import Scorecard, entitysport_player_stats
 
 
 class Command(BaseCommand):
@@ -31,10 +45,31 @@ class Command(BaseCommand):
             action='store_true',
             help='Update existing matches instead of skipping them',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Fetch squads and live data for this many matches concurrently (default: 1)',
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Keep running and poll each match on an interval based on its state (EntitySport only)',
+        )
 
     def handle(self, *args, **options):
         api_type = options['api']
         update_existing = options['update_existing']
+        self.workers = max(1, options['workers'])
+        # Batch job: wait for rate limit tokens and retry with backoff instead of failing fast
+        entitysport_api.blocking = True
+        
+        if options['daemon']:
+            if api_type != 'entitysport':
+                self.stdout.write(self.style.ERROR('--daemon is only supported with --api entitysport'))
+                return
+            self.run_daemon()
+            return
         
         self.stdout.write(self.style.SUCCESS(f'Syncing matches from {api_type} API...'))
 
@@ -57,28 +92,10 @@ class Command(BaseCommand):
         upcoming_matches = cricket_api.get_upcoming_matches()
         
         all_matches = live_matches + upcoming_matches
-        matches_created = 0
-        matches_updated = 0
+        records = []
         
         for match_data in all_matches:
             try:
-                # Get or create teams
-                team_a, _ = Team.objects.get_or_create(
-                    api_id=match_data['team_a']['id'],
-                    defaults={
-                        'name': match_data['team_a']['name'],
-                        'short_name': match_data['team_a'].get('short_name', match_data['team_a']['name'][:3].upper())
-                    }
-                )
-                
-                team_b, _ = Team.objects.get_or_create(
-                    api_id=match_data['team_b']['id'],
-                    defaults={
-                        'name': match_data['team_b']['name'],
-                        'short_name': match_data['team_b'].get('short_name', match_data['team_b']['name'][:3].upper())
-                    }
-                )
-                
                 # Parse match date
                 match_date = datetime.fromisoformat(match_data.get('date', timezone.now().isoformat()))
                 if timezone.is_naive(match_date):
@@ -93,41 +110,21 @@ class Command(BaseCommand):
                 else:
                     status = 'upcoming'
                 
-                # Create or update match
-                match, created = Match.objects.get_or_create(
-                    api_id=match_data['id'],
-                    defaults={
-                        'team_a': team_a,
-                        'team_b': team_b,
-                        'match_title': match_data.get('name', f"{team_a.name} vs {team_b.name}"),
-                        'venue': match_data.get('venue', 'TBA'),
-                        'match_date': match_date,
-                        'status': status,
-                    }
-                )
-                
-                if created:
-                    matches_created += 1
-                    self.stdout.write(self.style.SUCCESS(f'Created match: {match.team_a.name} vs {match.team_b.name}'))
-                elif update_existing:
-                    match.team_a = team_a
-                    match.team_b = team_b
-                    match.match_title = match_data.get('name', f"{team_a.name} vs {team_b.name}")
-                    match.venue = match_data.get('venue', match.venue)
-                    match.match_date = match_date
-                    match.status = status
-                    match.save()
-                    matches_updated += 1
-                    self.stdout.write(self.style.SUCCESS(f'Updated match: {match.team_a.name} vs {match.team_b.name}'))
-                
-                # Sync players for this match
-                self.sync_match_players(match, match_data['id'])
+                records.append(self.match_record(match_data, match_date, status))
                 
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Error syncing match {match_data.get("id", "unknown")}: {str(e)}'))
                 continue
         
-        self.stdout.write(self.style.SUCCESS(f'\nSync complete: {matches_created} created, {matches_updated} updated'))
+        matches = self.ingest_matches(records, update_existing)
+        
+        for record in records:
+            match = matches.objects.get(str(record['match_data']['id']))
+            if match:
+                # Sync players for this match
+                self.sync_match_players(match, record['match_data']['id'])
+        
+        self.stdout.write(self.style.SUCCESS(f'\nSync complete: {matches.summary()}'))
 
     def sync_from_odds_api(self, update_existing):
         """Sync matches from The Odds API"""
@@ -140,74 +137,43 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING('No matches found in the next 24 hours.'))
                 return
             
-            matches_created = 0
-            matches_updated = 0
+            records = []
             
             for match_data in matches_data:
                 try:
-                    # Get or create teams
-                    team_a, _ = Team.objects.get_or_create(
-                        api_id=match_data['team_a']['id'],
-                        defaults={
-                            'name': match_data['team_a']['name'],
-                            'short_name': match_data['team_a']['name'][:3].upper() if len(match_data['team_a']['name']) >= 3 else match_data['team_a']['name'].upper()
-                        }
-                    )
-                    
-                    team_b, _ = Team.objects.get_or_create(
-                        api_id=match_data['team_b']['id'],
-                        defaults={
-                            'name': match_data['team_b']['name'],
-                            'short_name': match_data['team_b']['name'][:3].upper() if len(match_data['team_b']['name']) >= 3 else match_data['team_b']['name'].upper()
-                        }
-                    )
-                    
                     # Parse match date
                     match_date = datetime.fromisoformat(match_data.get('date', timezone.now().isoformat()))
                     if timezone.is_naive(match_date):
                         match_date = timezone.make_aware(match_date)
                     
-                    # Create or update match
-                    match, created = Match.objects.get_or_create(
-                        api_id=match_data['id'],
-                        defaults={
-                            'team_a': team_a,
-                            'team_b': team_b,
-                            'match_title': match_data.get('name', f"{team_a.name} vs {team_b.name}"),
-                            'venue': match_data.get('venue', 'TBA'),
-                            'match_date': match_date,
-                            'status': 'upcoming',
-                        }
-                    )
-                    
-                    if created:
-                        matches_created += 1
-                        self.stdout.write(self.style.SUCCESS(f'✓ Created match: {match.team_a.name} vs {match.team_b.name}'))
-                    elif update_existing:
-                        match.team_a = team_a
-                        match.team_b = team_b
-                        match.match_title = match_data.get('name', f"{team_a.name} vs {team_b.name}")
-                        match.venue = match_data.get('venue', match.venue)
-                        match.match_date = match_date
-                        match.save()
-                        matches_updated += 1
-                        self.stdout.write(self.style.SUCCESS(f'✓ Updated match: {match.team_a.name} vs {match.team_b.name}'))
-                    
-                    # Sync players for this match
-                    sport_key = match_data.get('sport_key', 'cricket_t20')
-                    self.sync_match_players_odds(match, match_data['id'], sport_key, team_a, team_b)
+                    records.append(self.match_record(match_data, match_date, 'upcoming'))
                     
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'✗ Error syncing match {match_data.get("id", "unknown")}: {str(e)}'))
                     continue
             
-            self.stdout.write(self.style.SUCCESS(f'\n✓ Sync complete: {matches_created} created, {matches_updated} updated'))
+            # The Odds API has no match state, so existing statuses are kept
+            matches = self.ingest_matches(records, update_existing, update_status=False)
+            
+            for record in records:
+                match_data = record['match_data']
+                match = matches.objects.get(str(match_data['id']))
+                if match:
+                    # Sync players for this match
+                    sport_key = match_data.get('sport_key', 'cricket_t20')
+                    self.sync_match_players_odds(match, match_data['id'], sport_key, match.team_a, match.team_b)
+            
+            self.stdout.write(self.style.SUCCESS(f'\n✓ Sync complete: {matches.summary()}'))
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error syncing from Odds API: {str(e)}'))
 
-    def sync_from_entitysport(self, update_existing):
-        """Sync matches from EntitySport API (Production-ready)"""
+    def sync_from_entitysport(self, update_existing, with_details=True):
+        """
+        Sync matches from EntitySport API (Production-ready)
+        with_details=False only syncs the fixture list (no squads or live data).
+        Returns the UpsertResult for the matches, or None if the sync failed.
+        """
         self.stdout.write(self.style.SUCCESS('Fetching matches from EntitySport API...'))
         
         try:
@@ -219,10 +185,9 @@ class Command(BaseCommand):
             
             if not all_matches:
                 self.stdout.write(self.style.WARNING('No matches found from EntitySport API.'))
-                return
+                return None
             
-            matches_created = 0
-            matches_updated = 0
+            records = []
             matches_skipped = 0
             
             for match_data in all_matches:
@@ -232,35 +197,6 @@ class Command(BaseCommand):
                         matches_skipped += 1
                         continue
                     
-                    # Get or create teams
-                    team_a, _ = Team.objects.get_or_create(
-                        api_id=match_data['team_a']['id'],
-                        defaults={
-                            'name': match_data['team_a']['name'],
-                            'short_name': match_data['team_a'].get('short_name', match_data['team_a']['name'][:3].upper() if len(match_data['team_a']['name']) >= 3 else match_data['team_a']['name'].upper()),
-                            'logo_url': match_data['team_a'].get('logo_url', '')
-                        }
-                    )
-                    
-                    # Update logo URL if available and different
-                    if match_data['team_a'].get('logo_url') and team_a.logo_url != match_data['team_a']['logo_url']:
-                        team_a.logo_url = match_data['team_a']['logo_url']
-                        team_a.save()
-                    
-                    team_b, _ = Team.objects.get_or_create(
-                        api_id=match_data['team_b']['id'],
-                        defaults={
-                            'name': match_data['team_b']['name'],
-                            'short_name': match_data['team_b'].get('short_name', match_data['team_b']['name'][:3].upper() if len(match_data['team_b']['name']) >= 3 else match_data['team_b']['name'].upper()),
-                            'logo_url': match_data['team_b'].get('logo_url', '')
-                        }
-                    )
-                    
-                    # Update logo URL if available and different
-                    if match_data['team_b'].get('logo_url') and team_b.logo_url != match_data['team_b']['logo_url']:
-                        team_b.logo_url = match_data['team_b']['logo_url']
-                        team_b.save()
-                    
                     # Parse match date
                     match_date_str = match_data.get('date', '')
                     if match_date_str:
@@ -279,207 +215,309 @@ class Command(BaseCommand):
                     if status not in ['live', 'upcoming', 'completed', 'abandoned']:
                         status = 'upcoming'
                     
-                    # Create or update match
-                    match, created = Match.objects.get_or_create(
-                        api_id=match_data['id'],
-                        defaults={
-                            'team_a': team_a,
-                            'team_b': team_b,
-                            'match_title': match_data.get('name', f"{team_a.name} vs {team_b.name}"),
-                            'venue': match_data.get('venue', 'TBA'),
-                            'match_date': match_date,
-                            'status': status,
-                        }
-                    )
-                    
-                    if created:
-                        matches_created += 1
-                        self.stdout.write(self.style.SUCCESS(f'✓ Created match: {match.team_a.name} vs {match.team_b.name} ({status})'))
-                    elif update_existing:
-                        match.team_a = team_a
-                        match.team_b = team_b
-                        match.match_title = match_data.get('name', f"{team_a.name} vs {team_b.name}")
-                        match.venue = match_data.get('venue', match.venue)
-                        match.match_date = match_date
-                        match.status = status
-                        match.save()
-                        matches_updated += 1
-                        self.stdout.write(self.style.SUCCESS(f'✓ Updated match: {match.team_a.name} vs {match.team_b.name} ({status})'))
-                    
-                    # Sync players for this match
-                    self.sync_match_players_entitysport(match, match_data['id'])
-                    
-                    # For live matches, also fetch and store live match data
-                    if status == 'live':
-                        self.sync_live_match_data(match, match_data['id'])
+                    records.append(self.match_record(match_data, match_date, status, with_logo=True))
                     
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'✗ Error syncing match {match_data.get("id", "unknown")}: {str(e)}'))
                     continue
             
-            summary = f'\n✓ Sync complete: {matches_created} created, {matches_updated} updated'
+            matches = self.ingest_matches(records, update_existing)
+            
+            jobs = [
+                (matches.objects[str(record['match_data']['id'])], record)
+                for record in records if str(record['match_data']['id']) in matches.objects
+            ] if with_details else []
+            for match, record, squad_data, live_data in self.fetch_entitysport_details(jobs):
+                # Sync players for this match
+                self.sync_match_players_entitysport(match, record['match_data']['id'], squad_data)
+                
+                # For live matches, also store live match data
+                if record['status'] == 'live':
+                    self.sync_live_match_data(match, record['match_data']['id'], live_data)
+            
+            summary = f'\n✓ Sync complete: {matches.summary()}'
             if matches_skipped > 0:
                 summary += f', {matches_skipped} skipped'
             self.stdout.write(self.style.SUCCESS(summary))
+            return matches
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error syncing from EntitySport API: {str(e)}'))
             import traceback
             self.stdout.write(self.style.ERROR(traceback.format_exc()))
+            return None
 
-    def sync_match_players_entitysport(self, match, match_id):
-        """Sync players for a match from EntitySport API"""
+    def run_daemon(self):
+        """Poll each match when its MatchPollSchedule is due, re-discovering fixtures periodically"""
+        intervals = MatchPollSchedule.get_intervals()
+        discovery_interval = intervals.get('discovery', 600)
+        next_discovery = 0
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Polling scheduler started (live every {intervals['live']}s, fixtures re-listed every {discovery_interval}s)"
+        ))
+        
         try:
-            squad_data = entitysport_api.get_match_squad(match_id)
-            
-            players_synced = 0
-            
-            # Sync Team A players
-            for player_data in squad_data.get('team_a_players', []):
-                try:
-                    player, created = Player.objects.get_or_create(
-                        api_id=player_data['id'],
-                        defaults={
-                            'name': player_data['name'],
-                            'team': match.team_a,
-                            'role': player_data.get('role', 'Player'),
-                        }
-                    )
-                    # Update team if changed
-                    if player.team != match.team_a:
-                        player.team = match.team_a
-                        player.save()
-                    if created:
-                        players_synced += 1
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'  Error syncing player {player_data.get("name", "unknown")}: {str(e)}'))
-                    continue
-            
-            # Sync Team B players
-            for player_data in squad_data.get('team_b_players', []):
-                try:
-                    player, created = Player.objects.get_or_create(
-                        api_id=player_data['id'],
-                        defaults={
-                            'name': player_data['name'],
-                            'team': match.team_b,
-                            'role': player_data.get('role', 'Player'),
-                        }
-                    )
-                    # Update team if changed
-                    if player.team != match.team_b:
-                        player.team = match.team_b
-                        player.save()
-                    if created:
-                        players_synced += 1
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'  Error syncing player {player_data.get("name", "unknown")}: {str(e)}'))
-                    continue
-            
-            if players_synced > 0:
-                self.stdout.write(self.style.SUCCESS(f'  ✓ Synced {players_synced} players for {match.team_a.name} vs {match.team_b.name}'))
+            while True:
+                # Long-running process: drop connections the DB may have closed
+                close_old_connections()
+                
+                if time.monotonic() >= next_discovery:
+                    self.discover_matches()
+                    next_discovery = time.monotonic() + discovery_interval
+                
+                now = timezone.now()
+                due = MatchPollSchedule.objects.filter(next_poll_at__lte=now).select_related(
+                    'match', 'match__team_a', 'match__team_b'
+                ).order_by('next_poll_at')
+                for schedule in due:
+                    self.poll_scheduled_match(schedule)
+                
+                # Sleep until the next poll is due (at most until the next discovery)
+                next_poll_at = MatchPollSchedule.objects.filter(next_poll_at__isnull=False).order_by(
+                    'next_poll_at'
+                ).values_list('next_poll_at', flat=True).first()
+                sleep_for = next_discovery - time.monotonic()
+                if next_poll_at:
+                    sleep_for = min(sleep_for, (next_poll_at - timezone.now()).total_seconds())
+                time.sleep(max(1, sleep_for))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nPolling scheduler stopped.'))
+
+    def discover_matches(self):
+        """Sync the fixture lists and make sure every open match has a poll schedule"""
+        self.sync_from_entitysport(update_existing=True, with_details=False)
+        
+        now = timezone.now()
+        unscheduled = Match.objects.filter(
+            status__in=['live', 'upcoming'], poll_schedule__isnull=True
+        ).values_list('id', flat=True)
+        schedules = [MatchPollSchedule(match_id=match_id, next_poll_at=now) for match_id in unscheduled]
+        if schedules:
+            MatchPollSchedule.objects.bulk_create(schedules, ignore_conflicts=True)
+            self.stdout.write(self.style.SUCCESS(f'✓ Scheduled {len(schedules)} new matches'))
+
+    def poll_scheduled_match(self, schedule):
+        """Run the poll a match's state calls for, then schedule its next one (backing off after failures)"""
+        match = schedule.match
+        now = timezone.now()
+        failed = False
+        try:
+            if match.status in ('completed', 'abandoned'):
+                # One final scorecard pull, then stop polling this match
+                score_data = entitysport_api.get_match_score(match.api_id) or {}
+                scorecard = Scorecard.from_player_stats(match, score_data.get('player_stats'), entitysport_api.provider)
+                if scorecard:
+                    changed = store_scorecard(match, scorecard)
+                    schedule.final_poll_done = True
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✓ Final scorecard for {match.team_a.name} vs {match.team_b.name} ({len(changed)} player stats updated)'
+                    ))
+                else:
+                    # Empty or failed response: keep the match scheduled until a scorecard arrives
+                    self.stdout.write(self.style.WARNING(f'✗ No final scorecard yet for match {match.api_id}'))
+                    failed = True
+            elif match.status == 'live':
+                live_data = entitysport_api.get_match_live_data(match.api_id)
+                self.sync_live_match_data(match, match.api_id, live_data or {})
+                # EntitySport status codes: 1 = live, 2 = completed
+                if isinstance(live_data, dict) and live_data.get('status') == 2:
+                    self.update_match_status(match, 'completed')
             else:
+                details = entitysport_api.get_match_details(match.api_id)
+                if details:
+                    self.update_match_status(match, details['status'])
+                if match.status == 'live' or (match.match_date - now).total_seconds() <= 60 * 60:
+                    # Line-ups are announced shortly before the start
+                    self.sync_match_players_entitysport(match, match.api_id)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'✗ Error polling match {match.api_id}: {str(e)}'))
+            failed = True
+        
+        if failed:
+            schedule.schedule_retry(now)
+        elif match.status in ('completed', 'abandoned') and not schedule.final_poll_done:
+            # A match that just finished still gets its final poll right away
+            schedule.last_polled_at = now
+            schedule.next_poll_at = now
+            schedule.failed_polls = 0
+            schedule.save(update_fields=['last_polled_at', 'next_poll_at', 'failed_polls', 'updated_at'])
+        else:
+            schedule.schedule_next(now)
+
+    def update_match_status(self, match, status):
+        """Store a status change seen while polling"""
+        if status == match.status or status not in dict(Match.STATUS_CHOICES):
+            return
+        Match.objects.filter(pk=match.pk).update(status=status, updated_at=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f'✓ {match.team_a.name} vs {match.team_b.name} is now {status}'))
+        match.status = status
+
+    def match_record(self, match_data, match_date, status, with_logo=False):
+        """Normalize one provider match into the team rows and fields ingest_matches needs"""
+        return {
+            'match_data': match_data,
+            'team_a': self.team_row(match_data['team_a'], with_logo),
+            'team_b': self.team_row(match_data['team_b'], with_logo),
+            'match_date': match_date,
+            'status': status,
+        }
+
+    def team_row(self, team_data, with_logo=False):
+        """Build a Team upsert row; only the logo URL is refreshed on existing teams"""
+        defaults = {
+            'name': team_data['name'],
+            'short_name': team_data.get('short_name', team_data['name'][:3].upper()),
+        }
+        updates = {}
+        if with_logo:
+            defaults['logo_url'] = team_data.get('logo_url', '')
+            # Update logo URL if available and different
+            if team_data.get('logo_url'):
+                updates['logo_url'] = team_data['logo_url']
+        return (team_data['id'], defaults, updates)
+
+    def ingest_matches(self, records, update_existing, update_status=True):
+        """
+        Upsert the teams and matches of all records in bulk.
+        Existing matches are only changed with --update-existing.
+        Returns the UpsertResult for the matches.
+        """
+        teams = upsert_teams(
+            [row for record in records for row in (record['team_a'], record['team_b'])]
+        )
+        
+        match_rows = []
+        for record in records:
+            match_data = record['match_data']
+            team_a = teams.objects[str(record['team_a'][0])]
+            team_b = teams.objects[str(record['team_b'][0])]
+            match_title = match_data.get('name', f"{team_a.name} vs {team_b.name}")
+            
+            defaults = {
+                'team_a_id': team_a.id,
+                'team_b_id': team_b.id,
+                'match_title': match_title,
+                'venue': match_data.get('venue', 'TBA'),
+                'match_date': record['match_date'],
+                'status': record['status'],
+            }
+            updates = {}
+            if update_existing:
+                updates = {
+                    'team_a_id': team_a.id,
+                    'team_b_id': team_b.id,
+                    'match_title': match_title,
+                    'match_date': record['match_date'],
+                }
+                if 'venue' in match_data:
+                    updates['venue'] = match_data['venue']
+                if update_status:
+                    updates['status'] = record['status']
+            match_rows.append((match_data['id'], defaults, updates))
+        
+        matches = upsert_matches(match_rows)
+        
+        # Reuse the team objects loaded above instead of a query per match
+        teams_by_id = {team.id: team for team in teams.objects.values()}
+        for match in matches.objects.values():
+            if match.team_a_id in teams_by_id:
+                match.team_a = teams_by_id[match.team_a_id]
+            if match.team_b_id in teams_by_id:
+                match.team_b = teams_by_id[match.team_b_id]
+        
+        for api_id in matches.created:
+            match = matches.objects[api_id]
+            self.stdout.write(self.style.SUCCESS(f'✓ Created match: {match.team_a.name} vs {match.team_b.name} ({match.status})'))
+        for api_id in matches.updated:
+            match = matches.objects[api_id]
+            self.stdout.write(self.style.SUCCESS(f'✓ Updated match: {match.team_a.name} vs {match.team_b.name} ({match.status})'))
+        
+        return matches
+
+    def fetch_entitysport_details(self, jobs):
+        """
+        Yield (match, record, squad_data, live_data) for each job.
+        Network fetches run on up to --workers threads (capped by the provider's
+        max_concurrency); results are yielded back to the calling thread so all
+        DB writes stay serialized there. A failed fetch is yielded as its exception.
+        """
+        def fetch(match, record, in_worker=False):
+            match_id = record['match_data']['id']
+            try:
+                squad_data = self.try_fetch(entitysport_api.get_match_squad, match_id)
+                live_data = None
+                if record['status'] == 'live':
+                    live_data = self.try_fetch(entitysport_api.get_match_live_data, match_id)
+                return match, record, squad_data, live_data
+            finally:
+                if in_worker:
+                    # Cache lookups open a DB connection per worker thread
+                    connections.close_all()
+        
+        max_concurrency = http_transport.get_config(entitysport_api.provider)['max_concurrency']
+        workers = min(self.workers, max_concurrency, len(jobs))
+        if workers <= 1:
+            for match, record in jobs:
+                yield fetch(match, record)
+            return
+        
+        if self.workers > max_concurrency:
+            self.stdout.write(self.style.WARNING(f'Using {workers} workers (EntitySport max_concurrency is {max_concurrency})'))
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch, match, record, True) for match, record in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def try_fetch(self, fetch, *args):
+        """Call a provider method, returning the exception instead of raising it"""
+        try:
+            return fetch(*args)
+        except Exception as e:
+            return e
+
+    def sync_match_players_entitysport(self, match, match_id, squad_data=None):
+        """Sync players for a match from EntitySport API (squad_data may be prefetched)"""
+        try:
+            if squad_data is None:
+                squad_data = entitysport_api.get_match_squad(match_id)
+            if isinstance(squad_data, Exception):
+                raise squad_data
+            
+            players = upsert_players(squad_player_rows(squad_data, match.team_a, match.team_b))
+            if players.created or players.updated:
+                invalidate_player_index(match.id)
+            
+            if players.created:
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Synced {len(players.created)} players for {match.team_a.name} vs {match.team_b.name}'))
+            elif not players.objects:
                 self.stdout.write(self.style.WARNING(f'  ⚠ No players found for {match.team_a.name} vs {match.team_b.name}'))
                     
         except Exception as e:
             self.stdout.write(self.style.WARNING(f'  Could not sync players for match {match_id}: {str(e)}'))
 
-    def sync_live_match_data(self, match, match_id):
-        """Sync live match data and player stats from EntitySport API"""
+    def sync_live_match_data(self, match, match_id, live_data=None):
+        """Sync live match data and player stats from EntitySport API (live_data may be prefetched)"""
         try:
-            from core.models import PlayerMatchStats
-            
             # Get live match data
-            live_data = entitysport_api.get_match_live_data(match_id)
+            if live_data is None:
+                live_data = entitysport_api.get_match_live_data(match_id)
+            if isinstance(live_data, Exception):
+                raise live_data
             if not live_data:
                 return
             
-            # Extract scorecard and player stats
-            scorecard = live_data.get('scorecard', {})
-            innings = scorecard.get('innings', [])
+            # Latest stats per player across innings, keyed by Player.id
+            scorecard = Scorecard.from_player_stats(
+                match, entitysport_player_stats(live_data), entitysport_api.provider
+            )
             
-            players_updated = 0
+            # Only rows that changed since the last poll are written
+            changed = store_scorecard(match, scorecard)
             
-            # Process each inning
-            for inning in innings:
-                batting = inning.get('batting', [])
-                bowling = inning.get('bowling', [])
-                
-                # Process batting stats
-                for batsman in batting:
-                    try:
-                        player_id = batsman.get('player_id')
-                        if not player_id:
-                            continue
-                        
-                        # Find player by API ID
-                        player_api_id = f"entitysport_player_{player_id}"
-                        try:
-                            player = Player.objects.get(api_id=player_api_id)
-                        except Player.DoesNotExist:
-                            # Try to find by matching name (fallback)
-                            player_name = batsman.get('name', '')
-                            if player_name:
-                                player = Player.objects.filter(name=player_name).first()
-                                if not player:
-                                    continue
-                            else:
-                                continue
-                        
-                        # Get or create player match stats
-                        stats, created = PlayerMatchStats.objects.get_or_create(
-                            player=player,
-                            match=match,
-                            defaults={
-                                'runs_scored': batsman.get('runs', 0),
-                                'balls_faced': batsman.get('balls', 0),
-                                'wickets': 0
-                            }
-                        )
-                        
-                        # Update stats
-                        stats.runs_scored = batsman.get('runs', 0)
-                        stats.balls_faced = batsman.get('balls', 0)
-                        stats.save()
-                        
-                        if created:
-                            players_updated += 1
-                        else:
-                            players_updated += 1
-                            
-                    except Exception as e:
-                        self.stdout.write(self.style.WARNING(f'  Error updating player stats: {str(e)}'))
-                        continue
-                
-                # Process bowling stats (if needed)
-                for bowler in bowling:
-                    try:
-                        player_id = bowler.get('player_id')
-                        if not player_id:
-                            continue
-                        
-                        player_api_id = f"entitysport_player_{player_id}"
-                        try:
-                            player = Player.objects.get(api_id=player_api_id)
-                        except Player.DoesNotExist:
-                            continue
-                        
-                        # Update wickets if available
-                        stats, _ = PlayerMatchStats.objects.get_or_create(
-                            player=player,
-                            match=match,
-                            defaults={'runs_scored': 0, 'balls_faced': 0, 'wickets': 0}
-                        )
-                        
-                        if bowler.get('wickets'):
-                            stats.wickets = bowler.get('wickets', 0)
-                            stats.save()
-                            
-                    except Exception as e:
-                        continue
-            
-            if players_updated > 0:
-                self.stdout.write(self.style.SUCCESS(f'  ✓ Updated {players_updated} player stats for live match'))
+            if changed:
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Updated {len(changed)} player stats for live match'))
                     
         except Exception as e:
             self.stdout.write(self.style.WARNING(f'  Could not sync live data for match {match_id}: {str(e)}'))
@@ -499,28 +537,10 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING('No matches found from CricAPI.'))
                 return
             
-            matches_created = 0
-            matches_updated = 0
+            records = []
             
             for match_data in all_matches:
                 try:
-                    # Get or create teams
-                    team_a, _ = Team.objects.get_or_create(
-                        api_id=match_data['team_a']['id'],
-                        defaults={
-                            'name': match_data['team_a']['name'],
-                            'short_name': match_data['team_a'].get('short_name', match_data['team_a']['name'][:3].upper() if len(match_data['team_a']['name']) >= 3 else match_data['team_a']['name'].upper())
-                        }
-                    )
-                    
-                    team_b, _ = Team.objects.get_or_create(
-                        api_id=match_data['team_b']['id'],
-                        defaults={
-                            'name': match_data['team_b']['name'],
-                            'short_name': match_data['team_b'].get('short_name', match_data['team_b']['name'][:3].upper() if len(match_data['team_b']['name']) >= 3 else match_data['team_b']['name'].upper())
-                        }
-                    )
-                    
                     # Parse match date
                     match_date_str = match_data.get('date', '')
                     if match_date_str:
@@ -543,41 +563,21 @@ class Command(BaseCommand):
                     else:
                         status = 'upcoming'
                     
-                    # Create or update match
-                    match, created = Match.objects.get_or_create(
-                        api_id=match_data['id'],
-                        defaults={
-                            'team_a': team_a,
-                            'team_b': team_b,
-                            'match_title': match_data.get('name', f"{team_a.name} vs {team_b.name}"),
-                            'venue': match_data.get('venue', 'TBA'),
-                            'match_date': match_date,
-                            'status': status,
-                        }
-                    )
-                    
-                    if created:
-                        matches_created += 1
-                        self.stdout.write(self.style.SUCCESS(f'✓ Created match: {match.team_a.name} vs {match.team_b.name} ({status})'))
-                    elif update_existing:
-                        match.team_a = team_a
-                        match.team_b = team_b
-                        match.match_title = match_data.get('name', f"{team_a.name} vs {team_b.name}")
-                        match.venue = match_data.get('venue', match.venue)
-                        match.match_date = match_date
-                        match.status = status
-                        match.save()
-                        matches_updated += 1
-                        self.stdout.write(self.style.SUCCESS(f'✓ Updated match: {match.team_a.name} vs {match.team_b.name} ({status})'))
-                    
-                    # Sync players for this match
-                    self.sync_match_players(match, match_data['id'])
+                    records.append(self.match_record(match_data, match_date, status))
                     
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f'✗ Error syncing match {match_data.get("id", "unknown")}: {str(e)}'))
                     continue
             
-            self.stdout.write(self.style.SUCCESS(f'\n✓ Sync complete: {matches_created} created, {matches_updated} updated'))
+            matches = self.ingest_matches(records, update_existing)
+            
+            for record in records:
+                match = matches.objects.get(str(record['match_data']['id']))
+                if match:
+                    # Sync players for this match
+                    self.sync_match_players(match, record['match_data']['id'])
+            
+            self.stdout.write(self.style.SUCCESS(f'\n✓ Sync complete: {matches.summary()}'))
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error syncing from CricAPI: {str(e)}'))
@@ -595,52 +595,13 @@ class Command(BaseCommand):
                     event_id, sport_key, team_a.name, team_b.name
                 )
             
-            # Sync Team A players
-            players_synced = 0
-            for player_data in squad_data.get('team_a_players', []):
-                try:
-                    player, created = Player.objects.get_or_create(
-                        api_id=player_data['id'],
-                        defaults={
-                            'name': player_data['name'],
-                            'team': team_a,
-                            'role': player_data.get('role', 'Player'),
-                        }
-                    )
-                    # Update team if changed
-                    if player.team != team_a:
-                        player.team = team_a
-                        player.save()
-                    if created:
-                        players_synced += 1
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'  Error syncing player {player_data.get("name", "unknown")}: {str(e)}'))
-                    continue
-            
-            # Sync Team B players
-            for player_data in squad_data.get('team_b_players', []):
-                try:
-                    player, created = Player.objects.get_or_create(
-                        api_id=player_data['id'],
-                        defaults={
-                            'name': player_data['name'],
-                            'team': team_b,
-                            'role': player_data.get('role', 'Player'),
-                        }
-                    )
-                    # Update team if changed
-                    if player.team != team_b:
-                        player.team = team_b
-                        player.save()
-                    if created:
-                        players_synced += 1
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'  Error syncing player {player_data.get("name", "unknown")}: {str(e)}'))
-                    continue
+            players = upsert_players(squad_player_rows(squad_data, team_a, team_b))
+            if players.created or players.updated:
+                invalidate_player_index(match.id)
             
-            if players_synced > 0:
-                self.stdout.write(self.style.SUCCESS(f'  ✓ Synced {players_synced} players for {match.team_a.name} vs {match.team_b.name}'))
-            else:
+            if players.created:
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Synced {len(players.created)} players for {match.team_a.name} vs {match.team_b.name}'))
+            elif not players.objects:
                 self.stdout.write(self.style.WARNING(f'  ⚠ No players found for {match.team_a.name} vs {match.team_b.name}'))
                     
         except Exception as e:
@@ -650,38 +611,9 @@ class Command(BaseCommand):
         """Sync players for a specific match"""
         try:
             squad_data = cricket_api.get_match_squad(match_api_id)
-            
-            # Sync Team A players
-            for player_data in squad_data.get('team_a_players', []):
-                player, _ = Player.objects.get_or_create(
-                    api_id=player_data['id'],
-                    defaults={
-                        'name': player_data['name'],
-                        'team': match.team_a,
-                        'role': player_data.get('role', 'Player'),
-                    }
-                )
-                # Update team if changed
-                if player.team != match.team_a:
-                    player.team = match.team_a
-                    player.save()
-            
-            # Sync Team B players
-            for player_data in squad_data.get('team_b_players', []):
-                player, _ = Player.objects.get_or_create(
-                    api_id=player_data['id'],
-                    defaults={
-                        'name': player_data['name'],
-                        'team': match.team_b,
-                        'role': player_data.get('role', 'Player'),
-                    }
-                )
-                # Update team if changed
-                if player.team != match.team_b:
-                    player.team = match.team_b
-                    player.save()
+            players = upsert_players(squad_player_rows(squad_data, match.team_a, match.team_b))
+            if players.created or players.updated:
+                invalidate_player_index(match.id)
                     
         except Exception as e:
             self.stdout.write(self.style.WARNING(f'Could not sync players for match {match_api_id}: {str(e)}'))
-
-
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_match_is_settled_match_winner_matchuserexposure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(help_text='entitysport, cricapi, odds', max_length=50)),
+                ('external_id', models.CharField(help_text='Player identifier used by the provider', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='core.player')),
+            ],
+            options={
+                'verbose_name_plural': 'Player aliases',
+                'unique_together': {('provider', 'external_id')},
+            },
+        ),
+    ]
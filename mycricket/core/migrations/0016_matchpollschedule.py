@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_playeralias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchPollSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_poll_at', models.DateTimeField(blank=True, db_index=True, help_text='Next poll time (empty = no more polls)', null=True)),
+                ('last_polled_at', models.DateTimeField(blank=True, null=True)),
+                ('final_poll_done', models.BooleanField(default=False, help_text='Final scorecard pulled after the match ended')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('match', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='poll_schedule', to='core.match')),
+            ],
+            options={
+                'ordering': ['next_poll_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_matchpollschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bettingsession',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+COUNTER_FIELDS = [
+    'better_a_team_a_picks', 'better_a_team_b_picks',
+    'better_b_team_a_picks', 'better_b_team_b_picks', 'total_picks',
+]
+
+
+def backfill_pick_counters(apps, schema_editor):
+    """Set the counters of existing sessions from their picks"""
+    BettingSession = apps.get_model('core', 'BettingSession')
+    PickedPlayer = apps.get_model('core', 'PickedPlayer')
+
+    counts = {}
+    for row in PickedPlayer.objects.values('session_id', 'better_id', 'player__team_id').annotate(picks=Count('id')).order_by():
+        counts.setdefault(row['session_id'], []).append(row)
+
+    sessions = []
+    for session in BettingSession.objects.select_related('match').iterator():
+        if session.id not in counts:
+            continue
+        for row in counts[session.id]:
+            side = 'a' if row['better_id'] == session.better_a_id else 'b'
+            if row['player__team_id'] == session.match.team_a_id:
+                field = f'better_{side}_team_a_picks'
+            elif row['player__team_id'] == session.match.team_b_id:
+                field = f'better_{side}_team_b_picks'
+            else:
+                field = None
+            if field:
+                setattr(session, field, getattr(session, field) + row['picks'])
+            session.total_picks += row['picks']
+        sessions.append(session)
+
+    BettingSession.objects.bulk_update(sessions, COUNTER_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_bettingsession_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bettingsession',
+            name='better_a_team_a_picks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bettingsession',
+            name='better_a_team_b_picks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bettingsession',
+            name='better_b_team_a_picks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bettingsession',
+            name='better_b_team_b_picks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bettingsession',
+            name='total_picks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_pick_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_bettingsession_pick_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sessions_settled_at', models.DateTimeField(blank=True, help_text='When all betting sessions were settled', null=True)),
+                ('match_bets_settled_at', models.DateTimeField(blank=True, help_text='When the match bets were settled', null=True)),
+                ('sessions_settled', models.PositiveIntegerField(default=0)),
+                ('bets_settled', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('match', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='settlement_checkpoint', to='core.match')),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
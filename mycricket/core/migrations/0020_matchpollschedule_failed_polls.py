@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_settlementcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchpollschedule',
+            name='failed_polls',
+            field=models.PositiveIntegerField(default=0, help_text='Failed polls in a row (retries back off)'),
+        ),
+    ]
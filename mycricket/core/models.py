@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -42,6 +42,21 @@ class Player(models.Model):
         ordering = ['name']
 
 
+class PlayerAlias(models.Model):
+    """Another provider's identifier for a player (Player.api_id holds the one it was synced with)"""
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='aliases')
+    provider = models.CharField(max_length=50, help_text="entitysport, cricapi, odds")
+    external_id = models.CharField(max_length=100, help_text="Player identifier used by the provider")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['provider', 'external_id']
+        verbose_name_plural = 'Player aliases'
+
+    def __str__(self):
+        return f"{self.player.name} ({self.provider}: {self.external_id})"
+
+
 class Match(models.Model):
     """Cricket match model"""
     STATUS_CHOICES = [
@@ -90,6 +105,104 @@ class PlayerMatchStats(models.Model):
         return f"{self.player.name} - {self.runs_scored} runs in {self.match}"
 
 
+class MatchPollSchedule(models.Model):
+    """When `sync_matches --daemon` next polls a match (persisted so a restart resumes)"""
+    # Default seconds between polls per match state (override with settings.MATCH_POLL_INTERVALS)
+    DEFAULT_INTERVALS = {
+        'live': 10,
+        'imminent': 60,  # starts within the hour
+        'today': 10 * 60,  # starts within 24 hours
+        'upcoming': 60 * 60,
+        'retry_max': 60 * 60,  # longest wait after repeated failed polls
+    }
+
+    match = models.OneToOneField(Match, on_delete=models.CASCADE, related_name='poll_schedule')
+    next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                        help_text="Next poll time (empty = no more polls)")
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+    final_poll_done = models.BooleanField(default=False, help_text="Final scorecard pulled after the match ended")
+    failed_polls = models.PositiveIntegerField(default=0, help_text="Failed polls in a row (retries back off)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['next_poll_at']
+
+    def __str__(self):
+        return f"{self.match} - next poll {self.next_poll_at}"
+
+    @classmethod
+    def get_intervals(cls):
+        from django.conf import settings
+        intervals = dict(cls.DEFAULT_INTERVALS)
+        intervals.update(getattr(settings, 'MATCH_POLL_INTERVALS', {}))
+        return intervals
+
+    @classmethod
+    def interval_for(cls, match, now):
+        """Seconds until the next poll of a match, or None for a finished match"""
+        if match.status in ('completed', 'abandoned'):
+            return None
+        intervals = cls.get_intervals()
+        if match.status == 'live':
+            return intervals['live']
+        starts_in = (match.match_date - now).total_seconds()
+        if starts_in <= 60 * 60:
+            return intervals['imminent']
+        if starts_in <= 24 * 60 * 60:
+            return intervals['today']
+        return intervals['upcoming']
+
+    def schedule_next(self, now):
+        """Record a poll and set next_poll_at from the match's current state"""
+        from datetime import timedelta
+        interval = self.interval_for(self.match, now)
+        self.last_polled_at = now
+        self.next_poll_at = now + timedelta(seconds=interval) if interval else None
+        self.failed_polls = 0
+        self.save(update_fields=['last_polled_at', 'next_poll_at', 'final_poll_done', 'failed_polls', 'updated_at'])
+
+    def schedule_retry(self, now):
+        """
+        Record a failed poll and retry after the match's interval (the live interval for a
+        finished match still missing its final scorecard), doubled for each failure in a row
+        up to the 'retry_max' interval.
+        """
+        from datetime import timedelta
+        intervals = self.get_intervals()
+        interval = self.interval_for(self.match, now) or intervals['live']
+        self.failed_polls += 1
+        delay = min(interval * 2 ** (self.failed_polls - 1), max(interval, intervals['retry_max']))
+        self.last_polled_at = now
+        self.next_poll_at = now + timedelta(seconds=delay)
+        self.save(update_fields=['last_polled_at', 'next_poll_at', 'failed_polls', 'updated_at'])
+
+
+class SettlementCheckpoint(models.Model):
+    """Settlement progress of a match (`settle_matches`), so a crashed run resumes where it stopped"""
+    match = models.OneToOneField(Match, on_delete=models.CASCADE, related_name='settlement_checkpoint')
+    sessions_settled_at = models.DateTimeField(null=True, blank=True,
+                                               help_text="When all betting sessions were settled")
+    match_bets_settled_at = models.DateTimeField(null=True, blank=True,
+                                                 help_text="When the match bets were settled")
+    sessions_settled = models.PositiveIntegerField(default=0)
+    bets_settled = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"{self.match} - {'settled' if self.is_done else 'in progress'}"
+
+    @property
+    def is_done(self):
+        return self.sessions_settled_at is not None and self.match_bets_settled_at is not None
+
+
 class Wallet(models.Model):
     """User wallet to track balance"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
@@ -102,17 +215,14 @@ class Wallet(models.Model):
         return f"{self.user.username} - ₹{self.balance}"
 
     def deposit(self, amount):
-        """Add money to wallet"""
-        self.balance += amount
-        self.save()
+        """Add money to wallet (one conditional UPDATE, see wallet_ops)"""
+        from .wallet_ops import change_balance
+        change_balance(self, amount)
 
     def withdraw(self, amount):
-        """Deduct money from wallet"""
-        if self.balance >= amount:
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        """Deduct money from wallet; False if the balance does not cover it"""
+        from .wallet_ops import change_balance
+        return change_balance(self, -amount)
 
 
 class Transaction(models.Model):
@@ -174,16 +284,67 @@ class BettingSession(models.Model):
     picks_completed = models.BooleanField(default=False)
     bets_completed = models.BooleanField(default=False)
     
+    # Pick counters per better and team, incremented by pick_player with each PickedPlayer
+    better_a_team_a_picks = models.PositiveIntegerField(default=0, editable=False)
+    better_a_team_b_picks = models.PositiveIntegerField(default=0, editable=False)
+    better_b_team_a_picks = models.PositiveIntegerField(default=0, editable=False)
+    better_b_team_b_picks = models.PositiveIntegerField(default=0, editable=False)
+    total_picks = models.PositiveIntegerField(default=0, editable=False)
+    
     # Results
     better_a_total_winnings = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     better_b_total_winnings = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     
+    # Incremented on every state change (picks included), so pollers can skip unchanged sessions
+    version = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.better_a.username} vs {self.better_b.username} - {self.match}"
 
+    # Only ever written through F() updates (bump_version, pick_player), never from an instance
+    F_UPDATED_FIELDS = ('version', 'better_a_team_a_picks', 'better_a_team_b_picks',
+                        'better_b_team_a_picks', 'better_b_team_b_picks', 'total_picks')
+
+    def save(self, *args, **kwargs):
+        # A full save of a loaded session would put back the version and pick counters it was
+        # loaded with, undoing concurrent increments; leave those columns out
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.F_UPDATED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def bump_version(cls, session_id):
+        """Mark a session as changed with a single UPDATE (no need to load it)"""
+        from django.utils import timezone
+        cls.objects.filter(id=session_id).update(version=models.F('version') + 1, updated_at=timezone.now())
+
+    @property
+    def better_a_picks_count(self):
+        return self.better_a_team_a_picks + self.better_a_team_b_picks
+
+    @property
+    def better_b_picks_count(self):
+        return self.better_b_team_a_picks + self.better_b_team_b_picks
+
+    def pick_counter_field(self, better_id, team_id):
+        """Name of the counter for a better's picks from a team, or None for a team outside the match"""
+        side = 'a' if better_id == self.better_a_id else 'b'
+        if team_id == self.match.team_a_id:
+            return f'better_{side}_team_a_picks'
+        if team_id == self.match.team_b_id:
+            return f'better_{side}_team_b_picks'
+        return None
+
+    def picks_for_team(self, better_id, team_id):
+        field = self.pick_counter_field(better_id, team_id)
+        return getattr(self, field) if field else 0
+
     def perform_toss(self):
         """Perform toss - randomly determine winner"""
         if not self.toss_completed:
@@ -193,7 +354,8 @@ class BettingSession(models.Model):
             self.toss_completed = True
             self.pick_order_randomized = True
             self.status = 'picking'
-            self.save()
+            self.save(update_fields=['toss_winner', 'current_turn', 'toss_completed',
+                                     'pick_order_randomized', 'status', 'updated_at'])
             return self.toss_winner
         return self.toss_winner
 
@@ -214,102 +376,95 @@ class BettingSession(models.Model):
                 self.current_turn = self.better_b
             else:
                 self.current_turn = self.better_a
-        self.save()
+        self.save(update_fields=['current_turn', 'updated_at'])
 
-    def check_picks_complete(self):
-        """Check if all players have been picked and automatically place bets"""
-        total_picks_needed = self.players_per_side * 2  # players_per_side for each team
-        total_picks = PickedPlayer.objects.filter(session=self).count()
+    def place_auto_bets(self):
+        """
+        Place the fixed bet for both betters once picking is complete, as one batch:
+        lock both wallets, debit each with a conditional F() update, then bulk-create the
+        Transactions and the Bets for every picked player. A better who cannot afford the
+        bet gets no bets. Returns True if both bets were placed (bets_completed).
+        Call inside a transaction.
+        """
+        from django.utils import timezone
         
-        if total_picks >= total_picks_needed:
-            self.picks_completed = True
-            self.status = 'betting'
-            self.current_turn = None
-            self.save()
-            
-            # Automatically place bets for both players
-            # Note: Wallet, Transaction, Bet, and PickedPlayer are defined in this same file
-            # Place bet for better_a
-            wallet_a, _ = Wallet.objects.get_or_create(user=self.better_a)
-            if wallet_a.balance >= self.fixed_bet_amount:
-                wallet_a.withdraw(self.fixed_bet_amount)
-                Transaction.objects.create(
-                    user=self.better_a,
-                    transaction_type='bet_placed',
-                    amount=self.fixed_bet_amount,
-                    balance_after=wallet_a.balance,
-                    description=f'Fixed bet amount for session #{self.id}'
-                )
-                # Create bets for all picked players
-                better_a_picks = PickedPlayer.objects.filter(session=self, better=self.better_a)
-                for picked_player in better_a_picks:
-                    Bet.objects.get_or_create(
-                        session=self,
-                        better=self.better_a,
-                        picked_player=picked_player,
-                        defaults={
-                            'amount_per_run': Decimal('0.00'),  # Not used with fixed bet
-                            'insurance_percentage': Decimal('0.00'),
-                            'insurance_premium': Decimal('0.00'),
-                            'insured_amount': Decimal('0.00')
-                        }
-                    )
-            
-            # Place bet for better_b
-            wallet_b, _ = Wallet.objects.get_or_create(user=self.better_b)
-            if wallet_b.balance >= self.fixed_bet_amount:
-                wallet_b.withdraw(self.fixed_bet_amount)
-                Transaction.objects.create(
-                    user=self.better_b,
-                    transaction_type='bet_placed',
-                    amount=self.fixed_bet_amount,
-                    balance_after=wallet_b.balance,
-                    description=f'Fixed bet amount for session #{self.id}'
-                )
-                # Create bets for all picked players
-                better_b_picks = PickedPlayer.objects.filter(session=self, better=self.better_b)
-                for picked_player in better_b_picks:
-                    Bet.objects.get_or_create(
-                        session=self,
-                        better=self.better_b,
-                        picked_player=picked_player,
-                        defaults={
-                            'amount_per_run': Decimal('0.00'),  # Not used with fixed bet
-                            'insurance_percentage': Decimal('0.00'),
-                            'insurance_premium': Decimal('0.00'),
-                            'insured_amount': Decimal('0.00')
-                        }
-                    )
-            
-            # Mark bets as completed if both have sufficient balance
-            better_a_bets = Bet.objects.filter(session=self, better=self.better_a).exists()
-            better_b_bets = Bet.objects.filter(session=self, better=self.better_b).exists()
-            if better_a_bets and better_b_bets:
-                self.bets_completed = True
-                self.save()
-            
-            return True
-        return False
+        amount = self.fixed_bet_amount
+        better_ids = [self.better_a_id, self.better_b_id]
+        
+        # Lock in id order so concurrent sessions of the same users cannot deadlock
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in Wallet.objects.select_for_update().filter(user_id__in=better_ids).order_by('id')
+        }
+        if len(wallets) < len(set(better_ids)):
+            Wallet.objects.bulk_create(
+                [Wallet(user_id=user_id) for user_id in better_ids if user_id not in wallets], ignore_conflicts=True
+            )
+            wallets = {
+                wallet.user_id: wallet
+                for wallet in Wallet.objects.select_for_update().filter(user_id__in=better_ids).order_by('id')
+            }
+        
+        now = timezone.now()
+        funded = []
+        for user_id in better_ids:
+            wallet = wallets[user_id]
+            # The balance condition keeps the debit safe even where rows cannot be locked
+            if wallet.balance >= amount and Wallet.objects.filter(id=wallet.id, balance__gte=amount).update(
+                balance=models.F('balance') - amount, updated_at=now
+            ):
+                wallet.balance -= amount
+                funded.append(user_id)
+        
+        if not funded:
+            return False
+        
+        Transaction.objects.bulk_create([
+            Transaction(
+                user_id=user_id,
+                transaction_type='bet_placed',
+                amount=amount,
+                balance_after=wallets[user_id].balance,
+                description=f'Fixed bet amount for session #{self.id}'
+            )
+            for user_id in funded
+        ])
+        Bet.objects.bulk_create([
+            Bet(
+                session=self,
+                better_id=better_id,
+                picked_player_id=picked_player_id,
+                amount_per_run=Decimal('0.00'),  # Not used with fixed bet
+                insurance_percentage=Decimal('0.00'),
+                insurance_premium=Decimal('0.00'),
+                insured_amount=Decimal('0.00')
+            )
+            for picked_player_id, better_id in PickedPlayer.objects.filter(
+                session=self, better_id__in=funded
+            ).order_by().values_list('id', 'better_id')
+        ], ignore_conflicts=True)  # a pick may already have its bet
+        
+        return len(funded) == 2
 
-    def can_pick_player(self, user, player):
-        """Check if user can pick this player"""
+    def can_pick_player(self, user, player, check_picked=True):
+        """
+        Check if user can pick this player
+        check_picked=False skips the already-picked query, for callers that rely on the
+        unique (session, player) constraint instead
+        """
         if self.status != 'picking':
             return False, "Picking phase is not active"
         
-        if self.current_turn != user:
+        if self.current_turn_id != user.id:
             return False, "It's not your turn"
         
         # Check if player is already picked by any better (prevents both betters from picking same player)
-        if PickedPlayer.objects.filter(session=self, player=player).exists():
+        if check_picked and PickedPlayer.objects.filter(session=self, player=player).exists():
             return False, "This player is already picked. Each player can only be selected once."
         
         # Check if user has already picked their quota for this team
         team = player.team
-        user_picks_for_team = PickedPlayer.objects.filter(
-            session=self, 
-            better=user, 
-            player__team=team
-        ).count()
+        user_picks_for_team = self.picks_for_team(user.id, team.id)
         
         max_picks = self.players_per_side
         if user_picks_for_team >= max_picks:
@@ -374,53 +529,29 @@ class DLWallet(models.Model):
     
     def credit(self, amount, description=""):
         """Credit amount to DL wallet"""
-        self.balance += amount
+        from .wallet_ops import dl_credit
+        dl_transaction = dl_credit(self.dl_user, amount, description or f'Credited by Master DL')
+        self.balance = dl_transaction.balance_after
         self.total_credited += amount
-        self.save()
-        
-        # Create transaction record
-        DLTransaction.objects.create(
-            dl_user=self.dl_user,
-            transaction_type='credit',
-            amount=amount,
-            balance_after=self.balance,
-            description=description or f'Credited by Master DL'
-        )
     
     def debit(self, amount, description=""):
         """Debit amount from DL wallet"""
-        if self.balance >= amount:
-            self.balance -= amount
-            self.total_distributed += amount
-            self.save()
-            
-            # Create transaction record
-            DLTransaction.objects.create(
-                dl_user=self.dl_user,
-                transaction_type='debit',
-                amount=amount,
-                balance_after=self.balance,
-                description=description or f'Distributed to end user'
-            )
-            return True
-        return False
+        from .wallet_ops import dl_debit
+        dl_transaction = dl_debit(self.dl_user, amount, description or f'Distributed to end user')
+        if dl_transaction is None:
+            return False
+        self.balance = dl_transaction.balance_after
+        self.total_distributed += amount
+        return True
     
     def withdraw(self, amount, description=""):
         """Withdraw amount from DL wallet (by Master DL)"""
-        if self.balance >= amount:
-            self.balance -= amount
-            self.save()
-            
-            # Create transaction record
-            DLTransaction.objects.create(
-                dl_user=self.dl_user,
-                transaction_type='debit',  # Using debit for withdrawal
-                amount=amount,
-                balance_after=self.balance,
-                description=description or f'Withdrawn by Master DL'
-            )
-            return True
-        return False
+        from .wallet_ops import dl_debit
+        dl_transaction = dl_debit(self.dl_user, amount, description or f'Withdrawn by Master DL', distributed=False)
+        if dl_transaction is None:
+            return False
+        self.balance = dl_transaction.balance_after
+        return True
 
 
 class DLTransaction(models.Model):
@@ -482,37 +613,30 @@ class DepositRequest(models.Model):
         """Approve deposit request"""
         from django.utils import timezone
         
-        # Check DL wallet balance
-        try:
-            dl_wallet = DLWallet.objects.get(dl_user=self.dl_user)
-        except DLWallet.DoesNotExist:
-            return False, "DL wallet not found"
-        
-        if dl_wallet.balance < self.amount:
-            return False, "Insufficient balance in DL wallet"
+        from .wallet_ops import credit, dl_debit
         
-        # Debit from DL wallet
-        if not dl_wallet.debit(self.amount, f'Deposit to {self.end_user.username}'):
-            return False, "Failed to debit from DL wallet"
-        
-        # Credit to end user wallet
-        end_user_wallet, _ = Wallet.objects.get_or_create(user=self.end_user)
-        end_user_wallet.deposit(self.amount)
+        if not DLWallet.objects.filter(dl_user=self.dl_user).exists():
+            return False, "DL wallet not found"
         
-        # Create transaction record
-        Transaction.objects.create(
-            user=self.end_user,
-            transaction_type='deposit',
-            amount=self.amount,
-            balance_after=end_user_wallet.balance,
-            description=f'Deposit approved by DL: {self.dl_user.username}'
-        )
+        with transaction.atomic():
+            # Claim the request first, so a concurrent approval of it moves no money
+            if not DepositRequest.objects.filter(id=self.id, status='pending').update(
+                status='approved', processed_at=timezone.now(), processed_by=dl_user
+            ):
+                return False, "Deposit request has already been processed"
+            
+            # Debit from DL wallet
+            if dl_debit(self.dl_user, self.amount, f'Deposit to {self.end_user.username}') is None:
+                transaction.set_rollback(True)
+                return False, "Insufficient balance in DL wallet"
+            
+            # Credit to end user wallet
+            credit(self.end_user, self.amount, 'deposit', f'Deposit approved by DL: {self.dl_user.username}')
         
         # Update request status
         self.status = 'approved'
         self.processed_at = timezone.now()
         self.processed_by = dl_user
-        self.save()
         
         return True, "Deposit approved successfully"
     
@@ -559,7 +683,7 @@ class DepositRequest(models.Model):
         
         # Join the session
         self.session.better_b = user
-        self.session.save()
+        self.session.save(update_fields=['better_b', 'updated_at'])
         
         # Update invite status
         self.status = 'accepted'
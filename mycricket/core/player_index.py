@@ -0,0 +1,147 @@
+"""
+Per-match player resolution index.
+
+Maps every known provider identifier (Player.api_id, PlayerAlias.external_id
+and the bare numeric part of prefixed ids like 'entitysport_player_123') and
+every normalized player name to Player.id for the two teams of a match.
+The index is built once per match, cached, and shared by the live score
+poller, sync_matches and settlement, so mapping provider stats is a dict
+lookup instead of a query per row.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+import logging
+import re
+import unicodedata
+
+from .models import Player, PlayerAlias
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIMEOUT = 10 * 60  # seconds
+
+
+def normalize_name(name):
+    """'  M.S. Dhoni ' -> 'm s dhoni' (accents, case and punctuation removed)"""
+    name = unicodedata.normalize('NFKD', str(name or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name.lower()).split())
+
+
+class PlayerIndex:
+    """Lookup tables from provider player ids and normalized names to Player.id"""
+
+    def __init__(self, match_id, ids, names):
+        self.match_id = match_id
+        self.ids = ids
+        self.names = names
+
+    @classmethod
+    def build(cls, match):
+        """Build the index for a match with two queries"""
+        # Players who since moved team still count for matches they have stats in
+        players = list(
+            Player.objects.filter(
+                Q(team_id__in=[match.team_a_id, match.team_b_id]) | Q(match_stats__match_id=match.id)
+            ).order_by().distinct().values_list('id', 'api_id', 'name')
+        )
+        api_ids = {}
+        raw_ids = {}
+        names = {}
+        ambiguous = set()
+        for player_id, api_id, name in players:
+            api_ids[api_id] = player_id
+            # Prefixed ids ('entitysport_player_123') are also reachable by the raw provider id
+            raw_id = api_id.rsplit('_', 1)[-1]
+            if raw_id != api_id and raw_id.isdigit():
+                if raw_id in raw_ids and raw_ids[raw_id] != player_id:
+                    ambiguous.add(raw_id)
+                raw_ids.setdefault(raw_id, player_id)
+            key = normalize_name(name)
+            if key in names and names[key] != player_id:
+                ambiguous.add(key)
+            names.setdefault(key, player_id)
+
+        # Never guess between two players of the match that share a name or raw id
+        for key in ambiguous:
+            raw_ids.pop(key, None)
+            names.pop(key, None)
+        names.pop('', None)
+
+        # A real api_id wins over a learned alias, which wins over a raw id
+        ids = raw_ids
+        ids.update(PlayerAlias.objects.filter(
+            player_id__in=[player[0] for player in players]
+        ).order_by().values_list('external_id', 'player_id'))
+        ids.update(api_ids)
+
+        return cls(match.id, ids, names)
+
+    def resolve(self, provider_id=None, name=None):
+        """Player.id for a provider id, falling back to the player's name; None if unknown"""
+        if provider_id not in (None, ''):
+            player_id = self.ids.get(str(provider_id))
+            if player_id:
+                return player_id
+        if name:
+            return self.names.get(normalize_name(name))
+        return None
+
+    def resolve_stats(self, player_stats, provider=None):
+        """
+        Map a provider player_stats dict ({provider_id: {'runs': .., 'name': ..}}) to
+        {Player.id: stat}. Ids resolved only by name are remembered as PlayerAlias rows
+        for the provider, so later lookups hit the id table directly.
+        """
+        resolved = {}
+        learned = []
+        for provider_id, stat in player_stats.items():
+            if not isinstance(stat, dict):
+                continue
+            player_id = self.ids.get(str(provider_id))
+            if player_id is None:
+                player_id = self.resolve(name=stat.get('name'))
+                if player_id is None:
+                    continue
+                if provider:
+                    learned.append(PlayerAlias(player_id=player_id, provider=provider, external_id=str(provider_id)))
+            resolved[player_id] = stat
+
+        if learned:
+            try:
+                PlayerAlias.objects.bulk_create(learned, ignore_conflicts=True)
+                for alias in learned:
+                    self.ids[alias.external_id] = alias.player_id
+                invalidate_player_index(self.match_id)
+            except Exception as e:
+                logger.warning(f"Could not store player aliases for match {self.match_id}: {str(e)}")
+        return resolved
+
+
+def _cache_key(match_id):
+    return f'player_index:{match_id}'
+
+
+def get_player_index(match):
+    """Cached PlayerIndex for a match (built on first use)"""
+    try:
+        data = cache.get(_cache_key(match.id))
+    except Exception as e:
+        logger.warning(f"Player index cache unavailable: {str(e)}")
+        data = None
+    if data is not None:
+        return PlayerIndex(match.id, data['ids'], data['names'])
+
+    index = PlayerIndex.build(match)
+    try:
+        cache.set(_cache_key(match.id), {'ids': index.ids, 'names': index.names}, timeout=CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not cache player index for match {match.id}: {str(e)}")
+    return index
+
+
+def invalidate_player_index(match_id):
+    """Drop the cached index (after a squad sync or new aliases)"""
+    try:
+        cache.delete(_cache_key(match_id))
+    except Exception as e:
+        logger.warning(f"Could not invalidate player index for match {match_id}: {str(e)}")
@@ -0,0 +1,154 @@
+"""
+Normalized match scorecard.
+
+Provider payloads are reduced by an adapter to the common player_stats shape
+({provider_player_id: {'name', 'runs', 'balls', 'wickets'}}) and resolved once
+through the match's PlayerIndex into a Scorecard keyed by internal Player.id.
+Live score ingestion, settlement, the session page and the admin all read
+the Scorecard; its numbers live in parallel arrays, so cached scorecards
+stay small.
+"""
+from array import array
+from collections import namedtuple
+
+from .player_index import get_player_index
+
+ScoreLine = namedtuple('ScoreLine', ['runs', 'balls', 'wickets'])
+
+# Array element types: 64-bit Player ids, 16-bit unsigned runs/balls, 8-bit signed wickets
+PLAYER_TYPECODE = 'q'
+COUNT_TYPECODE = 'H'
+WICKETS_TYPECODE = 'b'
+
+# Stored in the wickets array when the provider gave no bowling figures
+NO_WICKETS = -1
+
+
+class Scorecard:
+    """Runs, balls and wickets per Player.id for one match"""
+
+    __slots__ = ('match_id', 'provider', '_players', '_runs', '_balls', '_wickets', '_positions')
+
+    def __init__(self, match_id, provider=None, lines=None):
+        """lines: {player_id: (runs, balls, wickets)}, wickets None when unknown"""
+        lines = lines or {}
+        self.match_id = match_id
+        self.provider = provider
+        self._players = array(PLAYER_TYPECODE, lines)
+        self._runs = array(COUNT_TYPECODE, (int(line[0]) for line in lines.values()))
+        self._balls = array(COUNT_TYPECODE, (int(line[1]) for line in lines.values()))
+        self._wickets = array(WICKETS_TYPECODE, (NO_WICKETS if line[2] is None else int(line[2]) for line in lines.values()))
+        self._positions = None
+
+    @classmethod
+    def from_player_stats(cls, match, player_stats, provider=None):
+        """Build from adapter output, resolving provider ids through the match's PlayerIndex"""
+        if not player_stats:
+            return cls(match.id, provider)
+        resolved = get_player_index(match).resolve_stats(player_stats, provider)
+        return cls(match.id, provider, {
+            player_id: (
+                int(stat.get('runs') or 0),
+                int(stat.get('balls') or 0),
+                int(stat['wickets']) if stat.get('wickets') else None,
+            )
+            for player_id, stat in resolved.items()
+        })
+
+    @classmethod
+    def from_match_stats(cls, match):
+        """Build from the stored PlayerMatchStats rows (one query)"""
+        from .models import PlayerMatchStats
+
+        rows = PlayerMatchStats.objects.filter(match=match).order_by().values_list(
+            'player_id', 'runs_scored', 'balls_faced', 'wickets'
+        )
+        return cls(match.id, lines={player_id: (runs, balls, wickets) for player_id, runs, balls, wickets in rows})
+
+    def __getstate__(self):
+        # Raw array bytes pickle smaller than the arrays; the position index is rebuilt on demand
+        return (
+            self.match_id, self.provider,
+            self._players.tobytes(), self._runs.tobytes(), self._balls.tobytes(), self._wickets.tobytes(),
+        )
+
+    def __setstate__(self, state):
+        self.match_id, self.provider, players, runs, balls, wickets = state
+        self._players = array(PLAYER_TYPECODE, players)
+        self._runs = array(COUNT_TYPECODE, runs)
+        self._balls = array(COUNT_TYPECODE, balls)
+        self._wickets = array(WICKETS_TYPECODE, wickets)
+        self._positions = None
+
+    def _position(self, player_id):
+        if self._positions is None:
+            self._positions = {player_id: position for position, player_id in enumerate(self._players)}
+        return self._positions.get(player_id)
+
+    def __len__(self):
+        return len(self._players)
+
+    def __iter__(self):
+        return iter(self._players)
+
+    def __contains__(self, player_id):
+        return self._position(player_id) is not None
+
+    def get(self, player_id, default=None):
+        """ScoreLine for a player, or default if the player is not on the scorecard"""
+        position = self._position(player_id)
+        if position is None:
+            return default
+        wickets = self._wickets[position]
+        return ScoreLine(self._runs[position], self._balls[position], None if wickets == NO_WICKETS else wickets)
+
+    def runs(self, player_id):
+        position = self._position(player_id)
+        return 0 if position is None else self._runs[position]
+
+    def balls(self, player_id):
+        position = self._position(player_id)
+        return 0 if position is None else self._balls[position]
+
+    def items(self):
+        for player_id in self._players:
+            yield player_id, self.get(player_id)
+
+    def diff(self, previous):
+        """{player_id: ScoreLine} for lines that are new or differ from the previous scorecard"""
+        if previous is None:
+            return dict(self.items())
+        return {player_id: line for player_id, line in self.items() if previous.get(player_id) != line}
+
+    def merged(self, newer):
+        """A scorecard with this one's lines overwritten by the newer scorecard's"""
+        lines = dict(self.items())
+        lines.update(newer.items())
+        return Scorecard(self.match_id, newer.provider or self.provider, lines)
+
+
+def entitysport_player_stats(data):
+    """
+    EntitySport adapter: /matches/{id}/live or /matches/{id}/scorecard response
+    -> player_stats, with the latest batting figures and bowling wickets per player across innings
+    """
+    player_stats = {}
+    for inning in (data or {}).get('scorecard', {}).get('innings', []):
+        for batsman in inning.get('batting', []):
+            if not batsman.get('player_id'):
+                continue
+            stat = player_stats.setdefault(f"entitysport_player_{batsman['player_id']}", {})
+            stat.update({
+                'name': batsman.get('name', ''),
+                'runs': batsman.get('runs', 0),
+                'balls': batsman.get('balls', 0),
+            })
+
+        for bowler in inning.get('bowling', []):
+            if not bowler.get('player_id'):
+                continue
+            stat = player_stats.setdefault(f"entitysport_player_{bowler['player_id']}", {})
+            stat.setdefault('name', bowler.get('name', ''))
+            if bowler.get('wickets'):
+                stat['wickets'] = bowler['wickets']
+    return player_stats
@@ -4,17 +4,618 @@ Supports multiple free cricket APIs
 """
 try:
     import requests
+    from requests.adapters import HTTPAdapter
 except ImportError:
     requests = None
+    HTTPAdapter = None
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import hashlib
+import json
 import logging
+import os
+import random
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 
+class ProviderUnavailable(requests.exceptions.RequestException if requests else Exception):
+    """Raised instead of sending a request while a provider's circuit breaker is open"""
+
+
+class ProviderFixtures:
+    """
+    Record and replay provider responses for offline load testing.
+    settings.PROVIDER_HTTP_MODE:
+      'live'   - normal network requests (default)
+      'record' - network requests, and every response is appended to the fixture directory
+      'replay' - no network; responses are served from the fixture directory
+    Each distinct request (provider, method, path, params without credentials) gets one
+    JSON-lines file of timestamped responses, so live scorecards replay as a sequence.
+    Replay runs the recorded timeline PROVIDER_REPLAY_SPEED times faster
+    (e.g. 180 plays a 3 hour T20 in a minute).
+    Credentials in recorded bodies (e.g. the EntitySport /auth/ token) are redacted,
+    so fixture files never hold a live token.
+    """
+    
+    # Left out of the fixture key: credentials, and time windows computed from the current time
+    IGNORED_PARAMS = {'apikey', 'token', 'access_key', 'secret_key', 'commencetimefrom', 'commencetimeto'}
+    # Replaced in recorded JSON bodies
+    REDACTED_FIELDS = {'apikey', 'token', 'access_key', 'secret_key'}
+    REDACTED = 'redacted'
+    
+    def __init__(self):
+        self._frames = {}
+        self._lock = threading.Lock()
+        self._origin = None
+        self._replay_started = None
+    
+    @property
+    def mode(self):
+        return getattr(settings, 'PROVIDER_HTTP_MODE', 'live')
+    
+    @property
+    def directory(self):
+        return str(getattr(settings, 'PROVIDER_FIXTURE_DIR', 'provider_fixtures'))
+    
+    def _path(self, provider, method, url, params=None, data=None):
+        """Fixture file for a request"""
+        parts = [method.upper(), urlsplit(url).path]
+        for values in (params, data):
+            for key, value in sorted((values or {}).items()):
+                if key.lower() not in self.IGNORED_PARAMS:
+                    parts.append(f'{key}={value}')
+        digest = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+        name = urlsplit(url).path.strip('/').replace('/', '_') or 'root'
+        return os.path.join(self.directory, provider, f'{name}-{digest}.jsonl')
+    
+    def record(self, provider, method, url, response, params=None, data=None):
+        path = self._path(provider, method, url, params, data)
+        frame = {
+            'recorded_at': time.time(),
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'application/json'),
+            'body': self._redact(response.text),
+        }
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(frame) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not record {provider} response to {path}: {str(e)}")
+    
+    def _redact(self, body):
+        """Response body with credential fields replaced (non-JSON bodies are kept as they are)"""
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return body
+        
+        def redact(value):
+            if isinstance(value, dict):
+                return {key: self.REDACTED if key.lower() in self.REDACTED_FIELDS else redact(item)
+                        for key, item in value.items()}
+            if isinstance(value, list):
+                return [redact(item) for item in value]
+            return value
+        
+        return json.dumps(redact(data))
+    
+    def replay(self, provider, method, url, params=None, data=None):
+        """Build the response recorded for this request at the current replay time"""
+        frames = self._load(self._path(provider, method, url, params, data))
+        
+        response = requests.Response()
+        response.url = url
+        response.encoding = 'utf-8'
+        if not frames:
+            logger.warning(f"No {provider} fixture recorded for {method} {url}")
+            response.status_code = 404
+            response._content = b'{}'
+            return response
+        
+        # Latest frame recorded at or before the (sped up) replay clock
+        now = self._origin + (time.time() - self._replay_started) * float(getattr(settings, 'PROVIDER_REPLAY_SPEED', 1))
+        frame = frames[0]
+        for candidate in frames:
+            if candidate['recorded_at'] > now:
+                break
+            frame = candidate
+        
+        response.status_code = frame['status']
+        response.headers['Content-Type'] = frame['content_type']
+        response._content = frame['body'].encode('utf-8')
+        return response
+    
+    def _load(self, path):
+        with self._lock:
+            if self._origin is None:
+                self._start_replay()
+            if path not in self._frames:
+                self._frames[path] = self._read(path)
+            return self._frames[path]
+    
+    def _start_replay(self):
+        """The replay clock starts at the earliest recorded response"""
+        earliest = None
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.jsonl'):
+                    frames = self._read(os.path.join(root, name))
+                    if frames and (earliest is None or frames[0]['recorded_at'] < earliest):
+                        earliest = frames[0]['recorded_at']
+        self._origin = earliest or time.time()
+        self._replay_started = time.time()
+    
+    def _read(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return sorted((json.loads(line) for line in f if line.strip()), key=lambda frame: frame['recorded_at'])
+        except OSError:
+            return []
+
+
+class ProviderTransport:
+    """
+    Shared HTTP transport for all provider services.
+    Keeps one pooled keep-alive requests.Session per provider, so repeated calls
+    reuse open TCP+TLS connections instead of doing a new handshake every time.
+    Pool sizes, timeouts and default headers come from settings.PROVIDER_HTTP.
+    At most max_concurrency requests per provider are in flight from one process.
+    """
+    
+    DEFAULTS = {
+        'pool_connections': 4,  # Number of hosts to keep pools for
+        'pool_maxsize': 10,  # Connections kept alive per host
+        'timeout': 10,
+        'max_concurrency': 4,  # Requests in flight per provider from this process
+        'headers': {
+            'User-Agent': 'CricketDuel/1.0',
+            'Accept': 'application/json'
+        },
+    }
+    
+    def __init__(self):
+        self._sessions = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+    
+    def get_config(self, provider):
+        """Merge default and per-provider transport settings"""
+        provider_settings = getattr(settings, 'PROVIDER_HTTP', {})
+        config = dict(self.DEFAULTS)
+        config['headers'] = dict(self.DEFAULTS['headers'])
+        for key in ('default', provider):
+            overrides = provider_settings.get(key, {})
+            config.update({k: v for k, v in overrides.items() if k != 'headers'})
+            config['headers'].update(overrides.get('headers', {}))
+        return config
+    
+    def session(self, provider):
+        """Get (or lazily create) the pooled session for a provider"""
+        session = self._sessions.get(provider)
+        if session is not None:
+            return session
+        
+        with self._lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                config = self.get_config(provider)
+                session = requests.Session()
+                # Retries are handled by the services themselves
+                adapter = HTTPAdapter(
+                    pool_connections=config['pool_connections'],
+                    pool_maxsize=config['pool_maxsize'],
+                    max_retries=0
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(config['headers'])
+                self._sessions[provider] = session
+        return session
+    
+    def semaphore(self, provider):
+        """Get (or lazily create) the concurrency limit for a provider"""
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            with self._lock:
+                semaphore = self._semaphores.setdefault(
+                    provider, threading.BoundedSemaphore(self.get_config(provider)['max_concurrency'])
+                )
+        return semaphore
+    
+    def request(self, provider, method, url, **kwargs):
+        """
+        Send a request through the provider's pooled session
+        Raises ProviderUnavailable without sending anything while the provider's circuit is open
+        In replay mode the recorded response is returned without any network access
+        """
+        if provider_fixtures.mode == 'replay':
+            return provider_fixtures.replay(provider, method, url, kwargs.get('params'), kwargs.get('data'))
+        
+        kwargs.setdefault('timeout', self.get_config(provider)['timeout'])
+        circuit_breaker.before_request(provider)
+        
+        started = time.monotonic()
+        try:
+            with self.semaphore(provider):
+                response = self.session(provider).request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            circuit_breaker.record_failure(provider, str(e), time.monotonic() - started)
+            raise
+        
+        latency = time.monotonic() - started
+        if response.status_code >= 500:
+            circuit_breaker.record_failure(provider, f"HTTP {response.status_code}", latency)
+        else:
+            circuit_breaker.record_success(provider, latency)
+        
+        if provider_fixtures.mode == 'record':
+            provider_fixtures.record(provider, method, url, response, kwargs.get('params'), kwargs.get('data'))
+        return response
+    
+    def get(self, provider, url, **kwargs):
+        return self.request(provider, 'GET', url, **kwargs)
+    
+    def post(self, provider, url, **kwargs):
+        return self.request(provider, 'POST', url, **kwargs)
+    
+    def close(self):
+        """Close all pooled connections"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker with state shared by all workers through the cache.
+    closed: requests flow; consecutive failures (errors, 5xx, or responses slower than
+            latency_threshold) are counted and failure_threshold of them open the breaker.
+    open: requests fail immediately with ProviderUnavailable for reset_timeout seconds.
+    half_open: one probe request is let through; success closes, failure re-opens.
+    Thresholds come from settings.PROVIDER_CIRCUIT_BREAKER.
+    """
+    
+    DEFAULTS = {
+        'failure_threshold': 5,
+        'latency_threshold': 5.0,  # seconds
+        'reset_timeout': 30,  # seconds
+    }
+    
+    def get_config(self, provider):
+        breaker_settings = getattr(settings, 'PROVIDER_CIRCUIT_BREAKER', {})
+        config = dict(self.DEFAULTS)
+        config.update(breaker_settings.get('default', {}))
+        config.update(breaker_settings.get(provider, {}))
+        return config
+    
+    def _key(self, provider):
+        return f'circuit:{provider}'
+    
+    def get_state(self, provider):
+        """Current breaker state dict for a provider"""
+        try:
+            state = cache.get(self._key(provider))
+        except Exception as e:
+            logger.warning(f"Circuit breaker state unavailable for {provider}: {str(e)}")
+            state = None
+        return state or {'state': 'closed', 'failures': 0, 'opened_at': None,
+                         'last_error': None, 'last_latency': None}
+    
+    def _save(self, provider, state):
+        try:
+            cache.set(self._key(provider), state, timeout=None)
+        except Exception as e:
+            logger.warning(f"Could not save circuit breaker state for {provider}: {str(e)}")
+    
+    def before_request(self, provider):
+        """Raise ProviderUnavailable if the provider should be skipped right now"""
+        state = self.get_state(provider)
+        if state['state'] == 'closed':
+            return
+        
+        config = self.get_config(provider)
+        if time.time() - (state['opened_at'] or 0) < config['reset_timeout']:
+            raise ProviderUnavailable(f"{provider} circuit is open")
+        
+        # Half-open: let a single probe through across all workers
+        try:
+            probe = cache.add(f'{self._key(provider)}:probe', 1, timeout=config['reset_timeout'])
+        except Exception:
+            probe = True
+        if not probe:
+            raise ProviderUnavailable(f"{provider} circuit is half-open, probe in progress")
+        if state['state'] != 'half_open':
+            state['state'] = 'half_open'
+            self._save(provider, state)
+    
+    def record_success(self, provider, latency):
+        config = self.get_config(provider)
+        if latency > config['latency_threshold']:
+            self.record_failure(provider, f"slow response ({latency:.1f}s)", latency)
+            return
+        
+        state = self.get_state(provider)
+        if state['state'] != 'closed' or state['failures']:
+            if state['state'] != 'closed':
+                logger.info(f"Circuit breaker for {provider} closed")
+            state.update({'state': 'closed', 'failures': 0, 'opened_at': None, 'last_latency': latency})
+            self._save(provider, state)
+            self._release_probe(provider)
+    
+    def record_failure(self, provider, error, latency=None):
+        config = self.get_config(provider)
+        state = self.get_state(provider)
+        state['failures'] += 1
+        state['last_error'] = error
+        state['last_latency'] = latency
+        
+        if state['state'] == 'half_open' or state['failures'] >= config['failure_threshold']:
+            if state['state'] != 'open':
+                logger.warning(f"Circuit breaker for {provider} opened after {state['failures']} failures: {error}")
+            state['state'] = 'open'
+            state['opened_at'] = time.time()
+            self._release_probe(provider)
+        self._save(provider, state)
+    
+    def _release_probe(self, provider):
+        try:
+            cache.delete(f'{self._key(provider)}:probe')
+        except Exception:
+            pass
+    
+    def status(self, providers):
+        """Breaker state for each provider (for the status view)"""
+        return {provider: self.get_state(provider) for provider in providers}
+
+
+class SingleFlight:
+    """
+    Request coalescing for identical provider calls.
+    Concurrent callers for the same key share one in-flight fetch: threads in this
+    process wait on an Event, other processes wait on a lock in the shared cache
+    and pick up the result the winner publishes there.
+    """
+    
+    WAIT_TIMEOUT = 15  # Give up waiting and fetch directly after this many seconds
+    POLL_INTERVAL = 0.1
+    RESULT_TTL = 5  # How long a published result stays readable for waiting processes
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, fetch):
+        """Run fetch() once for all concurrent callers of key and return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+        
+        if not leader:
+            if call['event'].wait(self.WAIT_TIMEOUT):
+                if call['error'] is not None:
+                    raise call['error']
+                return call['result']
+            logger.warning(f"Timed out waiting for in-flight request {key}, fetching directly")
+            return fetch()
+        
+        try:
+            call['result'] = self._do_shared(key, fetch)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['event'].set()
+    
+    def _do_shared(self, key, fetch):
+        """Coalesce across processes through a lock in the shared cache"""
+        lock_key = f"{key}:inflight"
+        result_key = f"{key}:result"
+        
+        try:
+            acquired = cache.add(lock_key, 1, timeout=self.WAIT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Single-flight lock failed for {key}: {str(e)}")
+            return fetch()
+        
+        if acquired:
+            try:
+                result = fetch()
+                try:
+                    cache.set(result_key, {'data': result}, timeout=self.RESULT_TTL)
+                except Exception as e:
+                    logger.warning(f"Single-flight publish failed for {key}: {str(e)}")
+                return result
+            finally:
+                try:
+                    cache.delete(lock_key)
+                except Exception:
+                    pass
+        
+        # Another process is fetching: wait for it to publish the result
+        deadline = time.monotonic() + self.WAIT_TIMEOUT
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(self.POLL_INTERVAL)
+                published = cache.get(result_key)
+                if published is not None:
+                    return published['data']
+                if cache.get(lock_key) is None:
+                    break  # Lock released without a result, fetch ourselves
+        except Exception as e:
+            logger.warning(f"Single-flight wait failed for {key}: {str(e)}")
+        return fetch()
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter per provider, shared by all processes through the cache.
+    Buckets refill at 'rate' tokens per second up to 'burst' tokens
+    (settings.PROVIDER_RATE_LIMITS). Providers without a limit are not throttled.
+    """
+    
+    LOCK_TIMEOUT = 2
+    LOCK_ATTEMPTS = 20
+    
+    def get_config(self, provider):
+        return getattr(settings, 'PROVIDER_RATE_LIMITS', {}).get(provider)
+    
+    def reserve(self, provider, max_wait=0):
+        """
+        Take one token from the provider's bucket.
+        Returns the seconds the caller must wait before sending (0 = send now), or
+        None if no token frees up within max_wait (nothing is taken in that case).
+        """
+        config = self.get_config(provider)
+        if not config or provider_fixtures.mode == 'replay':
+            return 0
+        
+        key = f'ratelimit:{provider}'
+        lock_key = f'{key}:lock'
+        rate = float(config['rate'])
+        burst = float(config.get('burst', 1))
+        
+        try:
+            if not self._acquire_lock(lock_key):
+                # Never stall provider calls on a contended lock
+                logger.warning(f"Rate limiter lock busy for {provider}, not throttling")
+                return 0
+            try:
+                now = time.time()
+                state = cache.get(key) or {'tokens': burst, 'at': now}
+                tokens = min(burst, state['tokens'] + (now - state['at']) * rate)
+                
+                wait = 0 if tokens >= 1 else (1 - tokens) / rate
+                if wait > max_wait:
+                    return None
+                
+                # Tokens may go negative: that reserves a future slot for a waiting caller
+                cache.set(key, {'tokens': tokens - 1, 'at': now}, timeout=int(burst / rate) + 60)
+                return wait
+            finally:
+                cache.delete(lock_key)
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable for {provider}: {str(e)}")
+            return 0
+    
+    def _acquire_lock(self, lock_key):
+        for _ in range(self.LOCK_ATTEMPTS):
+            if cache.add(lock_key, 1, timeout=self.LOCK_TIMEOUT):
+                return True
+            time.sleep(0.005)
+        return False
+
+
+class ProviderCache:
+    """
+    Cross-process TTL cache for provider responses, built on Django's cache framework.
+    Each endpoint has its own TTL (settings.PROVIDER_CACHE). After the TTL an entry
+    is still served (stale) for up to its 'stale' window while a single background
+    thread refreshes it; only one refresh per key runs across all processes.
+    Misses go through single_flight so concurrent callers share one fetch.
+    """
+    
+    DEFAULTS = {
+        'squads': {'ttl': 6 * 60 * 60, 'stale': 24 * 60 * 60},
+        'live': {'ttl': 5, 'stale': 60},
+        'score': {'ttl': 10, 'stale': 120},
+        'sports': {'ttl': 6 * 60 * 60, 'stale': 24 * 60 * 60},
+    }
+    
+    def get_config(self, endpoint):
+        """Get ttl/stale seconds for an endpoint"""
+        config = dict(self.DEFAULTS.get(endpoint, {'ttl': 60, 'stale': 300}))
+        config.update(getattr(settings, 'PROVIDER_CACHE', {}).get(endpoint, {}))
+        return config
+    
+    def make_key(self, provider, endpoint, params):
+        return 'provider:{}:{}:{}'.format(provider, endpoint, ':'.join(str(p) for p in params))
+    
+    def get_or_fetch(self, provider, endpoint, params, fetch, is_valid=bool):
+        """
+        Return cached data for (provider, endpoint, params), calling fetch() on a miss.
+        Results that fail is_valid() (errors, empty payloads) are never cached.
+        """
+        key = self.make_key(provider, endpoint, params)
+        config = self.get_config(endpoint)
+        
+        entry = self._cache_get(key)
+        if entry is not None:
+            if entry['fresh_until'] <= time.time():
+                # Serve stale data while one background refresh runs
+                self._refresh_in_background(key, config, fetch, is_valid)
+            return entry['data']
+        
+        # Concurrent misses for the same key share one provider call
+        data = single_flight.do(key, fetch)
+        self._store(key, config, data, is_valid)
+        return data
+    
+    def invalidate(self, provider, endpoint, params):
+        try:
+            cache.delete(self.make_key(provider, endpoint, params))
+        except Exception as e:
+            logger.warning(f"Provider cache delete failed: {str(e)}")
+    
+    def _store(self, key, config, data, is_valid):
+        if not is_valid(data):
+            return
+        entry = {'data': data, 'fresh_until': time.time() + config['ttl']}
+        try:
+            cache.set(key, entry, timeout=config['ttl'] + config['stale'])
+        except Exception as e:
+            logger.warning(f"Provider cache write failed for {key}: {str(e)}")
+    
+    def _cache_get(self, key):
+        # A cache outage must never break provider calls, just bypass the cache
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.warning(f"Provider cache read failed for {key}: {str(e)}")
+            return None
+    
+    def _refresh_in_background(self, key, config, fetch, is_valid):
+        lock_key = f"{key}:refreshing"
+        try:
+            if not cache.add(lock_key, 1, timeout=max(30, config['ttl'])):
+                return  # Another worker is already refreshing this key
+        except Exception as e:
+            logger.warning(f"Provider cache lock failed for {key}: {str(e)}")
+            return
+        
+        def refresh():
+            try:
+                self._store(key, config, fetch(), is_valid)
+            except Exception as e:
+                logger.warning(f"Background refresh failed for {key}: {str(e)}")
+            finally:
+                try:
+                    cache.delete(lock_key)
+                except Exception:
+                    pass
+                # Close the DB connection this thread may have opened (database cache backend)
+                connections.close_all()
+        
+        threading.Thread(target=refresh, daemon=True).start()
+
+
 class CricketAPIService:
     """
     Service to fetch cricket data from free APIs.
@@ -24,6 +625,7 @@ class CricketAPIService:
     def __init__(self):
         # You can configure API key in settings.py
         # For demo purposes, we'll use a mock service
+        self.provider = 'cricapi'
         self.api_key = getattr(settings, 'CRICKET_API_KEY', '29703eb7-9d28-44e5-a732-33527c70afbf')
         self.base_url = getattr(settings, 'CRICKET_API_URL', 'https://api.cricapi.com/v1')
     
@@ -46,10 +648,10 @@ class CricketAPIService:
             if self.api_key and requests:
                 try:
                     # Fetch current matches from CricAPI
-                    response = requests.get(
+                    response = http_transport.get(
+                        self.provider,
                         f"{self.base_url}/currentMatches",
-                        params={'apikey': self.api_key, 'offset': 0},
-                        timeout=10
+                        params={'apikey': self.api_key, 'offset': 0}
                     )
                     if response.status_code == 200:
                         data = response.json()
@@ -135,10 +737,10 @@ class CricketAPIService:
             if self.api_key and requests:
                 try:
                     # Fetch current matches from CricAPI
-                    response = requests.get(
+                    response = http_transport.get(
+                        self.provider,
                         f"{self.base_url}/currentMatches",
-                        params={'apikey': self.api_key, 'offset': 0},
-                        timeout=10
+                        params={'apikey': self.api_key, 'offset': 0}
                     )
                     if response.status_code == 200:
                         data = response.json()
@@ -335,6 +937,7 @@ class OddsAPIService:
     """
     
     def __init__(self):
+        self.provider = 'odds'
         self.api_key = getattr(settings, 'ODDS_API_KEY', None)
         self.base_url = getattr(settings, 'ODDS_API_BASE_URL', 'https://api.the-odds-api.com/v4')
         self.cricket_sport_keys = [
@@ -353,14 +956,18 @@ class OddsAPIService:
         """
         Get list of available cricket sports from The Odds API
         Returns list of sport objects
+        Cached for hours (the sport list rarely changes)
         """
         if not self.api_key or not requests:
             logger.warning("Odds API key not configured or requests library not available")
             return []
         
+        return provider_cache.get_or_fetch(self.provider, 'sports', [], self._fetch_cricket_sports)
+    
+    def _fetch_cricket_sports(self):
         try:
             url = f"{self.base_url}/sports"
-            response = requests.get(url, params={'apiKey': self.api_key}, timeout=10)
+            response = http_transport.get(self.provider, url, params={'apiKey': self.api_key})
             
             if response.status_code == 200:
                 sports = response.json()
@@ -393,7 +1000,6 @@ class OddsAPIService:
             logger.warning("Odds API key not configured or requests library not available")
             return []
         
-        all_matches = []
         now = timezone.now()
         next_24h = now + timedelta(hours=24)
         
@@ -402,76 +1008,17 @@ class OddsAPIService:
         if not cricket_sports:
             # Fallback to known cricket sport keys
             cricket_sports = [{'key': key} for key in self.cricket_sport_keys]
+        sport_keys = [sport.get('key') for sport in cricket_sports if sport.get('key')]
         
-        for sport in cricket_sports:
-            sport_key = sport.get('key')
-            if not sport_key:
-                continue
-            
-            try:
-                url = f"{self.base_url}/sports/{sport_key}/odds"
-                params = {
-                    'apiKey': self.api_key,
-                    'regions': 'us,uk,au',  # Multiple regions for better coverage
-                    'markets': 'h2h',  # Head to head market
-                    'oddsFormat': 'decimal',
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                
-                if response.status_code == 200:
-                    matches = response.json()
-                    
-                    for match in matches:
-                        try:
-                            # Parse commence_time
-                            commence_time_str = match.get('commence_time', '')
-                            if commence_time_str:
-                                commence_time = datetime.fromisoformat(commence_time_str.replace('Z', '+00:00'))
-                                if timezone.is_naive(commence_time):
-                                    commence_time = timezone.make_aware(commence_time)
-                                
-                                # Filter for matches in next 24 hours
-                                if now <= commence_time <= next_24h:
-                                    home_team = match.get('home_team', '')
-                                    away_team = match.get('away_team', '')
-                                    
-                                    # Determine which team is team_a and team_b
-                                    # Use home_team as team_a and away_team as team_b
-                                    # Generate unique team IDs
-                                    team_a_id = f"odds_team_{home_team.lower().replace(' ', '_').replace('-', '_')}"
-                                    team_b_id = f"odds_team_{away_team.lower().replace(' ', '_').replace('-', '_')}"
-                                    
-                                    formatted_match = {
-                                        'id': match.get('id', ''),
-                                        'name': f"{home_team} vs {away_team}",
-                                        'team_a': {
-                                            'id': team_a_id,
-                                            'name': home_team
-                                        },
-                                        'team_b': {
-                                            'id': team_b_id,
-                                            'name': away_team
-                                        },
-                                        'status': 'upcoming',
-                                        'date': commence_time.isoformat(),
-                                        'venue': match.get('sport_title', 'TBA'),  # Use sport title as venue fallback
-                                        'sport_key': sport_key,
-                                    }
-                                    all_matches.append(formatted_match)
-                        except Exception as e:
-                            logger.warning(f"Error parsing match {match.get('id', 'unknown')}: {str(e)}")
-                            continue
-                
-                elif response.status_code == 429:
-                    logger.warning("Rate limit reached for Odds API")
-                    break
-                else:
-                    logger.warning(f"Odds API error for sport {sport_key}: {response.status_code}")
-                    
-            except Exception as e:
-                logger.error(f"Error fetching matches for sport {sport_key}: {str(e)}")
-                continue
+        # Fetch all sports concurrently (bounded by the provider's max_concurrency)
+        rate_limited = threading.Event()
+        workers = max(1, min(len(sport_keys), http_transport.get_config(self.provider)['max_concurrency']))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda sport_key: self._get_sport_matches(sport_key, now, next_24h, rate_limited),
+                sport_keys
+            ))
+        all_matches = [match for matches in results for match in matches]
         
         # Remove duplicates based on match ID
         seen_ids = set()
@@ -484,6 +1031,87 @@ class OddsAPIService:
         logger.info(f"Found {len(unique_matches)} upcoming matches in next 24 hours")
         return unique_matches
     
+    def _get_sport_matches(self, sport_key, now, next_24h, rate_limited):
+        """
+        Fetch matches of one sport starting between now and next_24h (runs in a worker thread)
+        Once any request is rate limited, the remaining sports are skipped.
+        """
+        if rate_limited.is_set():
+            return []
+        
+        sport_matches = []
+        try:
+            url = f"{self.base_url}/sports/{sport_key}/odds"
+            params = {
+                'apiKey': self.api_key,
+                'regions': 'us,uk,au',  # Multiple regions for better coverage
+                'markets': 'h2h',  # Head to head market
+                'oddsFormat': 'decimal',
+                # Let the API filter to the time window
+                'commenceTimeFrom': now.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'commenceTimeTo': next_24h.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }
+            
+            response = http_transport.get(self.provider, url, params=params)
+            
+            if response.status_code == 200:
+                matches = response.json()
+                
+                for match in matches:
+                    try:
+                        # Parse commence_time
+                        commence_time_str = match.get('commence_time', '')
+                        if commence_time_str:
+                            commence_time = datetime.fromisoformat(commence_time_str.replace('Z', '+00:00'))
+                            if timezone.is_naive(commence_time):
+                                commence_time = timezone.make_aware(commence_time)
+                            
+                            # Filter for matches in next 24 hours
+                            if now <= commence_time <= next_24h:
+                                home_team = match.get('home_team', '')
+                                away_team = match.get('away_team', '')
+                                
+                                # Determine which team is team_a and team_b
+                                # Use home_team as team_a and away_team as team_b
+                                # Generate unique team IDs
+                                team_a_id = f"odds_team_{home_team.lower().replace(' ', '_').replace('-', '_')}"
+                                team_b_id = f"odds_team_{away_team.lower().replace(' ', '_').replace('-', '_')}"
+                                
+                                formatted_match = {
+                                    'id': match.get('id', ''),
+                                    'name': f"{home_team} vs {away_team}",
+                                    'team_a': {
+                                        'id': team_a_id,
+                                        'name': home_team
+                                    },
+                                    'team_b': {
+                                        'id': team_b_id,
+                                        'name': away_team
+                                    },
+                                    'status': 'upcoming',
+                                    'date': commence_time.isoformat(),
+                                    'venue': match.get('sport_title', 'TBA'),  # Use sport title as venue fallback
+                                    'sport_key': sport_key,
+                                }
+                                sport_matches.append(formatted_match)
+                    except Exception as e:
+                        logger.warning(f"Error parsing match {match.get('id', 'unknown')}: {str(e)}")
+                        continue
+            
+            elif response.status_code == 429:
+                logger.warning("Rate limit reached for Odds API")
+                rate_limited.set()
+            else:
+                logger.warning(f"Odds API error for sport {sport_key}: {response.status_code}")
+                
+        except Exception as e:
+            logger.error(f"Error fetching matches for sport {sport_key}: {str(e)}")
+        finally:
+            # Cache lookups (breaker, rate limiter) open a DB connection per worker thread
+            connections.close_all()
+        
+        return sport_matches
+    
     def get_match_participants(self, event_id, sport_key='cricket_t20'):
         """
         Get participants/players for a specific match from The Odds API
@@ -495,7 +1123,7 @@ class OddsAPIService:
         
         try:
             url = f"{self.base_url}/sports/{sport_key}/events/{event_id}/participants"
-            response = requests.get(url, params={'apiKey': self.api_key}, timeout=10)
+            response = http_transport.get(self.provider, url, params={'apiKey': self.api_key})
             
             if response.status_code == 200:
                 data = response.json()
@@ -555,7 +1183,7 @@ class OddsAPIService:
                 'markets': 'player_runs,player_wickets',  # Player-specific markets
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = http_transport.get(self.provider, url, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -604,71 +1232,149 @@ class EntitySportAPIService:
     Production-ready service to fetch cricket data from EntitySport API
     Documentation: https://www.entitysport.com/api-doc/
     Uses token-based authentication with automatic token refresh
+    
+    Requests are paced by the shared rate_limiter. With blocking=False (the default,
+    used by web requests) nothing ever sleeps: a call that would have to wait for the
+    rate limit or a retry fails fast and callers fall back to cached data. Management
+    commands set blocking=True to queue for tokens and retry with backoff.
     """
     
+    TOKEN_CACHE_KEY = 'entitysport:auth_token'
+    TOKEN_LOCK_KEY = 'entitysport:auth_token:lock'
+    TOKEN_LOCK_TIMEOUT = 10  # seconds
+    
     def __init__(self):
+        self.provider = 'entitysport'
+        self.blocking = False
         # Production-ready: Use environment variables with fallback to defaults
         self.secret = getattr(settings, 'ENTITYSPORT_API_SECRET', '9bb7fd05727b4215593b85d2ff1afc9a')
         self.access = getattr(settings, 'ENTITYSPORT_API_ACCESS', 'edbf6c0ed9a9960a3fb8dab71fc9af54')
         self.base_url = getattr(settings, 'ENTITYSPORT_API_BASE_URL', 'https://restapi.entitysport.com/v2')
-        self.timeout = 30  # Production timeout
         self.max_retries = 3
-        self.retry_delay = 2  # seconds
+        self.retry_delay = 2  # seconds, base of the exponential backoff
+        self.retry_max_delay = 30  # seconds
+        self.request_deadline = getattr(settings, 'ENTITYSPORT_REQUEST_DEADLINE', 60)  # seconds, across all retries
         
-        # Token management
+        # Token management (local copy of the token shared through the cache)
         self._token = None
         self._token_expires_at = None
         
         if not self.secret or not self.access:
             logger.warning("EntitySport API keys not configured. Set ENTITYSPORT_API_SECRET and ENTITYSPORT_API_ACCESS in settings or environment.")
     
-    def _get_auth_token(self, force_refresh=False):
+    def _get_auth_token(self, force_refresh=False, stale_token=None):
         """
         Get authentication token from EntitySport API
-        Automatically refreshes if expired or unavailable
+        The token is shared by all processes through the cache and read without locking;
+        only one process at a time refreshes it (under a cache lock).
+        force_refresh with stale_token (the token that was just rejected) only refreshes
+        if no other process has replaced that token already.
         Returns token string or None if failed
         """
-        # Check if we have a valid token
-        if not force_refresh and self._token and self._token_expires_at:
-            # Check if token is still valid (with 5 minute buffer)
-            buffer_time = timedelta(minutes=5)
-            if timezone.now() < (self._token_expires_at - buffer_time):
-                return self._token
+        # Check if we have a valid token (with 5 minute buffer)
+        if not force_refresh and self._token_is_valid(self._token, self._token_expires_at):
+            return self._token
+        
+        def usable(shared):
+            # A forced refresh still accepts a token that already replaced the rejected one
+            return shared and (not force_refresh or (stale_token and shared[0] != stale_token))
+        
+        shared = self._get_shared_token()
+        if usable(shared):
+            self._token, self._token_expires_at = shared
+            return self._token
+        
+        try:
+            acquired = cache.add(self.TOKEN_LOCK_KEY, 1, timeout=self.TOKEN_LOCK_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"EntitySport token lock unavailable: {str(e)}")
+            acquired = True
+        
+        if not acquired:
+            # Another process is refreshing: wait for its token instead of a second /auth/ call
+            deadline = time.monotonic() + self.TOKEN_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                shared = self._get_shared_token()
+                if usable(shared):
+                    self._token, self._token_expires_at = shared
+                    return self._token
+            logger.warning("Timed out waiting for EntitySport token refresh, requesting one directly")
         
-        # Need to get a new token
+        try:
+            # Re-check: the token may have been refreshed while we waited for the lock
+            shared = self._get_shared_token()
+            if usable(shared):
+                self._token, self._token_expires_at = shared
+                return self._token
+            
+            token, expires_at = self._request_token()
+            if not token:
+                return None
+            
+            self._token, self._token_expires_at = token, expires_at
+            try:
+                timeout = int((expires_at - timezone.now()).total_seconds())
+                cache.set(self.TOKEN_CACHE_KEY, {'token': token, 'expires_at': expires_at},
+                          timeout=max(60, min(timeout, 30 * 24 * 60 * 60)))
+            except Exception as e:
+                logger.warning(f"Could not share EntitySport token: {str(e)}")
+            return token
+        finally:
+            if acquired:
+                try:
+                    cache.delete(self.TOKEN_LOCK_KEY)
+                except Exception:
+                    pass
+    
+    def _token_is_valid(self, token, expires_at):
+        return bool(token and expires_at and timezone.now() < expires_at - timedelta(minutes=5))
+    
+    def _get_shared_token(self):
+        """(token, expires_at) from the shared cache if still valid, else None"""
+        try:
+            shared = cache.get(self.TOKEN_CACHE_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read shared EntitySport token: {str(e)}")
+            return None
+        if shared and self._token_is_valid(shared['token'], shared['expires_at']):
+            return shared['token'], shared['expires_at']
+        return None
+    
+    def _request_token(self):
+        """
+        POST to the EntitySport /auth/ endpoint
+        Returns (token, expires_at) or (None, None) if failed
+        """
         if not requests:
             logger.error("requests library not available")
-            return None
+            return None, None
         
         if not self.secret or not self.access:
             logger.error("EntitySport API keys not configured")
-            return None
+            return None, None
         
         try:
             url = f"{self.base_url}/auth/"
-            response = requests.post(
+            response = http_transport.post(
+                self.provider,
                 url,
                 data={
                     'access_key': self.access,
                     'secret_key': self.secret,
                     'extend': '1'  # Token expires on subscription end date
-                },
-                timeout=self.timeout,
-                headers={
-                    'User-Agent': 'CricketDuel/1.0',
-                    'Accept': 'application/json'
                 }
             )
             
             if response.status_code != 200:
                 logger.error(f"EntitySport Auth API error: {response.status_code} - {response.text[:200]}")
-                return None
+                return None, None
             
             data = response.json()
             
             if data.get('status') != 'ok':
                 logger.error(f"EntitySport Auth API returned error: {data.get('status', 'unknown')}")
-                return None
+                return None, None
             
             response_data = data.get('response', {})
             token = response_data.get('token')
@@ -676,7 +1382,7 @@ class EntitySportAPIService:
             
             if not token:
                 logger.error("No token received from EntitySport Auth API")
-                return None
+                return None, None
             
             # Parse expiration date
             if expires:
@@ -685,41 +1391,40 @@ class EntitySportAPIService:
                     if isinstance(expires, int):
                         # Unix timestamp (seconds since epoch)
                         from datetime import datetime as dt
-                        self._token_expires_at = timezone.make_aware(dt.fromtimestamp(expires))
+                        expires_at = timezone.make_aware(dt.fromtimestamp(expires))
                     elif isinstance(expires, str):
                         # String format: "2025-12-31 23:59:59" or ISO format
                         if 'T' in expires:
-                            self._token_expires_at = datetime.fromisoformat(expires.replace('Z', '+00:00'))
+                            expires_at = datetime.fromisoformat(expires.replace('Z', '+00:00'))
                         else:
-                            self._token_expires_at = datetime.strptime(expires, '%Y-%m-%d %H:%M:%S')
+                            expires_at = datetime.strptime(expires, '%Y-%m-%d %H:%M:%S')
                         
-                        if timezone.is_naive(self._token_expires_at):
-                            self._token_expires_at = timezone.make_aware(self._token_expires_at)
+                        if timezone.is_naive(expires_at):
+                            expires_at = timezone.make_aware(expires_at)
                     else:
                         # Unknown format, use default
                         raise ValueError(f"Unknown expiration format: {type(expires)}")
                 except (ValueError, AttributeError, TypeError, OSError) as e:
                     logger.warning(f"Could not parse token expiration date: {expires} (type: {type(expires)}), using 24 hours default. Error: {str(e)}")
-                    self._token_expires_at = timezone.now() + timedelta(hours=24)
+                    expires_at = timezone.now() + timedelta(hours=24)
             else:
                 # Default to 24 hours if no expiration provided
-                self._token_expires_at = timezone.now() + timedelta(hours=24)
+                expires_at = timezone.now() + timedelta(hours=24)
             
-            self._token = token
-            logger.info(f"Successfully obtained EntitySport API token (expires: {self._token_expires_at})")
-            return token
+            logger.info(f"Successfully obtained EntitySport API token (expires: {expires_at})")
+            return token, expires_at
             
         except requests.exceptions.Timeout:
             logger.error("Request timeout while getting auth token")
-            return None
+            return None, None
         except requests.exceptions.RequestException as e:
             logger.error(f"Request error while getting auth token: {str(e)}")
-            return None
+            return None, None
         except Exception as e:
             logger.error(f"Unexpected error getting auth token: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
-            return None
+            return None, None
     
     @property
     def token(self):
@@ -728,9 +1433,11 @@ class EntitySportAPIService:
         """
         return self._get_auth_token()
     
-    def _make_request(self, endpoint, params=None, retry_count=0):
+    def _make_request(self, endpoint, params=None):
         """
-        Make HTTP request with retry logic and proper error handling
+        Make HTTP request with rate limiting, retry logic and proper error handling
+        Rate limits (429) and timeouts are retried with exponential backoff and jitter
+        until max_retries or request_deadline is reached
         """
         if not requests:
             logger.error("requests library not available")
@@ -740,78 +1447,105 @@ class EntitySportAPIService:
             logger.error("EntitySport API token not configured")
             return None
         
-        try:
-            # Get valid token (will refresh if needed)
-            current_token = self.token
-            if not current_token:
-                logger.error("Could not obtain valid token for EntitySport API")
+        deadline = time.monotonic() + self.request_deadline
+        attempt = 0
+        token_refreshed = False
+        
+        while True:
+            # Wait for a rate limit token up front instead of getting throttled
+            max_wait = max(0, deadline - time.monotonic()) if self.blocking else 0
+            wait = rate_limiter.reserve(self.provider, max_wait=max_wait)
+            if wait is None:
+                logger.warning(f"EntitySport rate limit reached, skipping {endpoint}")
                 return None
+            if wait:
+                time.sleep(wait)
             
-            url = f"{self.base_url}/{endpoint}"
-            request_params = {'token': current_token}
-            if params:
-                request_params.update(params)
-            
-            response = requests.get(
-                url,
-                params=request_params,
-                timeout=self.timeout,
-                headers={
-                    'User-Agent': 'CricketDuel/1.0',
-                    'Accept': 'application/json'
-                }
-            )
-            
-            # Handle rate limiting
-            if response.status_code == 429:
-                if retry_count < self.max_retries:
-                    logger.warning(f"Rate limited. Retrying in {self.retry_delay} seconds...")
-                    import time
-                    time.sleep(self.retry_delay)
-                    return self._make_request(endpoint, params, retry_count + 1)
-                else:
+            try:
+                # Get valid token (will refresh if needed)
+                current_token = self.token
+                if not current_token:
+                    logger.error("Could not obtain valid token for EntitySport API")
+                    return None
+                
+                url = f"{self.base_url}/{endpoint}"
+                request_params = {'token': current_token}
+                if params:
+                    request_params.update(params)
+                
+                response = http_transport.get(self.provider, url, params=request_params)
+                
+                # Handle rate limiting
+                if response.status_code == 429:
+                    if self._backoff(attempt, deadline, response.headers.get('Retry-After')):
+                        attempt += 1
+                        continue
                     logger.error("Max retries reached for rate limit")
                     return None
-            
-            # Handle other HTTP errors
-            if response.status_code != 200:
-                logger.error(f"EntitySport API error: {response.status_code} - {response.text[:200]}")
-                # If unauthorized, try refreshing token once
-                if response.status_code == 401 and retry_count == 0:
-                    logger.warning("Token may be expired, attempting to refresh...")
-                    self._get_auth_token(force_refresh=True)
-                    return self._make_request(endpoint, params, retry_count + 1)
+                
+                # Handle other HTTP errors
+                if response.status_code != 200:
+                    logger.error(f"EntitySport API error: {response.status_code} - {response.text[:200]}")
+                    # If unauthorized, try refreshing token once
+                    if response.status_code == 401 and not token_refreshed:
+                        logger.warning("Token may be expired, attempting to refresh...")
+                        self._get_auth_token(force_refresh=True, stale_token=current_token)
+                        token_refreshed = True
+                        continue
+                    return None
+                
+                data = response.json()
+                
+                # Check API response status
+                if data.get('status') != 'ok':
+                    error_msg = data.get('status', 'unknown')
+                    logger.error(f"EntitySport API returned error: {error_msg}")
+                    # If token error, try refreshing token once
+                    if 'token' in error_msg.lower() or 'auth' in error_msg.lower():
+                        if not token_refreshed:
+                            logger.warning("Token may be invalid, attempting to refresh...")
+                            self._get_auth_token(force_refresh=True, stale_token=current_token)
+                            token_refreshed = True
+                            continue
+                    return None
+                
+                return data.get('response', {})
+                
+            except requests.exceptions.Timeout:
+                logger.error(f"Request timeout for {endpoint}")
+                if self._backoff(attempt, deadline):
+                    attempt += 1
+                    continue
                 return None
-            
-            data = response.json()
-            
-            # Check API response status
-            if data.get('status') != 'ok':
-                error_msg = data.get('status', 'unknown')
-                logger.error(f"EntitySport API returned error: {error_msg}")
-                # If token error, try refreshing token once
-                if 'token' in error_msg.lower() or 'auth' in error_msg.lower():
-                    if retry_count == 0:
-                        logger.warning("Token may be invalid, attempting to refresh...")
-                        self._get_auth_token(force_refresh=True)
-                        return self._make_request(endpoint, params, retry_count + 1)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Request error for {endpoint}: {str(e)}")
+                return None
+            except Exception as e:
+                logger.error(f"Unexpected error fetching from EntitySport API: {str(e)}")
                 return None
-            
-            return data.get('response', {})
-            
-        except requests.exceptions.Timeout:
-            logger.error(f"Request timeout for {endpoint}")
-            if retry_count < self.max_retries:
-                import time
-                time.sleep(self.retry_delay)
-                return self._make_request(endpoint, params, retry_count + 1)
-            return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error for {endpoint}: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error fetching from EntitySport API: {str(e)}")
-            return None
+    
+    def _backoff(self, attempt, deadline, retry_after=None):
+        """
+        Sleep before the next retry (exponential backoff with full jitter).
+        Returns False when the request should give up instead: non-blocking mode,
+        retries exhausted, or the wait would pass the deadline.
+        """
+        if not self.blocking or attempt >= self.max_retries:
+            return False
+        
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_delay * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        
+        if time.monotonic() + delay >= deadline:
+            return False
+        
+        logger.warning(f"Retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+        return True
     
     def get_live_matches(self):
         """
@@ -958,7 +1692,15 @@ class EntitySportAPIService:
         """
         Get squad/players for a match from EntitySport API
         Returns dict with team_a_players and team_b_players
+        Cached for hours (squads rarely change during a match)
         """
+        return provider_cache.get_or_fetch(
+            self.provider, 'squads', [match_id],
+            lambda: self._fetch_match_squad(match_id),
+            is_valid=lambda data: bool(data.get('team_a_players') or data.get('team_b_players'))
+        )
+    
+    def _fetch_match_squad(self, match_id):
         try:
             response_data = self._make_request(f'matches/{match_id}/squads')
             if not response_data:
@@ -998,7 +1740,14 @@ class EntitySportAPIService:
         Get live match data for a specific match
         Endpoint: /matches/{match_id}/live
         Returns dict with live scores, current players, etc.
+        Cached for a few seconds and shared by all workers
         """
+        return provider_cache.get_or_fetch(
+            self.provider, 'live', [match_id],
+            lambda: self._fetch_match_live_data(match_id)
+        )
+    
+    def _fetch_match_live_data(self, match_id):
         try:
             response_data = self._make_request(f'matches/{match_id}/live')
             if not response_data:
@@ -1014,49 +1763,29 @@ class EntitySportAPIService:
         """
         Get current score and player stats for a match
         Returns dict with player runs, wickets, etc.
+        Cached for a few seconds and shared by all workers
         """
+        return provider_cache.get_or_fetch(
+            self.provider, 'score', [match_id],
+            lambda: self._fetch_match_score(match_id),
+            is_valid=lambda data: bool(data.get('player_stats'))
+        )
+    
+    def _fetch_match_score(self, match_id):
+        from .scorecard import entitysport_player_stats
+        
         try:
             # Try live endpoint first for real-time data
-            live_data = self.get_match_live_data(match_id)
-            if live_data:
-                # Extract player stats from live data
-                scorecard = live_data.get('scorecard', {})
-                innings = scorecard.get('innings', [])
-                
-                player_stats = {}
-                for inning in innings:
-                    batting = inning.get('batting', [])
-                    for batsman in batting:
-                        player_id = f"entitysport_player_{batsman.get('player_id', '')}"
-                        player_stats[player_id] = {
-                            'runs': batsman.get('runs', 0),
-                            'balls': batsman.get('balls', 0),
-                            'wickets': 0
-                        }
-                
-                if player_stats:
-                    return {'player_stats': player_stats}
+            player_stats = entitysport_player_stats(self.get_match_live_data(match_id))
+            if player_stats:
+                return {'player_stats': player_stats}
             
             # Fallback to scorecard endpoint
             response_data = self._make_request(f'matches/{match_id}/scorecard')
             if not response_data:
                 return {}
             
-            scorecard = response_data.get('scorecard', {})
-            innings = scorecard.get('innings', [])
-            
-            player_stats = {}
-            for inning in innings:
-                batting = inning.get('batting', [])
-                for batsman in batting:
-                    player_id = f"entitysport_player_{batsman.get('player_id', '')}"
-                    player_stats[player_id] = {
-                        'runs': batsman.get('runs', 0),
-                        'balls': batsman.get('balls', 0),
-                        'wickets': 0
-                    }
-            
-            return {'player_stats': player_stats}
+            return {'player_stats': entitysport_player_stats(response_data)}
             
         except Exception as e:
             logger.error(f"Error fetching scorecard for match {match_id}: {str(e)}")
@@ -1064,6 +1793,12 @@ class EntitySportAPIService:
 
 
 # Singleton instances
+provider_fixtures = ProviderFixtures()
+circuit_breaker = CircuitBreaker()
+http_transport = ProviderTransport()
+single_flight = SingleFlight()
+rate_limiter = RateLimiter()
+provider_cache = ProviderCache()
 cricket_api = CricketAPIService()
 odds_api = OddsAPIService()
 entitysport_api = EntitySportAPIService()
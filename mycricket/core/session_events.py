@@ -0,0 +1,185 @@
+"""
+Betting session change events for the session page's Server-Sent Events stream.
+
+Views that change a session call publish_session_event(), which bumps the
+session's version and announces it once their transaction commits. The
+event is handed to the streams of this process through an in-process broker
+and stored in the cache, where streams in other processes pick it up on
+their periodic check. An idle stream therefore costs
+no database queries instead of one full poll of check_session_updates per
+second per participant. That only holds with a shared cache outside the
+database (Redis, Memcached), so streams are only served with one of those
+(streams_enabled); with the default DatabaseCache the page keeps polling.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from .models import BettingSession
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_TIMEOUT = 60 * 60  # seconds
+
+DEFAULT_STREAM_CONFIG = {
+    'check_interval': 5,  # seconds between cache checks for events from other processes
+    'keepalive': 15,      # seconds between keepalive comments on an idle stream
+    'max_age': 300,       # seconds before the stream closes and the browser reconnects
+    'enabled': True,      # set False to always fall back to polling
+}
+
+# Cache backends streams can rely on: shared between processes, and not the database
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+def get_stream_config():
+    return dict(DEFAULT_STREAM_CONFIG, **getattr(settings, 'SESSION_EVENTS', {}))
+
+
+def streams_enabled():
+    """
+    Whether session_events serves streams: only with a shared non-database cache, where
+    checking idle streams for events from other processes does not query the database
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    return bool(get_stream_config()['enabled']) and backend in SHARED_CACHE_BACKENDS
+
+
+class SessionEventBroker:
+    """In-process fan-out of session events to the SSE streams served by this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, session_id):
+        """Queue receiving the session's events; must be called from the stream's event loop"""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, session_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(session_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(session_id, None)
+
+    def publish(self, session_id, event):
+        """Deliver an event to every stream of the session (safe to call from any thread)"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The stream's event loop has shut down
+                self.unsubscribe(session_id, queue)
+
+
+def _channel_key(session_id):
+    return f'session_events:{session_id}'
+
+
+def publish_session_event(session_id, event, version=None):
+    """
+    Record a change to a session ('joined', 'toss', 'pick', 'bet', 'settled', 'updated'):
+    bump its version within the current transaction, and announce the new version once
+    it commits, so listeners never see uncommitted state.
+    Pass version when the caller already incremented it in its own UPDATE.
+    Without streams (streams_enabled) pages poll the version, so nothing else is done.
+    """
+    if version is None:
+        BettingSession.bump_version(session_id)
+    if not streams_enabled():
+        return
+
+    def send():
+        current = version
+        if current is None:
+            current = BettingSession.objects.filter(id=session_id).values_list('version', flat=True).first()
+            if current is None:
+                return
+        payload = {'session_id': session_id, 'event': event, 'version': current}
+        try:
+            cache.set(_channel_key(session_id), payload, timeout=CHANNEL_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not store event for session {session_id}: {str(e)}")
+        session_broker.publish(session_id, payload)
+
+    transaction.on_commit(send)
+
+
+def publish_session_events(versions, event):
+    """
+    Announce the same change to many sessions ({session_id: version}, versions already
+    incremented by the caller's UPDATE) with one cache write once the transaction commits.
+    """
+    if not streams_enabled():
+        return
+
+    def send():
+        payloads = {
+            _channel_key(session_id): {'session_id': session_id, 'event': event, 'version': version}
+            for session_id, version in versions.items()
+        }
+        try:
+            cache.set_many(payloads, timeout=CHANNEL_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not store events for {len(payloads)} sessions: {str(e)}")
+        for payload in payloads.values():
+            session_broker.publish(payload['session_id'], payload)
+
+    transaction.on_commit(send)
+
+
+async def _latest_event(session_id):
+    try:
+        return await cache.aget(_channel_key(session_id))
+    except Exception as e:
+        logger.warning(f"Session event channel unavailable: {str(e)}")
+        return None
+
+
+async def session_event_stream(session_id):
+    """SSE body: one 'data:' message per session change, keepalive comments while idle"""
+    config = get_stream_config()
+    queue = session_broker.subscribe(session_id)
+    try:
+        last = await _latest_event(session_id)
+        yield f"retry: {config['check_interval'] * 1000}\n\n"
+
+        started = time.monotonic()
+        idle = 0
+        while time.monotonic() - started < config['max_age']:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=config['check_interval'])
+            except asyncio.TimeoutError:
+                # Events published by other processes only reach us through the cache
+                event = await _latest_event(session_id)
+
+            if not event or (last and event['version'] <= last['version']):
+                idle += config['check_interval']
+                if idle >= config['keepalive']:
+                    idle = 0
+                    yield ': keepalive\n\n'
+                continue
+
+            last = event
+            idle = 0
+            yield f"id: {event['version']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        session_broker.unsubscribe(session_id, queue)
+
+
+session_broker = SessionEventBroker()
@@ -0,0 +1,332 @@
+"""
+View model for the betting session page.
+
+build_session_view() loads everything the page shows in a fixed number of
+queries, however many players have been picked:
+  1. the session with its match, teams, betters, turn and toss winner
+  2. all picks with their players and teams
+  3. all bets                          (details only)
+  4. the players still available       (details only, while picking)
+  5. the stored player stats           (details only, live or completed sessions)
+and works out both betters' picks and totals in one pass. session_detail
+renders it, check_session_updates and other JSON clients serialize it.
+
+Completed sessions only change through settlement corrections, which bump the
+session version, so get_session_view() caches their loaded rows under
+(session id, version) and settled duels reopened from bet history cost one
+version lookup. Only plain field values are cached (for the betters just id
+and names), never model or auth instances; the SessionView is rebuilt from
+them for each request.
+"""
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from django.contrib.auth.models import User
+
+from .models import BettingSession, PickedPlayer, Bet, Player, Match, Team
+from .scorecard import Scorecard
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIMEOUT = 24 * 60 * 60  # seconds; entries of older versions are never read again and just expire
+
+# The only User fields cached for the betters (no password hash, email or permissions)
+CACHED_USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+class BetterView:
+    """One better's side of a session: picks (with bet and stats attached) and totals"""
+
+    def __init__(self, user, team_a_count, team_b_count):
+        self.user = user
+        self.picks = []
+        self.bets = []
+        self.team_a_count = team_a_count
+        self.team_b_count = team_b_count
+        self.total_runs = 0
+        self.total_value = Decimal('0.00')
+
+
+class SessionView:
+    """Computed state of a betting session for one page view or update poll"""
+
+    def __init__(self, session, picks, bets=None, available=None, scorecard=None):
+        self.session = session
+        self.better_a = BetterView(session.better_a, session.better_a_team_a_picks, session.better_a_team_b_picks)
+        self.better_b = BetterView(session.better_b, session.better_b_team_a_picks, session.better_b_team_b_picks)
+        self.all_picks = picks
+        self.bets = bets or []
+        self.scorecard = scorecard
+        self.team_a_available = [player for player in available or [] if player.team_id == session.match.team_a_id]
+        self.team_b_available = [player for player in available or [] if player.team_id == session.match.team_b_id]
+        self.winner = None
+        self.current_leader = None
+        self.difference = Decimal('0.00')
+        self._compute(bets or [], scorecard)
+
+    def _compute(self, bets, scorecard):
+        session = self.session
+        # Stats are only worked out when they were loaded (see build_session_view)
+        completed = scorecard is not None and session.status == 'completed'
+        live = scorecard is not None and not completed and session.match.status == 'live'
+        bets_by_pick = {bet.picked_player_id: bet for bet in bets}
+        bet_amount = session.fixed_bet_amount or Decimal('0.00')
+
+        for pick in self.all_picks:
+            side = self.better_a if pick.better_id == session.better_a_id else self.better_b
+            pick.bet = bets_by_pick.get(pick.id)
+            if pick.bet:
+                side.bets.append(pick.bet)
+            side.picks.append(pick)
+
+            if completed:
+                # Runs come from the settled bet, falling back to the stored stats
+                runs = pick.bet.runs_scored if pick.bet and pick.bet.runs_scored is not None else 0
+                if pick.bet and pick.bet.runs_scored is not None:
+                    side.total_runs += pick.bet.runs_scored
+                pick.balls_faced = scorecard.balls(pick.player_id) if scorecard else 0
+                pick.runs_scored = runs or (scorecard.runs(pick.player_id) if scorecard else 0)
+                pick.player_value = Decimal(str(pick.runs_scored)) * bet_amount
+            elif live:
+                pick.runs_scored = scorecard.runs(pick.player_id)
+                pick.balls_faced = scorecard.balls(pick.player_id)
+                pick.player_value = Decimal(str(pick.runs_scored)) * bet_amount
+                pick.has_batted = pick.runs_scored > 0 or pick.balls_faced > 0
+                pick.is_active = pick.balls_faced > 0  # Currently playing if they have faced balls
+                side.total_runs += pick.runs_scored
+
+        if not (completed or live):
+            return
+
+        if session.fixed_bet_amount:
+            for side in (self.better_a, self.better_b):
+                side.total_value = Decimal(str(side.total_runs)) * session.fixed_bet_amount
+            self.difference = abs(self.better_a.total_value - self.better_b.total_value)
+
+        leader = None
+        if self.better_a.total_value > self.better_b.total_value:
+            leader = session.better_a
+        elif self.better_b.total_value > self.better_a.total_value:
+            leader = session.better_b
+
+        for side in (self.better_a, self.better_b):
+            if completed:
+                # Highest scorers first
+                side.picks.sort(key=lambda pick: pick.runs_scored or 0, reverse=True)
+            else:
+                # Active players first, then batted players, then yet to bat
+                side.picks.sort(key=lambda pick: (pick.is_active, pick.has_batted, pick.runs_scored), reverse=True)
+
+        if completed:
+            self.winner = leader
+        else:
+            self.current_leader = leader
+
+    def is_my_turn(self, user):
+        return self.session.current_turn_id == user.id if self.session.current_turn_id else False
+
+    def context(self, user):
+        """Template context for core/session_detail.html"""
+        session = self.session
+        return {
+            'session': session,
+            'better_a_picks': self.better_a.picks,
+            'better_b_picks': self.better_b.picks,
+            'better_a_bets': self.better_a.bets,
+            'better_b_bets': self.better_b.bets,
+            'team_a_available': self.team_a_available,
+            'team_b_available': self.team_b_available,
+            'better_a_team_a_count': self.better_a.team_a_count,
+            'better_a_team_b_count': self.better_a.team_b_count,
+            'better_b_team_a_count': self.better_b.team_a_count,
+            'better_b_team_b_count': self.better_b.team_b_count,
+            'is_my_turn': self.is_my_turn(user),
+            'toss_completed': session.toss_completed,
+            'toss_winner': session.toss_winner,
+            'can_perform_toss': session.status == 'pending' and session.better_b_id != session.better_a_id,
+            'better_a_total_runs': self.better_a.total_runs,
+            'better_b_total_runs': self.better_b.total_runs,
+            'better_a_total_value': self.better_a.total_value,
+            'better_b_total_value': self.better_b.total_value,
+            'difference': self.difference,
+            'winner': self.winner,
+            'current_leader': self.current_leader,
+        }
+
+    def as_json(self, user, recent_seconds=30):
+        """JSON-ready session state for update polling (check_session_updates)"""
+        session = self.session
+        recent_since = timezone.now() - timedelta(seconds=recent_seconds)
+        recent_picks = sorted(
+            (pick for pick in self.all_picks if pick.picked_at >= recent_since),
+            key=lambda pick: pick.picked_at, reverse=True
+        )[:5]  # Last 5 picks
+
+        def pick_list(side):
+            return [
+                {
+                    'player_id': pick.player.id,
+                    'player_name': pick.player.name,
+                    'team_name': pick.player.team.name
+                }
+                for pick in side.picks
+            ]
+
+        return {
+            'session_id': session.id,
+            'status': session.status,
+            'current_turn': session.current_turn.username if session.current_turn else None,
+            'current_turn_id': session.current_turn_id,
+            'is_my_turn': self.is_my_turn(user),
+            'updated_at': session.updated_at.isoformat(),
+            'version': session.version,
+            'picks_completed': session.picks_completed,
+            'better_a_picks_count': session.better_a_picks_count,
+            'better_b_picks_count': session.better_b_picks_count,
+            'better_a_team_a_count': self.better_a.team_a_count,
+            'better_a_team_b_count': self.better_a.team_b_count,
+            'better_b_team_a_count': self.better_b.team_a_count,
+            'better_b_team_b_count': self.better_b.team_b_count,
+            'better_a_username': session.better_a.username,
+            'better_b_username': session.better_b.username,
+            'better_a_picks': pick_list(self.better_a),
+            'better_b_picks': pick_list(self.better_b),
+            'recent_picks': [
+                {
+                    'player_id': pick.player.id,
+                    'player_name': pick.player.name,
+                    'better_username': session.better_a.username if pick.better_id == session.better_a_id else session.better_b.username,
+                    'picked_at': pick.picked_at.isoformat(),
+                    'is_opponent': pick.better_id != user.id
+                }
+                for pick in recent_picks
+            ]
+        }
+
+
+def build_session_view(session_id, details=True):
+    """
+    Load a session and build its SessionView.
+    details=False loads only the session and its picks (enough for update polling).
+    Raises Http404 for an unknown session.
+    """
+    session = get_object_or_404(
+        BettingSession.objects.select_related(
+            'match', 'match__team_a', 'match__team_b', 'better_a', 'better_b', 'current_turn', 'toss_winner'
+        ),
+        id=session_id
+    )
+    picks = list(
+        PickedPlayer.objects.filter(session=session).select_related('player', 'player__team').order_by('picked_at')
+    )
+    if not details:
+        return SessionView(session, picks)
+
+    bets = list(Bet.objects.filter(session=session).order_by()) if picks else []
+
+    available = None
+    if session.status == 'picking':
+        available = list(
+            Player.objects.filter(team_id__in=[session.match.team_a_id, session.match.team_b_id])
+            .exclude(id__in=[pick.player_id for pick in picks])
+        )
+
+    scorecard = None
+    if picks and (session.status == 'completed' or session.match.status == 'live'):
+        scorecard = Scorecard.from_match_stats(session.match)
+
+    return SessionView(session, picks, bets, available, scorecard)
+
+
+def _cache_key(session_id, version):
+    return f'session_view:{session_id}:v{version}'
+
+
+def _row(instance, fields=None):
+    """Field values of a model instance, foreign keys as ids"""
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if fields is None or field.attname in fields
+    }
+
+
+def _snapshot(view):
+    """Cacheable plain data of a details SessionView (see _restore)"""
+    session = view.session
+    match = session.match
+    return {
+        'session': _row(session),
+        'match': _row(match),
+        'teams': [_row(match.team_a), _row(match.team_b)],
+        'users': [_row(user, CACHED_USER_FIELDS) for user in (session.better_a, session.better_b)],
+        'picks': [(_row(pick), _row(pick.player)) for pick in view.all_picks],
+        'bets': [_row(bet) for bet in view.bets],
+        'scorecard': None if view.scorecard is None else {
+            player_id: tuple(line) for player_id, line in view.scorecard.items()
+        },
+    }
+
+
+def _restore(data):
+    """Rebuild a SessionView from _snapshot data without queries"""
+    teams = {row['id']: Team(**row) for row in data['teams']}
+    users = {row['id']: User(**row) for row in data['users']}
+    match = Match(**data['match'])
+    match.team_a, match.team_b = teams[match.team_a_id], teams[match.team_b_id]
+    session = BettingSession(**data['session'])
+    session.match = match
+    session.better_a, session.better_b = users[session.better_a_id], users[session.better_b_id]
+    # Turn and toss always belong to one of the betters
+    session.current_turn = users.get(session.current_turn_id)
+    session.toss_winner = users.get(session.toss_winner_id)
+
+    picks = []
+    for pick_row, player_row in data['picks']:
+        player = Player(**player_row)
+        player.team = teams.get(player.team_id)
+        pick = PickedPlayer(**pick_row)
+        pick.session, pick.player, pick.better = session, player, users.get(pick.better_id)
+        picks.append(pick)
+    bets = [Bet(**row) for row in data['bets']]
+    scorecard = None if data['scorecard'] is None else Scorecard(match.id, lines=data['scorecard'])
+    return SessionView(session, picks, bets, None, scorecard)
+
+
+def get_session_view(session_id):
+    """
+    SessionView for the session page, rebuilt from the cache for completed sessions.
+    Raises Http404 for an unknown session.
+    """
+    state = BettingSession.objects.filter(id=session_id).values('status', 'version').first()
+    if state is None:
+        raise Http404("Session not found")
+    if state['status'] != 'completed':
+        return build_session_view(session_id)
+
+    key = _cache_key(session_id, state['version'])
+    try:
+        data = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Session view cache unavailable for session {session_id}: {str(e)}")
+        data = None
+    if isinstance(data, dict):
+        try:
+            return _restore(data)
+        except Exception as e:
+            # Written by an older version of the models; rebuilt and replaced below
+            logger.warning(f"Discarding cached view of session {session_id}: {str(e)}")
+
+    view = build_session_view(session_id)
+    # Only cache what was built from the version in the key
+    if view.session.status == 'completed' and view.session.version == state['version']:
+        try:
+            cache.set(key, _snapshot(view), timeout=CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not cache session view for session {session_id}: {str(e)}")
+    return view
@@ -0,0 +1,358 @@
+"""
+Settlement of completed matches.
+
+settle_match() fetches the final scorecard once, then settles the match's
+open sessions in chunks: each chunk locks its sessions, works out every
+session's totals in memory and writes its Bets and sessions with a handful
+of set-based UPDATEs, in its own transaction. A chunk that committed stays
+settled, so running it again after a crash picks up the remaining sessions.
+Used by the settle_match management command and the Match admin action.
+
+settle_match_bets() settles the back/lay match bets of a match.
+
+settle_matches() runs both for several matches across a process pool, one
+match per task and one database connection per worker, recording each
+match's progress in a SettlementCheckpoint (settle_matches command).
+"""
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+import logging
+import multiprocessing
+import time
+
+from .live_scores import fetch_scorecard, store_scorecard
+from .models import (
+    Match, BettingSession, Bet, Wallet, Transaction, MatchBetBalance, MatchUserExposure, SettlementCheckpoint
+)
+from .scorecard import Scorecard
+from .session_events import publish_session_events
+from . import wallet_ops
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Sessions in these states are never settled
+CLOSED_STATUSES = ('completed', 'cancelled')
+
+
+class SettlementError(Exception):
+    """Raised when a match cannot be settled (e.g. no final scorecard)"""
+
+
+class SettlementResult:
+    """Counts of what a settle_match run wrote"""
+
+    def __init__(self, match):
+        self.match = match
+        self.sessions = 0
+        self.bets = 0
+        self.chunks = 0
+        self.stats_updated = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f'{self.sessions} sessions, {self.bets} bets settled in {self.chunks} chunks '
+                f'({self.elapsed:.2f}s)')
+
+
+def get_final_scorecard(match):
+    """
+    Final Scorecard for a match: fetched from the providers once, falling back
+    to the stored PlayerMatchStats when no provider has the stats.
+    """
+    scorecard = fetch_scorecard(match)
+    if not scorecard:
+        scorecard = Scorecard.from_match_stats(match)
+    return scorecard
+
+
+def settle_sessions(session_ids, scorecard):
+    """
+    Settle one chunk of sessions in a single transaction (settle_session semantics:
+    unsettled bets get their runs and payout, the better with the higher total value
+    wins the difference). Sessions settled in the meantime are skipped.
+    Returns (sessions settled, bets settled).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        sessions = list(
+            BettingSession.objects.select_for_update()
+            .filter(id__in=session_ids)
+            .exclude(status__in=CLOSED_STATUSES)
+            .order_by('id')
+        )
+        if not sessions:
+            return 0, 0
+        session_ids = [session.id for session in sessions]
+
+        bets = Bet.objects.filter(session_id__in=session_ids, is_settled=False).order_by().values_list(
+            'session_id', 'better_id', 'picked_player__player_id'
+        )
+        totals = {session.id: {session.better_a_id: 0, session.better_b_id: 0} for session in sessions}
+        players_by_runs = defaultdict(set)
+        bet_count = 0
+        for session_id, better_id, player_id in bets:
+            runs = scorecard.runs(player_id)
+            players_by_runs[runs].add(player_id)
+            totals[session_id][better_id] = totals[session_id].get(better_id, 0) + runs
+            bet_count += 1
+
+        # One UPDATE per distinct score (a match has a few dozen at most) rather than a CASE per bet
+        for runs, player_ids in players_by_runs.items():
+            Bet.objects.filter(
+                session_id__in=session_ids, is_settled=False, picked_player__player_id__in=player_ids
+            ).update(
+                runs_scored=runs, total_payout=F('amount_per_run') * Decimal(runs), is_settled=True, updated_at=now
+            )
+
+        winnings_changed = []
+        for session in sessions:
+            session_totals = totals[session.id]
+            better_a_value = Decimal(str(session_totals[session.better_a_id])) * session.fixed_bet_amount
+            better_b_value = Decimal(str(session_totals[session.better_b_id])) * session.fixed_bet_amount
+            difference = abs(better_a_value - better_b_value)
+            winnings = (
+                difference if better_a_value > better_b_value else Decimal('0.00'),
+                difference if better_b_value > better_a_value else Decimal('0.00'),
+            )
+            if winnings != (session.better_a_total_winnings, session.better_b_total_winnings):
+                session.better_a_total_winnings, session.better_b_total_winnings = winnings
+                winnings_changed.append(session)
+
+        if winnings_changed:
+            BettingSession.objects.bulk_update(winnings_changed, ['better_a_total_winnings', 'better_b_total_winnings'])
+        BettingSession.objects.filter(id__in=session_ids).update(
+            status='completed', version=F('version') + 1, updated_at=now
+        )
+        versions = BettingSession.objects.filter(id__in=session_ids).order_by().values_list('id', 'version')
+        publish_session_events(dict(versions), 'settled')
+
+    return len(sessions), bet_count
+
+
+def settle_match(match, chunk_size=DEFAULT_CHUNK_SIZE, scorecard=None, progress=None):
+    """
+    Settle every open betting session of a completed match.
+    scorecard: final Scorecard, fetched once (get_final_scorecard) when not given.
+    progress: optional callable(result) invoked after each committed chunk.
+    Raises SettlementError if the match is not completed or has no stats.
+    """
+    if match.status != 'completed':
+        raise SettlementError(f"Match {match.id} is not completed yet")
+
+    started = time.monotonic()
+    result = SettlementResult(match)
+    session_ids = list(
+        BettingSession.objects.filter(match=match).exclude(status__in=CLOSED_STATUSES)
+        .order_by('id').values_list('id', flat=True)
+    )
+    if not session_ids:
+        return result
+
+    if scorecard is None:
+        scorecard = get_final_scorecard(match)
+    if not scorecard:
+        # Settling without stats would score every pick 0 runs
+        raise SettlementError(f"No player stats available for match {match.id}")
+    result.stats_updated = len(store_scorecard(match, scorecard))
+
+    for start in range(0, len(session_ids), chunk_size):
+        chunk = session_ids[start:start + chunk_size]
+        sessions, bets = settle_sessions(chunk, scorecard)
+        result.sessions += sessions
+        result.bets += bets
+        result.chunks += 1
+        if progress:
+            progress(result)
+
+    result.elapsed = time.monotonic() - started
+    logger.info(f"Settled match {match.id}: {result}")
+    return result
+
+
+def settle_match_bets(match):
+    """
+    Settle the back/lay match bets of a completed match: each end user's profit or loss
+    on the winner is credited to their wallet (wins) or recorded (losses), and their
+    exposure is marked settled. Session bets are skipped; they need separate logic.
+    Raises SettlementError if the match is not completed, already settled or has no winner.
+    Returns the number of exposures settled.
+    """
+    if match.status != 'completed':
+        raise SettlementError('Match is not completed yet')
+    if match.is_settled:
+        raise SettlementError('Match bets have already been settled')
+    if not match.winner:
+        raise SettlementError('Match winner must be set before settling bets')
+
+    with transaction.atomic():
+        # All users with exposure for this match, and all their balances, in two queries
+        exposures = list(
+            MatchUserExposure.objects.filter(match=match, is_settled=False)
+            .select_related('user', 'user__profile')
+        )
+        balances = defaultdict(list)
+        for balance in MatchBetBalance.objects.filter(match=match).exclude(bet_type='session').order_by():
+            balances[balance.user_id].append(balance)
+
+        for exposure in exposures:
+            user = exposure.user
+
+            # Backing the winner wins the balance, laying it loses the liability (a negative
+            # balance); on a losing selection it is the other way round
+            total_pnl = Decimal('0.00')
+            for balance in balances[user.id]:
+                if balance.selection == match.winner.name:
+                    total_pnl += balance.balance
+                else:
+                    total_pnl -= balance.balance
+
+            # Update wallet for end users only
+            if hasattr(user, 'profile') and user.profile.user_type == 'end_user':
+                if total_pnl > 0:
+                    # User won - add winnings to wallet
+                    wallet_ops.credit(
+                        user, total_pnl, 'bet_won',
+                        f'Match bet winnings for {match.team_a.name} vs {match.team_b.name} - Winner: {match.winner.name}'
+                    )
+                elif total_pnl < 0:
+                    # User lost - stake was already deducted, just record the loss
+                    wallet, _ = Wallet.objects.get_or_create(user=user)
+                    Transaction.objects.create(
+                        user=user,
+                        transaction_type='bet_lost',
+                        amount=abs(total_pnl),
+                        balance_after=wallet.balance,
+                        description=f'Match bet loss for {match.team_a.name} vs {match.team_b.name} - Winner: {match.winner.name}'
+                    )
+
+        MatchUserExposure.objects.filter(id__in=[exposure.id for exposure in exposures]).update(
+            is_settled=True, updated_at=timezone.now()
+        )
+        match.is_settled = True
+        match.save()
+
+    return len(exposures)
+
+
+def run_match_settlement(match_id, chunk_size=DEFAULT_CHUNK_SIZE, fetch_scores=True):
+    """
+    Settle a match's sessions, then its match bets, skipping the stages its
+    SettlementCheckpoint already records. Runs in a settle_matches worker.
+    fetch_scores=False settles from the stored PlayerMatchStats without calling the providers.
+    Returns a picklable report dict.
+    """
+    started = time.monotonic()
+    report = {'match_id': match_id, 'sessions': 0, 'bets': 0, 'exposures': 0, 'error': None}
+
+    checkpoint, _ = SettlementCheckpoint.objects.get_or_create(match_id=match_id)
+    match = Match.objects.select_related('team_a', 'team_b', 'winner').get(id=match_id)
+    report['match'] = str(match)
+    checkpoint.attempts += 1
+    try:
+        if checkpoint.sessions_settled_at is None:
+            scorecard = None if fetch_scores else Scorecard.from_match_stats(match)
+            result = settle_match(match, chunk_size=chunk_size, scorecard=scorecard)
+            report['sessions'], report['bets'] = result.sessions, result.bets
+            checkpoint.sessions_settled += result.sessions
+            checkpoint.bets_settled += result.bets
+            checkpoint.sessions_settled_at = timezone.now()
+            checkpoint.save()
+
+        if checkpoint.match_bets_settled_at is None:
+            # Matches nobody placed match bets on need no winner to be set
+            if not match.is_settled and MatchUserExposure.objects.filter(match=match, is_settled=False).exists():
+                report['exposures'] = settle_match_bets(match)
+            checkpoint.match_bets_settled_at = timezone.now()
+        checkpoint.last_error = ''
+    except SettlementError as e:
+        checkpoint.last_error = str(e)
+        report['error'] = str(e)
+    except Exception as e:
+        logger.exception(f"Settlement of match {match_id} failed")
+        checkpoint.last_error = f'{type(e).__name__}: {str(e)}'
+        report['error'] = checkpoint.last_error
+    checkpoint.save()
+
+    report['elapsed'] = time.monotonic() - started
+    return report
+
+
+def _init_worker():
+    # Background worker: wait for provider rate limit tokens instead of failing fast
+    from .services import entitysport_api
+    entitysport_api.blocking = True
+
+
+def _run_in_worker(match_id, chunk_size, fetch_scores):
+    # Long-lived worker process: drop connections the DB may have closed since its last task
+    close_old_connections()
+    return run_match_settlement(match_id, chunk_size, fetch_scores)
+
+
+def settle_matches(match_ids, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, fetch_scores=True, progress=None):
+    """
+    Settle several matches, one task per match across a pool of worker processes
+    (in this process when workers is 1). Matches whose checkpoint is done are skipped.
+    progress: optional callable(report) invoked as each match finishes.
+    Returns the list of report dicts.
+    """
+    done = set(
+        SettlementCheckpoint.objects.filter(
+            match_id__in=match_ids, sessions_settled_at__isnull=False, match_bets_settled_at__isnull=False
+        ).values_list('match_id', flat=True)
+    )
+    pending = [match_id for match_id in match_ids if match_id not in done]
+    reports = []
+
+    if workers > 1 and connections['default'].vendor == 'sqlite':
+        # Concurrent write transactions fail with "database is locked" instead of waiting
+        logger.warning("SQLite allows a single writer; settling with one worker")
+        workers = 1
+
+    if workers <= 1 or len(pending) <= 1:
+        _init_worker()
+        for match_id in pending:
+            reports.append(run_match_settlement(match_id, chunk_size, fetch_scores))
+            if progress:
+                progress(reports[-1])
+        return reports
+
+    # Forked workers must not share the parent's database connections; each opens its own
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        futures = [pool.submit(_run_in_worker, match_id, chunk_size, fetch_scores) for match_id in pending]
+        for future in as_completed(futures):
+            reports.append(future.result())
+            if progress:
+                progress(reports[-1])
+    return reports
+
+
+def summarize(reports, elapsed):
+    """Throughput and per-match latency of a settle_matches run"""
+    latencies = sorted(report['elapsed'] for report in reports)
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+    sessions = sum(report['sessions'] for report in reports)
+    return {
+        'matches': len(reports),
+        'failed': sum(1 for report in reports if report['error']),
+        'sessions': sessions,
+        'bets': sum(report['bets'] for report in reports),
+        'elapsed': elapsed,
+        'sessions_per_second': sessions / elapsed if elapsed else 0.0,
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'max': latencies[-1] if latencies else 0.0,
+    }
@@ -1,3 +1,1201 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+import importlib
+from io import StringIO
+import json
+import pickle
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import wallet_ops
+from .ingestion import upsert_players, squad_player_rows
+from .live_scores import store_scorecard
+from .management.commands.sync_matches import Command as SyncMatchesCommand
+from .models import (
+    Team, Player, Match, PlayerMatchStats, Wallet, Transaction, BettingSession, PickedPlayer, Bet,
+    DLWallet, DLTransaction, DepositRequest, MatchBetBalance, MatchUserExposure, SettlementCheckpoint, PlayerAlias,
+    MatchPollSchedule,
+)
+from .player_index import PlayerIndex
+from .scorecard import Scorecard, ScoreLine
+from .services import (
+    CircuitBreaker, ProviderUnavailable, SingleFlight, RateLimiter, ProviderCache,
+    EntitySportAPIService, ProviderFixtures, entitysport_api,
+)
+from .session_events import streams_enabled, publish_session_event, publish_session_events
+from .session_view import build_session_view, get_session_view, _cache_key
+from .settlement import settle_match, settle_matches, SettlementError
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class FrozenClock:
+    """Stand-in for time.time (also drives LocMemCache expiry) that only moves when told to"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def create_match(api_id='match-1', status='completed'):
+    """Match between two new teams with a 30-run and a 10-run batter"""
+    team_a = Team.objects.create(api_id=f'{api_id}-a', name=f'{api_id} A')
+    team_b = Team.objects.create(api_id=f'{api_id}-b', name=f'{api_id} B')
+    match = Match.objects.create(api_id=api_id, team_a=team_a, team_b=team_b, match_title=api_id,
+                                 match_date=timezone.now(), status=status)
+    high = Player.objects.create(api_id=f'{api_id}-high', name='High Scorer', team=team_a)
+    low = Player.objects.create(api_id=f'{api_id}-low', name='Low Scorer', team=team_b)
+    PlayerMatchStats.objects.create(player=high, match=match, runs_scored=30, balls_faced=20)
+    PlayerMatchStats.objects.create(player=low, match=match, runs_scored=10, balls_faced=12)
+    return match, high, low
+
+
+def create_settleable_session(match, high, low, number=0):
+    """Session in the betting phase where better_a picked the 30-run batter and better_b the 10-run one"""
+    better_a = User.objects.create_user(f'{match.api_id}-a{number}')
+    better_b = User.objects.create_user(f'{match.api_id}-b{number}')
+    session = BettingSession.objects.create(
+        match=match, better_a=better_a, better_b=better_b, players_per_side=1, status='betting',
+        fixed_bet_amount=Decimal('10.00'), picks_completed=True, bets_completed=True
+    )
+    for better, player in ((better_a, high), (better_b, low)):
+        picked = PickedPlayer.objects.create(session=session, better=better, player=player)
+        Bet.objects.create(session=session, better=better, picked_player=picked, amount_per_run=Decimal('10.00'))
+    return session
+
+
+class WalletOpsTests(TestCase):
+    """Conditional F() balance updates in wallet_ops"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('better')
+        self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('100.00'))
+
+    def test_debit_records_transaction(self):
+        transaction = wallet_ops.debit(self.user, Decimal('60.00'), 'bet_placed', 'Bet')
+        self.assertEqual(transaction.balance_after, Decimal('40.00'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('40.00'))
+
+    def test_insufficient_debit_leaves_balance_unchanged(self):
+        self.assertIsNone(wallet_ops.debit(self.user, Decimal('100.01'), 'bet_placed'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('100.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_credit_creates_missing_wallet(self):
+        other = User.objects.create_user('newcomer')
+        transaction = wallet_ops.credit(other, Decimal('25.00'))
+        self.assertEqual(transaction.balance_after, Decimal('25.00'))
+        self.assertEqual(Wallet.objects.get(user=other).balance, Decimal('25.00'))
+
+    def test_stale_instances_cannot_overdraw(self):
+        first = Wallet.objects.get(user=self.user)
+        second = Wallet.objects.get(user=self.user)
+        self.assertTrue(first.withdraw(Decimal('70.00')))
+        # second still holds 100.00 in memory, but the row only has 30.00 left
+        self.assertFalse(second.withdraw(Decimal('70.00')))
+        second.deposit(Decimal('5.00'))
+        self.assertEqual(second.balance, Decimal('35.00'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('35.00'))
+
+    def test_insufficient_dl_debit_leaves_balance_unchanged(self):
+        dl_user = User.objects.create_user('distributor')
+        dl_wallet = DLWallet.objects.create(dl_user=dl_user, balance=Decimal('50.00'))
+        self.assertIsNone(wallet_ops.dl_debit(dl_user, Decimal('50.01'), 'Distributed to end user'))
+        dl_wallet.refresh_from_db()
+        self.assertEqual((dl_wallet.balance, dl_wallet.total_distributed), (Decimal('50.00'), Decimal('0.00')))
+        self.assertFalse(DLTransaction.objects.exists())
+
+
+class DepositRequestApproveTests(TestCase):
+    def setUp(self):
+        self.end_user = User.objects.create_user('client')
+        self.dl_user = User.objects.create_user('distributor')
+        self.dl_wallet = DLWallet.objects.create(dl_user=self.dl_user, balance=Decimal('150.00'))
+
+    def deposit_request(self, amount):
+        # bulk_create: DepositRequest.save is not needed to set up a pending request
+        return DepositRequest.objects.bulk_create([
+            DepositRequest(end_user=self.end_user, dl_user=self.dl_user, amount=Decimal(amount))
+        ])[0]
+
+    def test_request_is_approved_once(self):
+        request = self.deposit_request('100.00')
+        stale = DepositRequest.objects.get(id=request.id)
+        self.assertEqual(request.approve(self.dl_user), (True, 'Deposit approved successfully'))
+        approved, message = stale.approve(self.dl_user)
+        self.assertFalse(approved)
+        self.assertIn('already been processed', message)
+        self.assertEqual(Wallet.objects.get(user=self.end_user).balance, Decimal('100.00'))
+        self.dl_wallet.refresh_from_db()
+        self.assertEqual(self.dl_wallet.balance, Decimal('50.00'))
+
+    def test_insufficient_dl_balance_moves_no_money(self):
+        request = self.deposit_request('200.00')
+        approved, message = request.approve(self.dl_user)
+        self.assertFalse(approved)
+        self.assertIn('Insufficient', message)
+        self.assertEqual(DepositRequest.objects.get(id=request.id).status, 'pending')
+        self.dl_wallet.refresh_from_db()
+        self.assertEqual(self.dl_wallet.balance, Decimal('150.00'))
+        self.assertFalse(Wallet.objects.filter(user=self.end_user).exists())
+
+
+class SettleMatchTests(TestCase):
+    """Chunked session settlement (settlement.settle_match)"""
+
+    def setUp(self):
+        self.match, self.high, self.low = create_match()
+        self.sessions = [create_settleable_session(self.match, self.high, self.low, number) for number in range(5)]
+
+    def test_settles_every_session_in_chunks(self):
+        chunks = []
+        result = settle_match(self.match, chunk_size=2, scorecard=Scorecard.from_match_stats(self.match),
+                              progress=lambda result: chunks.append(result.sessions))
+        self.assertEqual((result.sessions, result.bets, result.chunks), (5, 10, 3))
+        self.assertEqual(chunks, [2, 4, 5])
+
+        for session in BettingSession.objects.filter(match=self.match):
+            self.assertEqual(session.status, 'completed')
+            # 30 runs x 10.00 against 10 runs x 10.00
+            self.assertEqual(session.better_a_total_winnings, Decimal('200.00'))
+            self.assertEqual(session.better_b_total_winnings, Decimal('0.00'))
+        self.assertFalse(Bet.objects.filter(is_settled=False).exists())
+        self.assertEqual(Bet.objects.get(session=self.sessions[0], better=self.sessions[0].better_a).total_payout,
+                         Decimal('300.00'))
+
+    def test_rerun_settles_nothing_twice(self):
+        scorecard = Scorecard.from_match_stats(self.match)
+        settle_match(self.match, chunk_size=2, scorecard=scorecard)
+        versions = dict(BettingSession.objects.values_list('id', 'version'))
+
+        result = settle_match(self.match, chunk_size=2, scorecard=scorecard)
+        self.assertEqual((result.sessions, result.bets, result.chunks), (0, 0, 0))
+        self.assertEqual(dict(BettingSession.objects.values_list('id', 'version')), versions)
+
+    def test_resumes_after_a_partial_run(self):
+        # A crashed run that committed the first chunk only
+        BettingSession.objects.filter(id=self.sessions[0].id).update(status='completed')
+        result = settle_match(self.match, chunk_size=2, scorecard=Scorecard.from_match_stats(self.match))
+        self.assertEqual((result.sessions, result.chunks), (4, 2))
+
+    def test_refuses_unfinished_match_and_missing_stats(self):
+        live_match, _, _ = create_match('match-2', status='live')
+        with self.assertRaises(SettlementError):
+            settle_match(live_match)
+        with self.assertRaises(SettlementError):
+            settle_match(self.match, scorecard=Scorecard(self.match.id))
+        self.assertFalse(BettingSession.objects.filter(status='completed').exists())
+
+
+class SettleMatchesTests(TestCase):
+    """settle_matches with per-match SettlementCheckpoints"""
+
+    def setUp(self):
+        self.match, high, low = create_match()
+        self.session = create_settleable_session(self.match, high, low)
+        # An end user who backed team A for 150.00 of profit
+        self.punter = User.objects.create_user('punter')
+        MatchUserExposure.objects.create(match=self.match, user=self.punter, exposure=Decimal('100.00'))
+        MatchBetBalance.objects.create(match=self.match, user=self.punter, selection=self.match.team_a.name,
+                                       bet_type='back', balance=Decimal('150.00'))
+
+    def punter_balance(self):
+        return Wallet.objects.get(user=self.punter).balance
+
+    def test_rerun_after_checkpoint_does_not_pay_twice(self):
+        Match.objects.filter(id=self.match.id).update(winner=self.match.team_a)
+        [report] = settle_matches([self.match.id], fetch_scores=False)
+        self.assertEqual((report['sessions'], report['exposures'], report['error']), (1, 1, None))
+        self.assertEqual(self.punter_balance(), Decimal('150.00'))
+        self.assertTrue(SettlementCheckpoint.objects.get(match=self.match).is_done)
+
+        self.assertEqual(settle_matches([self.match.id], fetch_scores=False), [])
+        self.assertEqual(self.punter_balance(), Decimal('150.00'))
+        self.assertEqual(Transaction.objects.filter(user=self.punter, transaction_type='bet_won').count(), 1)
+
+    def test_resumes_from_the_failed_stage(self):
+        # No winner yet: the sessions settle, the match bets stop the run
+        [report] = settle_matches([self.match.id], fetch_scores=False)
+        self.assertIn('winner', report['error'])
+        checkpoint = SettlementCheckpoint.objects.get(match=self.match)
+        self.assertIsNotNone(checkpoint.sessions_settled_at)
+        self.assertIsNone(checkpoint.match_bets_settled_at)
+        self.assertFalse(Wallet.objects.filter(user=self.punter).exists())
+
+        Match.objects.filter(id=self.match.id).update(winner=self.match.team_a)
+        [report] = settle_matches([self.match.id], fetch_scores=False)
+        self.assertEqual((report['sessions'], report['exposures'], report['error']), (0, 1, None))
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.attempts, checkpoint.sessions_settled, checkpoint.last_error), (2, 1, ''))
+        self.assertEqual(self.punter_balance(), Decimal('150.00'))
+
+    def test_several_matches(self):
+        other, high, low = create_match('match-2')
+        create_settleable_session(other, high, low)
+        Match.objects.filter(id=self.match.id).update(winner=self.match.team_a)
+        # SQLite falls back to a single worker; every match is still settled once
+        reports = settle_matches([self.match.id, other.id], workers=4, fetch_scores=False)
+        self.assertEqual(sorted(report['match_id'] for report in reports), sorted([self.match.id, other.id]))
+        self.assertEqual(BettingSession.objects.filter(status='completed').count(), 2)
+        self.assertEqual(SettlementCheckpoint.objects.filter(match_bets_settled_at__isnull=False).count(), 2)
+
+
+class PickPlayerTests(TestCase):
+    """Picking through the pick_player view, up to the automatic bets on the final pick"""
+
+    def setUp(self):
+        match, self.high, self.low = create_match(status='upcoming')
+        self.extra = Player.objects.create(api_id='match-1-extra', name='Extra', team=match.team_b)
+        self.better_a = User.objects.create_user('first')
+        self.better_b = User.objects.create_user('second')
+        for better in (self.better_a, self.better_b):
+            Wallet.objects.create(user=better, balance=Decimal('500.00'))
+        self.session = BettingSession.objects.create(
+            match=match, better_a=self.better_a, better_b=self.better_b, players_per_side=1,
+            fixed_bet_amount=Decimal('100.00'), status='picking', toss_completed=True, current_turn=self.better_a
+        )
+
+    def pick(self, better, player):
+        self.client.force_login(better)
+        return self.client.post(
+            reverse('core:pick_player', args=[self.session.id]),
+            json.dumps({'player_id': player.id}), content_type='application/json'
+        ).json()
+
+    def test_final_pick_places_auto_bets_once(self):
+        self.assertTrue(self.pick(self.better_a, self.high)['success'])
+        response = self.pick(self.better_b, self.low)
+        self.assertTrue(response['success'])
+        self.assertTrue(response['picks_completed'])
+        self.assertEqual(response['session_status'], 'betting')
+
+        # Picking after completion is refused and places nothing more
+        self.assertFalse(self.pick(self.better_a, self.extra)['success'])
+
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.bets_completed)
+        self.assertEqual(self.session.total_picks, 2)
+        for better in (self.better_a, self.better_b):
+            self.assertEqual(Bet.objects.filter(session=self.session, better=better).count(), 1)
+            self.assertEqual(Transaction.objects.filter(user=better, transaction_type='bet_placed').count(), 1)
+            self.assertEqual(Wallet.objects.get(user=better).balance, Decimal('400.00'))
+
+    def test_out_of_turn_and_taken_players_are_refused(self):
+        self.assertEqual(self.pick(self.better_b, self.low)['error'], "It's not your turn")
+        self.assertTrue(self.pick(self.better_a, self.high)['success'])
+        self.assertIn('already picked', self.pick(self.better_b, self.high)['error'])
+
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.total_picks, self.session.better_a_picks_count, self.session.better_b_picks_count),
+                         (1, 1, 0))
+        self.assertEqual(self.session.current_turn, self.better_b)
+        self.assertFalse(Bet.objects.exists())
+
+
+class CheckSessionUpdatesTests(TestCase):
+    """Polling endpoint: 304 while the client is current, the session state once it changed"""
+
+    def setUp(self):
+        match, high, low = create_match(status='live')
+        self.session = create_settleable_session(match, high, low)
+        self.session.refresh_from_db()
+        self.client.force_login(self.session.better_a)
+        self.url = reverse('core:check_session_updates', args=[self.session.id])
+
+    def test_current_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_current_version_is_not_modified(self):
+        response = self.client.get(self.url, {'version': self.session.version})
+        self.assertEqual(response.status_code, 304)
+
+    def test_last_update_since_the_change_is_not_modified(self):
+        response = self.client.get(self.url, {'last_update': self.session.updated_at.isoformat()})
+        self.assertEqual(response.status_code, 304)
+
+    def test_naive_last_update(self):
+        updated_at = self.session.updated_at.replace(tzinfo=None)
+        response = self.client.get(self.url, {'last_update': (updated_at + timedelta(seconds=1)).isoformat()})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, {'last_update': (updated_at - timedelta(seconds=1)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+    def test_changed_session_is_sent_after_a_bump(self):
+        etag = self.client.get(self.url)['ETag']
+        version, last_update = self.session.version, self.session.updated_at.isoformat()
+        BettingSession.bump_version(self.session.id)
+
+        for response in (
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag),
+            self.client.get(self.url, {'version': version}),
+            self.client.get(self.url, {'last_update': last_update}),
+        ):
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['session_updated'])
+            self.assertEqual(response['ETag'], f'"session-{self.session.id}-v{version + 1}"')
+
+    def test_other_users_are_refused(self):
+        self.client.force_login(User.objects.create_user('outsider'))
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(self.url, {'version': self.session.version}).status_code, 403)
+
+class BulkUpsertTests(TestCase):
+    """api_id keyed bulk upserts used by sync_matches"""
+
+    def setUp(self):
+        self.team_a = Team.objects.create(api_id='team-a', name='Team A')
+        self.team_b = Team.objects.create(api_id='team-b', name='Team B')
+        self.stays = Player.objects.create(api_id='stays', name='Stays', team=self.team_a)
+        self.moves = Player.objects.create(api_id='moves', name='Moves', team=self.team_a)
+
+    def test_created_updated_and_unchanged(self):
+        stays_updated_at = self.stays.updated_at
+        with self.assertNumQueries(6):
+            # Load, then create, reload the new rows and update inside a savepoint
+            result = upsert_players([
+                ('stays', {'name': 'Ignored'}, {'team_id': self.team_a.id}),
+                ('moves', {'name': 'Ignored'}, {'team_id': self.team_b.id}),
+                (101, {'name': 'New', 'team_id': self.team_b.id}, {'team_id': self.team_b.id}),
+            ])
+
+        self.assertEqual((result.created, result.updated, result.unchanged), (['101'], ['moves'], ['stays']))
+        self.assertEqual(result.summary(), '1 created, 1 updated, 1 unchanged')
+        self.assertEqual(set(result.objects), {'stays', 'moves', '101'})
+        self.assertEqual(result.objects['101'].name, 'New')
+        self.stays.refresh_from_db()
+        self.moves.refresh_from_db()
+        self.assertEqual((self.stays.name, self.stays.updated_at), ('Stays', stays_updated_at))
+        self.assertEqual((self.moves.name, self.moves.team_id), ('Moves', self.team_b.id))
+
+    def test_unchanged_rows_cost_one_query(self):
+        with self.assertNumQueries(1):
+            result = upsert_players([('stays', {}, {'team_id': self.team_a.id})])
+        self.assertEqual(result.unchanged, ['stays'])
+
+    def test_duplicate_api_ids_are_merged(self):
+        result = upsert_players([
+            ('dup', {'name': 'First', 'team_id': self.team_a.id}, {'team_id': self.team_a.id}),
+            ('dup', {'name': 'Second', 'team_id': self.team_a.id}, {'team_id': self.team_b.id}),
+            ('moves', {}, {'name': 'Renamed'}),
+            ('moves', {}, {'team_id': self.team_b.id}),
+        ], batch_size=1)
+
+        self.assertEqual((result.created, result.updated), (['dup'], ['moves']))
+        # First defaults win for a new row
+        self.assertEqual(Player.objects.get(api_id='dup').name, 'First')
+        self.moves.refresh_from_db()
+        self.assertEqual((self.moves.name, self.moves.team_id), ('Renamed', self.team_b.id))
+
+    def test_squad_player_rows_skips_malformed_entries(self):
+        rows = squad_player_rows({
+            'team_a_players': [
+                {'id': 'p1', 'name': 'One', 'role': 'Bowler'},
+                {'id': 'p2'},
+                {'name': 'No Id'},
+                'p3',
+                None,
+            ],
+            'team_b_players': [{'id': 'p4', 'name': 'Four'}],
+        }, self.team_a, self.team_b)
+
+        self.assertEqual(rows, [
+            ('p1', {'name': 'One', 'team_id': self.team_a.id, 'role': 'Bowler'}, {'team_id': self.team_a.id}),
+            ('p4', {'name': 'Four', 'team_id': self.team_b.id, 'role': 'Player'}, {'team_id': self.team_b.id}),
+        ])
+        self.assertEqual(squad_player_rows({}, self.team_a, self.team_b), [])
+
+@override_settings(MATCH_POLL_INTERVALS={'live': 10, 'retry_max': 60})
+class PollScheduledMatchTests(TestCase):
+    """sync_matches --daemon polls: backoff after failures and the final scorecard pull"""
+
+    def setUp(self):
+        self.match, self.high, self.low = create_match(status='live')
+        PlayerMatchStats.objects.all().delete()
+        self.now = timezone.now()
+        MatchPollSchedule.objects.create(match=self.match, next_poll_at=self.now)
+        self.command = SyncMatchesCommand(stdout=StringIO())
+        patcher = mock.patch('django.utils.timezone.now', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def poll(self, **fetch):
+        """Poll once with the EntitySport call for the match's state mocked, returning the updated schedule"""
+        method = 'get_match_score' if self.match.status == 'completed' else 'get_match_live_data'
+        with mock.patch.object(entitysport_api, method, **fetch) as fetched:
+            self.command.poll_scheduled_match(MatchPollSchedule.objects.select_related('match').get(match=self.match))
+        fetched.assert_called_once_with(self.match.api_id)
+        return MatchPollSchedule.objects.get(match=self.match)
+
+    def delay(self, schedule):
+        return (schedule.next_poll_at - self.now).total_seconds()
+
+    def test_failed_polls_back_off_up_to_retry_max_and_reset_on_success(self):
+        delays = [self.delay(self.poll(side_effect=RuntimeError('provider down'))) for _ in range(5)]
+        self.assertEqual(delays, [10, 20, 40, 60, 60])
+
+        with mock.patch.object(SyncMatchesCommand, 'sync_live_match_data'):
+            schedule = self.poll(return_value={'status': 1})
+        self.assertEqual(schedule.failed_polls, 0)
+        self.assertEqual(self.delay(schedule), 10)
+
+        self.assertEqual(self.delay(self.poll(side_effect=RuntimeError('provider down'))), 10)
+
+    def test_final_poll_is_done_only_once_a_scorecard_is_stored(self):
+        self.match.status = 'completed'
+        self.match.save()
+
+        for expected_delay in (10, 20):
+            schedule = self.poll(return_value={'player_stats': {}})
+            self.assertFalse(schedule.final_poll_done)
+            self.assertEqual(self.delay(schedule), expected_delay)
+
+        schedule = self.poll(return_value={'player_stats': {
+            self.high.api_id: {'name': self.high.name, 'runs': 45, 'balls': 30},
+        }})
+        self.assertTrue(schedule.final_poll_done)
+        self.assertIsNone(schedule.next_poll_at)
+        self.assertEqual(schedule.failed_polls, 0)
+        self.assertEqual(PlayerMatchStats.objects.get(player=self.high, match=self.match).runs_scored, 45)
+
+class ScorecardTests(SimpleTestCase):
+    """Scorecard lookups, pickling and the diff/merge used by the snapshot cache"""
+
+    def setUp(self):
+        self.scorecard = Scorecard(7, 'entitysport', {1: (30, 20, None), 2: (10, 12, 3)})
+
+    def test_lookups(self):
+        self.assertEqual(len(self.scorecard), 2)
+        self.assertEqual(list(self.scorecard), [1, 2])
+        self.assertIn(2, self.scorecard)
+        self.assertNotIn(3, self.scorecard)
+        self.assertEqual(self.scorecard.get(1), ScoreLine(30, 20, None))
+        self.assertEqual(self.scorecard.get(2), ScoreLine(10, 12, 3))
+        self.assertIsNone(self.scorecard.get(3))
+        self.assertEqual((self.scorecard.runs(1), self.scorecard.balls(2), self.scorecard.runs(3)), (30, 12, 0))
+        self.assertFalse(Scorecard(7))
+
+    def test_pickle_round_trip(self):
+        # The positions index built by a lookup is not pickled
+        self.scorecard.get(1)
+        restored = pickle.loads(pickle.dumps(self.scorecard))
+        self.assertEqual((restored.match_id, restored.provider), (7, 'entitysport'))
+        self.assertEqual(dict(restored.items()), dict(self.scorecard.items()))
+        self.assertEqual(restored.get(2), ScoreLine(10, 12, 3))
+        self.assertEqual(restored.diff(self.scorecard), {})
+
+    def test_diff(self):
+        self.assertEqual(self.scorecard.diff(None), dict(self.scorecard.items()))
+        newer = Scorecard(7, 'entitysport', {1: (30, 20, None), 2: (10, 12, 4), 3: (0, 1, None)})
+        self.assertEqual(newer.diff(self.scorecard), {2: ScoreLine(10, 12, 4), 3: ScoreLine(0, 1, None)})
+
+    def test_merged(self):
+        merged = self.scorecard.merged(Scorecard(7, 'cricapi', {2: (14, 15, 3), 3: (1, 1, None)}))
+        self.assertEqual(merged.provider, 'cricapi')
+        self.assertEqual(dict(merged.items()), {
+            1: ScoreLine(30, 20, None), 2: ScoreLine(14, 15, 3), 3: ScoreLine(1, 1, None),
+        })
+        self.assertEqual(self.scorecard.merged(Scorecard(7)).provider, 'entitysport')
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StoreScorecardTests(TestCase):
+    """Delta writes of a Scorecard into PlayerMatchStats against the cached snapshot"""
+
+    def setUp(self):
+        cache.clear()
+        self.match, self.high, self.low = create_match(status='live')
+        self.extra = Player.objects.create(api_id='match-1-extra', name='Extra', team=self.match.team_b)
+        self.scorecard = Scorecard(self.match.id, 'entitysport', {
+            self.high.id: (30, 20, None),
+            self.low.id: (12, 14, None),
+            self.extra.id: (5, 4, 1),
+        })
+
+    def stats(self, player):
+        return PlayerMatchStats.objects.get(player=player, match=self.match)
+
+    def test_writes_changed_and_new_rows_only(self):
+        high_updated_at = self.stats(self.high).updated_at
+        changed = store_scorecard(self.match, self.scorecard)
+
+        self.assertEqual(sorted(changed), sorted([self.low.id, self.extra.id]))
+        self.assertEqual(self.stats(self.high).updated_at, high_updated_at)
+        self.assertEqual((self.stats(self.low).runs_scored, self.stats(self.low).balls_faced), (12, 14))
+        extra = self.stats(self.extra)
+        self.assertEqual((extra.runs_scored, extra.balls_faced, extra.wickets), (5, 4, 1))
+
+    def test_unchanged_poll_does_not_touch_the_database(self):
+        store_scorecard(self.match, self.scorecard)
+        with self.assertNumQueries(0):
+            self.assertEqual(store_scorecard(self.match, self.scorecard), [])
+
+    def test_only_lines_changed_since_the_snapshot_are_written(self):
+        store_scorecard(self.match, self.scorecard)
+        newer = Scorecard(self.match.id, 'entitysport', {self.low.id: (16, 15, None)})
+        with self.assertNumQueries(5):
+            # Load the changed row, then update it and bump completed sessions in one savepoint
+            self.assertEqual(store_scorecard(self.match, newer), [self.low.id])
+        self.assertEqual(self.stats(self.low).runs_scored, 16)
+        # Lines missing from a partial scorecard are kept in the snapshot
+        self.assertEqual(store_scorecard(self.match, self.scorecard), [self.low.id])
+
+    def test_completed_sessions_get_a_new_version(self):
+        session = create_settleable_session(self.match, self.high, self.low)
+        BettingSession.objects.filter(id=session.id).update(status='completed')
+        version = BettingSession.objects.get(id=session.id).version
+
+        store_scorecard(self.match, self.scorecard)
+        self.assertEqual(BettingSession.objects.get(id=session.id).version, version + 1)
+        store_scorecard(self.match, self.scorecard)
+        self.assertEqual(BettingSession.objects.get(id=session.id).version, version + 1)
+
+REDIS_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'}}
+
+
+class StreamsEnabledTests(SimpleTestCase):
+    """Session event streams need a shared cache outside the database"""
+
+    def test_database_and_local_memory_caches_fall_back_to_polling(self):
+        self.assertFalse(streams_enabled())
+        with override_settings(CACHES=LOCMEM_CACHE):
+            self.assertFalse(streams_enabled())
+
+    def test_shared_caches_stream(self):
+        with override_settings(CACHES=REDIS_CACHE):
+            self.assertTrue(streams_enabled())
+            with override_settings(SESSION_EVENTS={'enabled': False}):
+                self.assertFalse(streams_enabled())
+
+
+class SessionEventsViewTests(TestCase):
+    def setUp(self):
+        match, high, low = create_match(status='live')
+        self.session = create_settleable_session(match, high, low)
+        self.url = reverse('core:session_events', args=[self.session.id])
+
+    async def get(self):
+        await self.async_client.aforce_login(self.session.better_a)
+        return await self.async_client.get(self.url)
+
+    async def test_no_stream_without_a_shared_cache(self):
+        response = await self.get()
+        self.assertEqual(response.status_code, 204)
+
+    def test_no_stream_under_wsgi(self):
+        self.client.force_login(self.session.better_a)
+        with override_settings(CACHES=REDIS_CACHE):
+            self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    async def test_stream_with_a_shared_cache(self):
+        async def stream(session_id):
+            yield 'retry: 5000\n\n'
+
+        with override_settings(CACHES=REDIS_CACHE), mock.patch('core.views.session_event_stream', stream):
+            response = await self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PublishSessionEventTests(TestCase):
+    """Versions are bumped right away; events are only announced once the transaction commits"""
+
+    def setUp(self):
+        cache.clear()
+        match, high, low = create_match()
+        self.session = create_settleable_session(match, high, low)
+        self.version = BettingSession.objects.get(id=self.session.id).version
+        patcher = mock.patch('core.session_events.session_broker')
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def current_version(self):
+        return BettingSession.objects.get(id=self.session.id).version
+
+    def test_event_is_sent_on_commit(self):
+        with mock.patch('core.session_events.streams_enabled', return_value=True):
+            with self.captureOnCommitCallbacks() as callbacks:
+                publish_session_event(self.session.id, 'pick')
+                self.assertEqual(self.current_version(), self.version + 1)
+            self.assertIsNone(cache.get(f'session_events:{self.session.id}'))
+            self.broker.publish.assert_not_called()
+
+            callbacks[0]()
+        payload = {'session_id': self.session.id, 'event': 'pick', 'version': self.version + 1}
+        self.assertEqual(cache.get(f'session_events:{self.session.id}'), payload)
+        self.broker.publish.assert_called_once_with(self.session.id, payload)
+
+    def test_events_for_many_sessions_are_sent_on_commit(self):
+        with mock.patch('core.session_events.streams_enabled', return_value=True):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                publish_session_events({self.session.id: 9}, 'updated')
+                self.broker.publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(cache.get(f'session_events:{self.session.id}')['version'], 9)
+        self.broker.publish.assert_called_once()
+
+    def test_nothing_is_sent_without_streams(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            publish_session_event(self.session.id, 'pick')
+            publish_session_events({self.session.id: 9}, 'updated')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.current_version(), self.version + 1)
+        self.assertIsNone(cache.get(f'session_events:{self.session.id}'))
+        self.broker.publish.assert_not_called()
+
+class BuildSessionViewTests(TestCase):
+    """The session page is built with a fixed number of queries however many players were picked"""
+
+    def setUp(self):
+        self.match, high, low = create_match(status='live')
+        self.session = create_settleable_session(self.match, high, low)
+
+    def add_picks(self, count):
+        for number in range(count):
+            for better, team in ((self.session.better_a, self.match.team_a), (self.session.better_b, self.match.team_b)):
+                player = Player.objects.create(api_id=f'{better.username}-{number}', name=f'Player {number}', team=team)
+                picked = PickedPlayer.objects.create(session=self.session, better=better, player=player)
+                Bet.objects.create(session=self.session, better=better, picked_player=picked, amount_per_run=Decimal('1.00'))
+                PlayerMatchStats.objects.create(player=player, match=self.match, runs_scored=number, balls_faced=number)
+
+    def queries(self, status):
+        BettingSession.objects.filter(id=self.session.id).update(status=status)
+        with CaptureQueriesContext(connection) as queries:
+            view = build_session_view(self.session.id)
+            view.context(self.session.better_a)
+            view.as_json(self.session.better_a)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_picks(self):
+        statuses = ('picking', 'betting', 'completed')
+        few = {status: self.queries(status) for status in statuses}
+        self.add_picks(10)
+        for status in statuses:
+            self.assertLessEqual(few[status], 5, status)
+            self.assertEqual(self.queries(status), few[status], status)
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SessionViewCacheTests(TestCase):
+    """Completed session pages cached under (session id, version) by get_session_view"""
+
+    def setUp(self):
+        cache.clear()
+        match, high, low = create_match()
+        self.session = create_settleable_session(match, high, low)
+        settle_match(match, scorecard=Scorecard.from_match_stats(match))
+        self.session.refresh_from_db()
+
+    def cached(self):
+        return cache.get(_cache_key(self.session.id, self.session.version))
+
+    def test_caches_plain_values_only(self):
+        get_session_view(self.session.id)
+
+        def walk(value):
+            self.assertNotIsInstance(value, models.Model)
+            if isinstance(value, dict):
+                self.assertNotIn('password', value)
+                self.assertNotIn('email', value)
+                for item in value.values():
+                    walk(item)
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    walk(item)
+
+        walk(self.cached())
+
+    def test_cached_view_matches_a_fresh_one(self):
+        fresh = get_session_view(self.session.id)
+        with self.assertNumQueries(1):
+            restored = get_session_view(self.session.id)
+        user = self.session.better_a
+        for key in ('better_a_total_runs', 'better_b_total_runs', 'better_a_total_value', 'difference'):
+            self.assertEqual(restored.context(user)[key], fresh.context(user)[key])
+        self.assertEqual(restored.winner.id, self.session.better_a_id)
+        self.assertEqual([pick.player.name for pick in restored.better_a.picks], ['High Scorer'])
+        self.assertEqual(restored.as_json(user)['better_b_picks'], fresh.as_json(user)['better_b_picks'])
+
+    def test_version_bump_replaces_the_cached_view(self):
+        get_session_view(self.session.id)
+        high = PlayerMatchStats.objects.get(player__api_id='match-1-high')
+        # A late scorecard correction bumps the completed session's version
+        store_scorecard(self.session.match, Scorecard(self.session.match_id, 'entitysport', {high.player_id: (50, 31, None)}))
+        self.session.refresh_from_db()
+        self.assertIsNone(self.cached())
+
+        # Settled runs stay those of the bets; the scorecard shown is the corrected one
+        view = get_session_view(self.session.id)
+        self.assertEqual(view.better_a.picks[0].balls_faced, 31)
+        self.assertEqual(self.cached()['scorecard'][high.player_id], (50, 31, 0))
+
+
+class BettingSessionSaveTests(TestCase):
+    """Version and pick counters are only written through F() updates"""
+
+    def setUp(self):
+        match, self.high, self.low = create_match(status='upcoming')
+        self.session = BettingSession.objects.create(
+            match=match, better_a=User.objects.create_user('first'), better_b=User.objects.create_user('second')
+        )
+
+    def test_full_save_of_stale_instance_keeps_concurrent_increments(self):
+        stale = BettingSession.objects.get(id=self.session.id)
+        # A pick and an event committed after stale was loaded
+        BettingSession.objects.filter(id=self.session.id).update(
+            version=models.F('version') + 2, total_picks=1, better_a_team_a_picks=1
+        )
+        stale.status = 'cancelled'
+        stale.save()
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'cancelled')
+        self.assertEqual((self.session.version, self.session.total_picks, self.session.better_a_team_a_picks),
+                         (2, 1, 1))
+
+    def test_turn_changes_save_only_their_fields(self):
+        stale = BettingSession.objects.get(id=self.session.id)
+        BettingSession.objects.filter(id=self.session.id).update(version=5, total_picks=3)
+        stale.perform_toss()
+        stale.switch_turn()
+
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.toss_completed)
+        self.assertEqual((self.session.version, self.session.total_picks), (5, 3))
+
+    def test_migration_backfills_counters_from_picks(self):
+        migration = importlib.import_module('core.migrations.0018_bettingsession_pick_counters')
+        session, match = self.session, self.session.match
+        outsider = Player.objects.create(api_id='outsider', name='Outsider',
+                                         team=Team.objects.create(api_id='other', name='Other'))
+        extra_b = Player.objects.create(api_id='extra-b', name='Extra B', team=match.team_b)
+        PickedPlayer.objects.bulk_create([
+            PickedPlayer(session=session, better=session.better_a, player=self.high),
+            PickedPlayer(session=session, better=session.better_a, player=self.low),
+            PickedPlayer(session=session, better=session.better_b, player=extra_b),
+            # A player who has since left both teams counts towards the total only
+            PickedPlayer(session=session, better=session.better_b, player=outsider),
+        ])
+        empty = BettingSession.objects.create(match=match, better_a=session.better_a, better_b=session.better_b)
+
+        migration.backfill_pick_counters(apps, None)
+
+        session.refresh_from_db()
+        self.assertEqual(
+            (session.better_a_team_a_picks, session.better_a_team_b_picks,
+             session.better_b_team_a_picks, session.better_b_team_b_picks, session.total_picks),
+            (1, 1, 0, 1, 4)
+        )
+        empty.refresh_from_db()
+        self.assertEqual(empty.total_picks, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PlayerIndexTests(TestCase):
+    """Provider id and name resolution (player_index.PlayerIndex)"""
+
+    def setUp(self):
+        self.match, self.high, self.low = create_match(status='live')
+        self.team_a, self.team_b = self.match.team_a, self.match.team_b
+
+    def test_exact_api_id_wins_over_raw_id(self):
+        plain = Player.objects.create(api_id='123', name='Plain Id', team=self.team_a)
+        prefixed = Player.objects.create(api_id='entitysport_player_123', name='Prefixed Id', team=self.team_b)
+        index = PlayerIndex.build(self.match)
+        self.assertEqual(index.resolve('123'), plain.id)
+        self.assertEqual(index.resolve('entitysport_player_123'), prefixed.id)
+
+    def test_exact_api_id_wins_over_alias(self):
+        plain = Player.objects.create(api_id='cricapi_player_9', name='Plain', team=self.team_a)
+        PlayerAlias.objects.create(player=self.high, provider='cricapi', external_id='cricapi_player_9')
+        self.assertEqual(PlayerIndex.build(self.match).resolve('cricapi_player_9'), plain.id)
+
+    def test_raw_id_shared_by_two_players_is_ambiguous(self):
+        first = Player.objects.create(api_id='entitysport_player_77', name='First', team=self.team_a)
+        Player.objects.create(api_id='cricapi_player_77', name='Second', team=self.team_b)
+        index = PlayerIndex.build(self.match)
+        self.assertIsNone(index.resolve('77'))
+        self.assertEqual(index.resolve('entitysport_player_77'), first.id)
+        # A unique raw id still resolves
+        unique = Player.objects.create(api_id='entitysport_player_55', name='Unique', team=self.team_a)
+        self.assertEqual(PlayerIndex.build(self.match).resolve('55'), unique.id)
+
+    def test_shared_names_are_not_guessed(self):
+        Player.objects.create(api_id='twin-1', name='R. Sharma', team=self.team_a)
+        Player.objects.create(api_id='twin-2', name='R Sharma', team=self.team_b)
+        self.assertIsNone(PlayerIndex.build(self.match).resolve(name='r sharma'))
+
+    def test_name_match_is_learned_as_alias(self):
+        index = PlayerIndex.build(self.match)
+        resolved = index.resolve_stats({'es-901': {'name': 'High  Scorer', 'runs': 12}}, provider='entitysport')
+        self.assertEqual(resolved, {self.high.id: {'name': 'High  Scorer', 'runs': 12}})
+
+        alias = PlayerAlias.objects.get()
+        self.assertEqual((alias.player_id, alias.provider, alias.external_id), (self.high.id, 'entitysport', 'es-901'))
+        # The next index maps the provider id directly, even without a name
+        self.assertEqual(PlayerIndex.build(self.match).resolve('es-901'), self.high.id)
+        self.assertEqual(PlayerIndex.build(self.match).resolve_stats({'es-901': {'runs': 14}}), {self.high.id: {'runs': 14}})
+        self.assertEqual(PlayerAlias.objects.count(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PROVIDER_CIRCUIT_BREAKER={
+    'default': {'failure_threshold': 3, 'latency_threshold': 2.0, 'reset_timeout': 30}
+})
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker()
+        self.clock = FrozenClock()
+        patcher = mock.patch('time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def state(self):
+        return self.breaker.get_state('provider')['state']
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure('provider', 'HTTP 503')
+
+    def test_opens_at_the_failure_threshold(self):
+        self.breaker.record_failure('provider', 'HTTP 503')
+        self.breaker.record_failure('provider', 'HTTP 503')
+        self.breaker.before_request('provider')
+        self.assertEqual(self.state(), 'closed')
+
+        self.breaker.record_failure('provider', 'HTTP 503')
+        self.assertEqual(self.state(), 'open')
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_request('provider')
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure('provider', 'HTTP 503')
+        self.breaker.record_failure('provider', 'HTTP 503')
+        self.breaker.record_success('provider', 0.1)
+        self.breaker.record_failure('provider', 'HTTP 503')
+        self.assertEqual(self.breaker.get_state('provider')['failures'], 1)
+        self.assertEqual(self.state(), 'closed')
+
+    def test_slow_responses_count_as_failures(self):
+        for _ in range(3):
+            self.breaker.record_success('provider', 2.5)
+        self.assertEqual(self.state(), 'open')
+
+    def test_half_open_probe_closes_on_success(self):
+        self.open_breaker()
+        self.clock.advance(29)
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_request('provider')
+
+        self.clock.advance(1)
+        self.breaker.before_request('provider')
+        self.assertEqual(self.state(), 'half_open')
+        # Only one probe at a time
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_request('provider')
+
+        self.breaker.record_success('provider', 0.1)
+        self.assertEqual(self.state(), 'closed')
+        self.breaker.before_request('provider')
+
+    def test_half_open_probe_reopens_on_failure(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.before_request('provider')
+        self.breaker.record_failure('provider', 'timeout')
+        self.assertEqual(self.state(), 'open')
+        # The reset timeout starts again from the failed probe
+        self.clock.advance(29)
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_request('provider')
+        self.clock.advance(1)
+        self.breaker.before_request('provider')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight()
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def blocking_fetch(self, result=None, error=None):
+        def fetch():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            if error:
+                raise error
+            return result
+        return fetch
+
+    def run_concurrently(self, fetch, followers=4):
+        """Leader enters fetch first, followers join while it is in flight; returns results or exceptions"""
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(self.flight.do('key', fetch))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        self.assertTrue(self.started.wait(5))
+        threads += [threading.Thread(target=call) for _ in range(followers)]
+        for thread in threads[1:]:
+            thread.start()
+        # Let the followers reach the in-flight call before it returns
+        threading.Event().wait(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_concurrent_callers_share_one_fetch(self):
+        outcomes = self.run_concurrently(self.blocking_fetch(result={'matches': [1]}))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(outcomes, [{'matches': [1]}] * 5)
+
+    def test_concurrent_callers_share_the_error(self):
+        outcomes = self.run_concurrently(self.blocking_fetch(error=ValueError('provider down')))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(outcomes), 5)
+        self.assertTrue(all(isinstance(outcome, ValueError) for outcome in outcomes))
+        # Nothing is left in flight: the next call fetches again
+        self.assertEqual(self.flight.do('key', lambda: 'retried'), 'retried')
+
+    def test_waits_for_a_fetch_in_another_process(self):
+        # Another process holds the lock and publishes its result shortly
+        cache.add('key:inflight', 1)
+        timer = threading.Timer(0.2, lambda: cache.set('key:result', {'data': 'published'}))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        fetch = mock.Mock(return_value='own')
+        self.assertEqual(self.flight.do('key', fetch), 'published')
+        fetch.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PROVIDER_RATE_LIMITS={'provider': {'rate': 2, 'burst': 2}})
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.limiter = RateLimiter()
+        self.clock = FrozenClock()
+        patcher = mock.patch('time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_denial(self):
+        self.assertEqual(self.limiter.reserve('provider'), 0)
+        self.assertEqual(self.limiter.reserve('provider'), 0)
+        # Bucket empty: denied without taking a token
+        self.assertIsNone(self.limiter.reserve('provider'))
+        self.assertIsNone(self.limiter.reserve('provider', max_wait=0.4))
+
+    def test_waiting_caller_reserves_the_next_token(self):
+        self.limiter.reserve('provider')
+        self.limiter.reserve('provider')
+        self.assertEqual(self.limiter.reserve('provider', max_wait=1), 0.5)
+        # That slot is taken: the next caller waits a full token longer
+        self.assertEqual(self.limiter.reserve('provider', max_wait=2), 1.0)
+
+    def test_refills_at_rate_up_to_burst(self):
+        self.limiter.reserve('provider')
+        self.limiter.reserve('provider')
+        self.clock.advance(0.5)
+        self.assertEqual(self.limiter.reserve('provider'), 0)
+        self.assertIsNone(self.limiter.reserve('provider'))
+
+        # A long pause refills to burst, not beyond
+        self.clock.advance(60)
+        self.assertEqual(self.limiter.reserve('provider'), 0)
+        self.assertEqual(self.limiter.reserve('provider'), 0)
+        self.assertIsNone(self.limiter.reserve('provider'))
+
+    def test_unconfigured_provider_is_not_throttled(self):
+        for _ in range(10):
+            self.assertEqual(self.limiter.reserve('other'), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PROVIDER_CACHE={'live': {'ttl': 10, 'stale': 60}})
+class ProviderCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider_cache = ProviderCache()
+        self.clock = FrozenClock()
+        self.fetch = mock.Mock(side_effect=[{'version': 1}, {'version': 2}, {'version': 3}])
+        for patcher in (mock.patch('time.time', self.clock), mock.patch('core.services.threading.Thread')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Background refreshes are run by hand (run_refresh) instead of in a thread
+        self.threads = threading.Thread
+
+    def get(self, is_valid=bool):
+        return self.provider_cache.get_or_fetch('provider', 'live', ['match-1'], self.fetch, is_valid)
+
+    def run_refresh(self):
+        self.threads.call_args.kwargs['target']()
+
+    def test_fresh_hit_does_not_fetch(self):
+        self.assertEqual(self.get(), {'version': 1})
+        self.clock.advance(9)
+        self.assertEqual(self.get(), {'version': 1})
+        self.assertEqual(self.fetch.call_count, 1)
+        self.threads.assert_not_called()
+
+    def test_stale_hit_starts_exactly_one_refresh(self):
+        self.get()
+        self.clock.advance(11)
+        self.assertEqual(self.get(), {'version': 1})
+        self.assertEqual(self.get(), {'version': 1})
+        self.assertEqual(self.threads.call_count, 1)
+        self.assertEqual(self.fetch.call_count, 1)
+
+        self.run_refresh()
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertEqual(self.get(), {'version': 2})
+        # Fresh again, and the refresh lock was released
+        self.clock.advance(11)
+        self.get()
+        self.assertEqual(self.threads.call_count, 2)
+
+    def test_expired_entry_is_fetched_again(self):
+        self.get()
+        self.clock.advance(71)
+        self.assertEqual(self.get(), {'version': 2})
+        self.threads.assert_not_called()
+
+    def test_invalid_results_are_not_cached(self):
+        self.assertEqual(self.get(is_valid=lambda data: False), {'version': 1})
+        self.assertEqual(self.get(), {'version': 2})
+        self.assertEqual(self.fetch.call_count, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class EntitySportTokenTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.expires_at = timezone.now() + timedelta(days=1)
+        cache.set(EntitySportAPIService.TOKEN_CACHE_KEY, {'token': 'old', 'expires_at': self.expires_at})
+        patcher = mock.patch.object(EntitySportAPIService, '_request_token', autospec=True,
+                                    return_value=('new', self.expires_at))
+        self.request_token = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def service(self):
+        # One instance per process: each starts with the shared token in its local copy
+        service = EntitySportAPIService()
+        self.assertEqual(service.token, 'old')
+        return service
+
+    def test_callers_with_the_same_rejected_token_refresh_once(self):
+        first, second = self.service(), self.service()
+        self.assertEqual(first._get_auth_token(force_refresh=True, stale_token='old'), 'new')
+        self.assertEqual(second._get_auth_token(force_refresh=True, stale_token='old'), 'new')
+        self.assertEqual(self.request_token.call_count, 1)
+        self.assertEqual(cache.get(EntitySportAPIService.TOKEN_CACHE_KEY)['token'], 'new')
+        self.assertIsNone(cache.get(EntitySportAPIService.TOKEN_LOCK_KEY))
+
+    def test_waits_for_the_refresh_in_progress(self):
+        service = self.service()
+        cache.add(EntitySportAPIService.TOKEN_LOCK_KEY, 1)
+
+        def other_process_refreshes(seconds):
+            cache.set(EntitySportAPIService.TOKEN_CACHE_KEY, {'token': 'theirs', 'expires_at': self.expires_at})
+
+        with mock.patch('core.services.time.sleep', side_effect=other_process_refreshes) as sleep:
+            self.assertEqual(service._get_auth_token(force_refresh=True, stale_token='old'), 'theirs')
+        sleep.assert_called_once()
+        self.request_token.assert_not_called()
+        # The lock belongs to the other process
+        self.assertEqual(cache.get(EntitySportAPIService.TOKEN_LOCK_KEY), 1)
+
+    def test_requests_a_token_when_the_wait_times_out(self):
+        service = self.service()
+        cache.add(EntitySportAPIService.TOKEN_LOCK_KEY, 1)
+        clock = iter(range(0, 100, 5))
+        with mock.patch('core.services.time.sleep'), \
+                mock.patch('core.services.time.monotonic', side_effect=lambda: next(clock)):
+            self.assertEqual(service._get_auth_token(force_refresh=True, stale_token='old'), 'new')
+        self.assertEqual(self.request_token.call_count, 1)
+
+
+class ProviderFixturesTests(SimpleTestCase):
+    url = 'https://restapi.entitysport.com/v2/matches/1/live/'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROVIDER_FIXTURE_DIR=directory.name, PROVIDER_REPLAY_SPEED=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.clock = FrozenClock()
+        patcher = mock.patch('time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fixtures = ProviderFixtures()
+
+    @staticmethod
+    def response(body, status=200):
+        response = requests.Response()
+        response.status_code = status
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(body).encode('utf-8')
+        return response
+
+    def test_record_then_replay_the_timeline(self):
+        self.fixtures.record('entitysport', 'GET', self.url, self.response({'over': 1}), {'token': 'a'})
+        self.clock.advance(60)
+        self.fixtures.record('entitysport', 'GET', self.url, self.response({'over': 2}), {'token': 'b'})
+
+        replay = ProviderFixtures()
+        self.assertEqual(replay.replay('entitysport', 'GET', self.url, {'token': 'c'}).json(), {'over': 1})
+        self.clock.advance(59)
+        self.assertEqual(replay.replay('entitysport', 'GET', self.url, {'token': 'c'}).json(), {'over': 1})
+        self.clock.advance(1)
+        self.assertEqual(replay.replay('entitysport', 'GET', self.url, {'token': 'c'}).json(), {'over': 2})
+        with self.assertLogs('core.services', 'WARNING'):
+            self.assertEqual(replay.replay('entitysport', 'GET', self.url, {'token': 'c', 'page': 2}).status_code, 404)
+
+    def test_ignored_params_do_not_change_the_key(self):
+        path = self.fixtures._path('odds', 'GET', self.url, {'sport': 'cricket', 'apiKey': 'a',
+                                                             'commenceTimeFrom': '1', 'commenceTimeTo': '2'})
+        self.assertEqual(path, self.fixtures._path('odds', 'GET', self.url, {'sport': 'cricket', 'apiKey': 'b'}))
+        self.assertEqual(path, self.fixtures._path('odds', 'GET', self.url + '?x=1', {'sport': 'cricket', 'token': 'c'}))
+        self.assertNotEqual(path, self.fixtures._path('odds', 'GET', self.url, {'sport': 'football'}))
+        self.assertNotEqual(path, self.fixtures._path('odds', 'POST', self.url, {'sport': 'cricket'}))
+
+    def test_auth_tokens_are_redacted(self):
+        url = 'https://restapi.entitysport.com/v2/auth/'
+        data = {'access_key': 'access', 'secret_key': 'secret', 'extend': '1'}
+        body = {'status': 'ok', 'response': {'token': 'live-token', 'expires': '2030-01-01 00:00:00'}}
+        self.fixtures.record('entitysport', 'POST', url, self.response(body), data=data)
+
+        with open(self.fixtures._path('entitysport', 'POST', url, data=data), encoding='utf-8') as f:
+            recorded = f.read()
+        self.assertNotIn('live-token', recorded)
+        replayed = ProviderFixtures().replay('entitysport', 'POST', url, data=data).json()
+        self.assertEqual(replayed['response'], {'token': 'redacted', 'expires': '2030-01-01 00:00:00'})
@@ -13,6 +13,7 @@ urlpatterns = [
     path('session/<int:session_id>/toss/', views.perform_toss, name='perform_toss'),
     path('session/<int:session_id>/pick-player/', views.pick_player, name='pick_player'),
     path('session/<int:session_id>/check-updates/', views.check_session_updates, name='check_session_updates'),
+    path('session/<int:session_id>/events/', views.session_events, name='session_events'),
     path('session/<int:session_id>/place-bet/', views.place_bet, name='place_bet'),
     path('session/<int:session_id>/settle/', views.settle_session, name='settle_session'),
     path('session/<int:session_id>/add-winnings/', views.add_winnings_to_wallet, name='add_winnings_to_wallet'),
@@ -31,6 +32,7 @@ urlpatterns = [
     path('invite/<int:invite_id>/decline/', views.decline_invite, name='decline_invite'),
     path('api/search-users/', views.search_users, name='search_users'),
     path('api/wallet-info/<str:info_type>/', views.wallet_info_api, name='wallet_info_api'),
+    path('provider-status/', views.provider_status, name='provider_status'),
     # Job endpoint (to prevent 404 errors from polling)
     path('job/check_for_completed_jobs/', job_views.check_for_completed_jobs, name='check_for_completed_jobs'),
     # Distributor/Dealer System URLs
@@ -5,7 +5,10 @@ from django.db.models import Sum, Q
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse, Http404
+)
 from django.views.decorators.http import require_http_methods
 from django.db import transaction as db_transaction
 from django.db import IntegrityError
@@ -17,10 +20,13 @@ import json
 
 from .models import (
     Match, Team, Player, Wallet, BettingSession, PickedPlayer, Bet,
-    Transaction, PlayerMatchStats, SessionInvite, DLWallet, DLTransaction, DepositRequest,
-    MatchBet, MatchBetBalance, MatchUserExposure
+    Transaction, SessionInvite, DLWallet, DLTransaction, DepositRequest,
+    MatchBet, MatchUserExposure
 )
-from .services import cricket_api, entitysport_api
+from .live_scores import store_scorecard
+from .session_events import publish_session_event, session_event_stream, streams_enabled
+from .session_view import build_session_view, get_session_view
+from . import settlement, wallet_ops
 
 
 @login_required
@@ -264,7 +270,8 @@ def join_betting_session(request, session_id):
     
     # Join as better_b
     session.better_b = request.user
-    session.save()
+    session.save(update_fields=['better_b', 'updated_at'])
+    publish_session_event(session.id, 'joined')
     
     messages.success(request, "You joined the session! Now perform the toss to determine who picks first.")
     return redirect('core:session_detail', session_id=session.id)
@@ -272,312 +279,26 @@ def join_betting_session(request, session_id):
 
 @login_required
 def session_detail(request, session_id):
-    """View betting session details"""
-    session = get_object_or_404(BettingSession, id=session_id)
+    """
+    View betting session details.
+    The page is built by build_session_view in a fixed number of queries, whatever the number of picks;
+    completed sessions are served from the cache until their version changes.
+    """
+    view = get_session_view(session_id)
+    session = view.session
     
     # Check if user is part of this session
-    if session.better_a != request.user and session.better_b != request.user:
+    if session.better_a_id != request.user.id and session.better_b_id != request.user.id:
         messages.error(request, "You are not authorized to view this session")
         return redirect('core:home')
     
     # Ensure profiles exist for both users
     from accounts.models import UserProfile
     UserProfile.objects.get_or_create(user=session.better_a)
-    if session.better_b != session.better_a:
+    if session.better_b_id != session.better_a_id:
         UserProfile.objects.get_or_create(user=session.better_b)
     
-    # Get picked players
-    better_a_picks_qs = PickedPlayer.objects.filter(session=session, better=session.better_a).select_related('player', 'player__team')
-    better_b_picks_qs = PickedPlayer.objects.filter(session=session, better=session.better_b).select_related('player', 'player__team')
-    
-    # Count picks per team for each better (before converting to list)
-    better_a_team_a_count = better_a_picks_qs.filter(player__team=session.match.team_a).count()
-    better_a_team_b_count = better_a_picks_qs.filter(player__team=session.match.team_b).count()
-    better_b_team_a_count = better_b_picks_qs.filter(player__team=session.match.team_a).count()
-    better_b_team_b_count = better_b_picks_qs.filter(player__team=session.match.team_b).count()
-    
-    # Get bets with picked player info
-    better_a_bets = Bet.objects.filter(session=session, better=session.better_a).select_related('picked_player', 'picked_player__player')
-    better_b_bets = Bet.objects.filter(session=session, better=session.better_b).select_related('picked_player', 'picked_player__player')
-    
-    # Create bet lookup dicts for easier template access
-    better_a_bets_dict = {bet.picked_player_id: bet for bet in better_a_bets}
-    better_b_bets_dict = {bet.picked_player_id: bet for bet in better_b_bets}
-    
-    # Convert to list first
-    better_a_picks = list(better_a_picks_qs)
-    better_b_picks = list(better_b_picks_qs)
-    
-    # Add bet info to picks for template
-    for pick in better_a_picks:
-        pick.bet = better_a_bets_dict.get(pick.id)
-    for pick in better_b_picks:
-        pick.bet = better_b_bets_dict.get(pick.id)
-    
-    # Add match stats to picks for completed sessions (after converting to list)
-    if session.status == 'completed':
-        # Pre-fetch all PlayerMatchStats for this match to avoid N+1 queries
-        player_stats_dict = {}
-        for stats in PlayerMatchStats.objects.filter(match=session.match):
-            player_stats_dict[stats.player_id] = stats
-        
-        for pick in better_a_picks:
-            # First try to get runs from Bet model (which should have runs_scored after settlement)
-            runs_scored = 0
-            if pick.bet and pick.bet.runs_scored is not None:
-                runs_scored = pick.bet.runs_scored
-            
-            # Get balls_faced from PlayerMatchStats
-            balls_faced = 0
-            if pick.player_id in player_stats_dict:
-                stats = player_stats_dict[pick.player_id]
-                balls_faced = stats.balls_faced
-                # If runs not in Bet, use PlayerMatchStats
-                if runs_scored == 0:
-                    runs_scored = stats.runs_scored
-            
-            pick.runs_scored = runs_scored
-            pick.balls_faced = balls_faced
-            pick.player_value = Decimal(str(runs_scored)) * session.fixed_bet_amount if session.fixed_bet_amount else Decimal('0.00')
-        
-        # Sort picks by runs_scored (highest first) for completed sessions
-        better_a_picks.sort(key=lambda x: getattr(x, 'runs_scored', 0) or 0, reverse=True)
-        
-        for pick in better_b_picks:
-            # First try to get runs from Bet model (which should have runs_scored after settlement)
-            runs_scored = 0
-            if pick.bet and pick.bet.runs_scored is not None:
-                runs_scored = pick.bet.runs_scored
-            
-            # Get balls_faced from PlayerMatchStats
-            balls_faced = 0
-            if pick.player_id in player_stats_dict:
-                stats = player_stats_dict[pick.player_id]
-                balls_faced = stats.balls_faced
-                # If runs not in Bet, use PlayerMatchStats
-                if runs_scored == 0:
-                    runs_scored = stats.runs_scored
-            
-            pick.runs_scored = runs_scored
-            pick.balls_faced = balls_faced
-            pick.player_value = Decimal(str(runs_scored)) * session.fixed_bet_amount if session.fixed_bet_amount else Decimal('0.00')
-        
-        # Sort picks by runs_scored (highest first) for completed sessions
-        better_b_picks.sort(key=lambda x: getattr(x, 'runs_scored', 0) or 0, reverse=True)
-    
-    # Get available players (not yet picked)
-    picked_player_ids = PickedPlayer.objects.filter(session=session).values_list('player_id', flat=True)
-    available_players = Player.objects.filter(
-        team__in=[session.match.team_a, session.match.team_b]
-    ).exclude(id__in=picked_player_ids)
-    
-    # Group by team
-    team_a_available = available_players.filter(team=session.match.team_a)
-    team_b_available = available_players.filter(team=session.match.team_b)
-    
-    # Calculate total runs and values for each better
-    # For completed sessions: use Bet model
-    # For live matches: fetch from API or PlayerMatchStats
-    better_a_total_runs = 0
-    better_b_total_runs = 0
-    better_a_total_value = Decimal('0.00')
-    better_b_total_value = Decimal('0.00')
-    winner = None
-    difference = Decimal('0.00')
-    current_leader = None
-    
-    if session.status == 'completed':
-        # For completed sessions, use Bet model
-        better_a_bets_list = list(better_a_bets)
-        better_b_bets_list = list(better_b_bets)
-        
-        for bet in better_a_bets_list:
-            if bet.runs_scored is not None:
-                better_a_total_runs += bet.runs_scored
-        
-        for bet in better_b_bets_list:
-            if bet.runs_scored is not None:
-                better_b_total_runs += bet.runs_scored
-        
-        # Calculate total values (runs × bet_amount) - only if fixed_bet_amount exists
-        if session.fixed_bet_amount:
-            better_a_total_value = Decimal(str(better_a_total_runs)) * session.fixed_bet_amount
-            better_b_total_value = Decimal(str(better_b_total_runs)) * session.fixed_bet_amount
-            
-            # Calculate difference
-            difference = abs(better_a_total_value - better_b_total_value)
-        
-        # Determine winner
-        if better_a_total_value > better_b_total_value:
-            winner = session.better_a
-        elif better_b_total_value > better_a_total_value:
-            winner = session.better_b
-        # else: tie (winner is None)
-    elif session.match.status == 'live':
-        # For live matches, fetch current stats from API first, then PlayerMatchStats
-        api_player_stats = {}
-        try:
-            # Try EntitySport API first (production API), then fallback to cricket_api
-            score_data = None
-            try:
-                score_data = entitysport_api.get_match_score(session.match.api_id)
-            except Exception:
-                pass
-            
-            if not score_data:
-                try:
-                    score_data = cricket_api.get_match_score(session.match.api_id)
-                except Exception:
-                    pass
-            
-            if score_data:
-                api_player_stats = score_data.get('player_stats', {})
-        except Exception:
-            # If API fails, continue with PlayerMatchStats
-            pass
-        
-        # Pre-fetch all PlayerMatchStats for this match as fallback
-        player_stats_dict = {}
-        for stats in PlayerMatchStats.objects.filter(match=session.match):
-            player_stats_dict[stats.player_id] = stats
-        
-        # Calculate current totals from API or PlayerMatchStats and add stats to picks
-        for pick in better_a_picks:
-            runs = 0
-            balls = 0
-            # First try API (check multiple key formats)
-            if pick.player.api_id:
-                api_id_str = str(pick.player.api_id)
-                # Try exact string match
-                if api_id_str in api_player_stats:
-                    player_stat = api_player_stats[api_id_str]
-                    if isinstance(player_stat, dict):
-                        runs = player_stat.get('runs', 0)
-                        balls = player_stat.get('balls', 0)
-                else:
-                    # Try integer key only if api_id is numeric
-                    try:
-                        api_id_int = int(pick.player.api_id)
-                        if api_id_int in api_player_stats:
-                            player_stat = api_player_stats[api_id_int]
-                            if isinstance(player_stat, dict):
-                                runs = player_stat.get('runs', 0)
-                                balls = player_stat.get('balls', 0)
-                    except (ValueError, TypeError):
-                        # api_id is not numeric, try partial matching
-                        for key, value in api_player_stats.items():
-                            key_str = str(key)
-                            if key_str == api_id_str or key_str.endswith(api_id_str) or api_id_str in key_str:
-                                player_stat = value
-                                if isinstance(player_stat, dict):
-                                    runs = player_stat.get('runs', 0)
-                                    balls = player_stat.get('balls', 0)
-                                break
-            
-            # Fallback to PlayerMatchStats
-            if runs == 0 and pick.player_id in player_stats_dict:
-                stats = player_stats_dict[pick.player_id]
-                runs = stats.runs_scored
-                balls = stats.balls_faced
-            
-            # Add stats to pick object for template
-            pick.runs_scored = runs
-            pick.balls_faced = balls
-            pick.player_value = Decimal(str(runs)) * session.fixed_bet_amount if session.fixed_bet_amount else Decimal('0.00')
-            pick.has_batted = runs > 0 or balls > 0
-            pick.is_active = balls > 0  # Currently playing if they have faced balls
-            
-            better_a_total_runs += runs
-        
-        for pick in better_b_picks:
-            runs = 0
-            balls = 0
-            # First try API (check multiple key formats)
-            if pick.player.api_id:
-                api_id_str = str(pick.player.api_id)
-                # Try exact string match
-                if api_id_str in api_player_stats:
-                    player_stat = api_player_stats[api_id_str]
-                    if isinstance(player_stat, dict):
-                        runs = player_stat.get('runs', 0)
-                        balls = player_stat.get('balls', 0)
-                else:
-                    # Try integer key only if api_id is numeric
-                    try:
-                        api_id_int = int(pick.player.api_id)
-                        if api_id_int in api_player_stats:
-                            player_stat = api_player_stats[api_id_int]
-                            if isinstance(player_stat, dict):
-                                runs = player_stat.get('runs', 0)
-                                balls = player_stat.get('balls', 0)
-                    except (ValueError, TypeError):
-                        # api_id is not numeric, try partial matching
-                        for key, value in api_player_stats.items():
-                            key_str = str(key)
-                            if key_str == api_id_str or key_str.endswith(api_id_str) or api_id_str in key_str:
-                                player_stat = value
-                                if isinstance(player_stat, dict):
-                                    runs = player_stat.get('runs', 0)
-                                    balls = player_stat.get('balls', 0)
-                                break
-            
-            # Fallback to PlayerMatchStats
-            if runs == 0 and pick.player_id in player_stats_dict:
-                stats = player_stats_dict[pick.player_id]
-                runs = stats.runs_scored
-                balls = stats.balls_faced
-            
-            # Add stats to pick object for template
-            pick.runs_scored = runs
-            pick.balls_faced = balls
-            pick.player_value = Decimal(str(runs)) * session.fixed_bet_amount if session.fixed_bet_amount else Decimal('0.00')
-            pick.has_batted = runs > 0 or balls > 0
-            pick.is_active = balls > 0  # Currently playing if they have faced balls
-            
-            better_b_total_runs += runs
-        
-        # Calculate current values
-        if session.fixed_bet_amount:
-            better_a_total_value = Decimal(str(better_a_total_runs)) * session.fixed_bet_amount
-            better_b_total_value = Decimal(str(better_b_total_runs)) * session.fixed_bet_amount
-            difference = abs(better_a_total_value - better_b_total_value)
-        
-        # Determine current leader
-        if better_a_total_value > better_b_total_value:
-            current_leader = session.better_a
-        elif better_b_total_value > better_a_total_value:
-            current_leader = session.better_b
-        # else: tie (current_leader is None)
-        
-        # Sort picks: active players first, then batted players, then yet to bat
-        # Sort by: is_active (desc), has_batted (desc), runs_scored (desc)
-        better_a_picks.sort(key=lambda x: (getattr(x, 'is_active', False), getattr(x, 'has_batted', False), getattr(x, 'runs_scored', 0)), reverse=True)
-        better_b_picks.sort(key=lambda x: (getattr(x, 'is_active', False), getattr(x, 'has_batted', False), getattr(x, 'runs_scored', 0)), reverse=True)
-    
-    context = {
-        'session': session,
-        'better_a_picks': better_a_picks,
-        'better_b_picks': better_b_picks,
-        'better_a_bets': better_a_bets,
-        'better_b_bets': better_b_bets,
-        'team_a_available': team_a_available,
-        'team_b_available': team_b_available,
-        'better_a_team_a_count': better_a_team_a_count,
-        'better_a_team_b_count': better_a_team_b_count,
-        'better_b_team_a_count': better_b_team_a_count,
-        'better_b_team_b_count': better_b_team_b_count,
-        'is_my_turn': session.current_turn == request.user if session.current_turn else False,
-        'toss_completed': session.toss_completed,
-        'toss_winner': session.toss_winner,
-        'can_perform_toss': session.status == 'pending' and session.better_b != session.better_a,
-        'better_a_total_runs': better_a_total_runs,
-        'better_b_total_runs': better_b_total_runs,
-        'better_a_total_value': better_a_total_value,
-        'better_b_total_value': better_b_total_value,
-        'difference': difference,
-        'winner': winner,
-        'current_leader': current_leader,
-    }
+    context = view.context(request.user)
     return render(request, 'core/session_detail.html', context)
 
 
@@ -617,6 +338,7 @@ def perform_toss(request, session_id):
     # Perform toss
     toss_winner = session.perform_toss()
     session.refresh_from_db()
+    publish_session_event(session.id, 'toss')
     
     # Return JSON response for AJAX requests
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -638,12 +360,17 @@ def perform_toss(request, session_id):
 @login_required
 @require_http_methods(["POST"])
 def pick_player(request, session_id):
-    """Pick a player in the betting session"""
-    session = get_object_or_404(BettingSession, id=session_id)
-    
-    if session.better_a != request.user and session.better_b != request.user:
-        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
-    
+    """
+    Pick a player in the betting session
+    The session row is locked for the whole pick, so when both betters click at the same
+    moment the picks are applied one after the other and the second is validated against
+    the state the first left behind.
+    Query budget per pick (after authentication): read player, lock session, insert pick,
+    one conditional UPDATE of turn, counters, status and version. Announcing the pick adds
+    one cache write after commit, and only when session streams are on (Redis/Memcached,
+    see session_events.streams_enabled). The final pick also places the automatic bets
+    (BettingSession.place_auto_bets).
+    """
     try:
         data = json.loads(request.body)
         player_id = data.get('player_id')
@@ -651,46 +378,67 @@ def pick_player(request, session_id):
         if not player_id:
             return JsonResponse({'success': False, 'error': 'Player ID required'})
         
-        player = get_object_or_404(Player, id=player_id)
-        
-        # Validate pick - ensures same player cannot be picked by both betters
-        can_pick, error_msg = session.can_pick_player(request.user, player)
-        if not can_pick:
-            return JsonResponse({'success': False, 'error': error_msg})
+        player = get_object_or_404(Player.objects.select_related('team'), id=player_id)
         
-        # Check again if player was just picked (race condition protection)
-        if PickedPlayer.objects.filter(session=session, player=player).exists():
-            return JsonResponse({'success': False, 'error': 'This player was just picked by the other player. Please select another player.'})
-        
-        # Create picked player with database constraint as final safeguard
         try:
             with db_transaction.atomic():
-                picked_player = PickedPlayer.objects.create(
-                    session=session,
-                    better=request.user,
-                    player=player
+                session = get_object_or_404(
+                    BettingSession.objects.select_for_update(of=('self',)).select_related('match', 'better_a', 'better_b'),
+                    id=session_id
                 )
                 
-                # Refresh session from database to get latest state
-                session.refresh_from_db()
+                if request.user.id not in (session.better_a_id, session.better_b_id):
+                    return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
+                
+                # Validate against the locked row; the unique (session, player) constraint
+                # rejects a player who is already picked
+                can_pick, error_msg = session.can_pick_player(request.user, player, check_picked=False)
+                if not can_pick:
+                    return JsonResponse({'success': False, 'error': error_msg})
+                
+                PickedPlayer.objects.create(session=session, better=request.user, player=player)
+                
+                # Next state of the session, applied in one UPDATE
+                now = timezone.now()
+                session.total_picks += 1
+                session.picks_completed = session.total_picks >= session.players_per_side * 2
+                if session.picks_completed:
+                    session.status = 'betting'
+                    session.current_turn = None
+                else:
+                    session.current_turn = session.better_b if request.user.id == session.better_a_id else session.better_a
+                session.version += 1
+                session.updated_at = now
+                
+                if session.picks_completed:
+                    # Automatically place both bets, recorded by the same UPDATE
+                    session.bets_completed = session.place_auto_bets()
                 
-                # Switch turn (only if picking is not complete)
-                if not session.picks_completed:
-                    session.switch_turn()
-                    session.save()
+                updates = {
+                    'total_picks': F('total_picks') + 1,
+                    'picks_completed': session.picks_completed,
+                    'status': session.status,
+                    'current_turn': session.current_turn,
+                    'bets_completed': session.bets_completed,
+                    'version': F('version') + 1,
+                    'updated_at': now,
+                }
+                counter = session.pick_counter_field(request.user.id, player.team_id)
+                if counter:
+                    setattr(session, counter, getattr(session, counter) + 1)
+                    updates[counter] = F(counter) + 1
                 
-                # Check if picking is complete (this may change status)
-                session.check_picks_complete()
+                # Conditional on the state we validated (guards databases without row locks)
+                if not BettingSession.objects.filter(
+                    id=session.id, status='picking', current_turn_id=request.user.id
+                ).update(**updates):
+                    db_transaction.set_rollback(True)
+                    return JsonResponse({'success': False, 'error': "It's not your turn"})
                 
-                # Refresh again to get updated status
-                session.refresh_from_db()
+                publish_session_event(session.id, 'pick', version=session.version)
         except IntegrityError:
             return JsonResponse({'success': False, 'error': 'This player was already picked. Please select another player.'})
         
-        # Get updated pick counts for both betters
-        better_a_picks = PickedPlayer.objects.filter(session=session, better=session.better_a).count()
-        better_b_picks = PickedPlayer.objects.filter(session=session, better=session.better_b).count()
-        
         return JsonResponse({
             'success': True,
             'message': f'Picked {player.name}',
@@ -698,10 +446,10 @@ def pick_player(request, session_id):
             'current_turn': session.current_turn.username if session.current_turn else None,
             'current_turn_id': session.current_turn.id if session.current_turn else None,
             'session_status': session.status,
-            'is_my_turn': session.current_turn == request.user if session.current_turn else False,
+            'is_my_turn': session.current_turn_id == request.user.id if session.current_turn else False,
             'updated_at': session.updated_at.isoformat(),
-            'better_a_picks_count': better_a_picks,
-            'better_b_picks_count': better_b_picks,
+            'better_a_picks_count': session.better_a_picks_count,
+            'better_b_picks_count': session.better_b_picks_count,
             'picked_player_name': player.name
         })
         
@@ -737,32 +485,31 @@ def place_bet(request, session_id):
                 'error': f'Insufficient balance. Required: ₹{session.fixed_bet_amount}, Your balance: ₹{wallet.balance}'
             })
         
-        # Deduct bet amount from wallet
-        wallet.withdraw(session.fixed_bet_amount)
-        Transaction.objects.create(
-            user=request.user,
-            transaction_type='bet_placed',
-            amount=session.fixed_bet_amount,
-            balance_after=wallet.balance,
-            description=f'Fixed bet amount for session #{session.id}'
-        )
-        
-        # Create bet records for all picked players (using fixed bet amount)
-        user_picks = PickedPlayer.objects.filter(session=session, better=request.user)
-        for picked_player in user_picks:
-            # Calculate amount per run based on fixed bet amount
-            # Distribute fixed amount equally across all picks
-            amount_per_run = session.fixed_bet_amount / Decimal(str(user_picks.count()))
+        with db_transaction.atomic():
+            # Deduct bet amount from wallet (fails if a concurrent debit left too little)
+            if not wallet_ops.debit(request.user, session.fixed_bet_amount, 'bet_placed',
+                                    f'Fixed bet amount for session #{session.id}'):
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Insufficient balance. Required: ₹{session.fixed_bet_amount}'
+                })
             
-            Bet.objects.create(
-                session=session,
-                better=request.user,
-                picked_player=picked_player,
-                amount_per_run=amount_per_run,
-                insurance_percentage=Decimal('0.00'),
-                insurance_premium=Decimal('0.00'),
-                insured_amount=Decimal('0.00')
-            )
+            # Create bet records for all picked players (using fixed bet amount)
+            user_picks = PickedPlayer.objects.filter(session=session, better=request.user)
+            for picked_player in user_picks:
+                # Calculate amount per run based on fixed bet amount
+                # Distribute fixed amount equally across all picks
+                amount_per_run = session.fixed_bet_amount / Decimal(str(user_picks.count()))
+                
+                Bet.objects.create(
+                    session=session,
+                    better=request.user,
+                    picked_player=picked_player,
+                    amount_per_run=amount_per_run,
+                    insurance_percentage=Decimal('0.00'),
+                    insurance_premium=Decimal('0.00'),
+                    insured_amount=Decimal('0.00')
+                )
         
         # Check if both betters have placed bets
         better_a_bets = Bet.objects.filter(session=session, better=session.better_a).exists()
@@ -770,7 +517,8 @@ def place_bet(request, session_id):
         
         if better_a_bets and better_b_bets:
             session.bets_completed = True
-            session.save()
+            session.save(update_fields=['bets_completed', 'updated_at'])
+        publish_session_event(session.id, 'bet')
         
         return JsonResponse({
             'success': True,
@@ -805,17 +553,7 @@ def deposit_wallet(request):
             messages.error(request, "Amount must be greater than 0")
             return redirect('core:wallet')
         
-        wallet, _ = Wallet.objects.get_or_create(user=request.user)
-        
-        with db_transaction.atomic():
-            wallet.deposit(amount)
-            Transaction.objects.create(
-                user=request.user,
-                transaction_type='deposit',
-                amount=amount,
-                balance_after=wallet.balance,
-                description=f'Deposit of ₹{amount}'
-            )
+        wallet_ops.credit(request.user, amount, 'deposit', f'Deposit of ₹{amount}')
         
         messages.success(request, f'Successfully deposited ₹{amount}')
         return redirect('core:wallet')
@@ -838,87 +576,15 @@ def settle_session(request, session_id):
         messages.error(request, "Match is not completed yet")
         return redirect('core:session_detail', session_id=session_id)
     
-    # Fetch player stats from API
-    # Try EntitySport API first (production API), then fallback to cricket_api
-    score_data = None
-    try:
-        score_data = entitysport_api.get_match_score(session.match.api_id)
-    except Exception:
-        pass
-    
-    if not score_data:
-        try:
-            score_data = cricket_api.get_match_score(session.match.api_id)
-        except Exception:
-            pass
-    
-    player_stats = score_data.get('player_stats', {}) if score_data else {}
-    
-    better_a_total_runs = 0
-    better_b_total_runs = 0
+    # Final scorecard (EntitySport first, then cricket_api, then the stored stats), keyed by Player.id
+    scorecard = settlement.get_final_scorecard(session.match)
+    if not scorecard:
+        messages.error(request, "Player stats are not available yet")
+        return redirect('core:session_detail', session_id=session_id)
     
-    with db_transaction.atomic():
-        # Process all bets and calculate total runs
-        bets = Bet.objects.filter(session=session, is_settled=False)
-        
-        for bet in bets:
-            player_api_id = bet.picked_player.player.api_id
-            player_stat = player_stats.get(player_api_id, {})
-            runs_scored = player_stat.get('runs', 0)
-            balls_faced = player_stat.get('balls', 0)
-            
-            # Update bet with runs scored
-            bet.runs_scored = runs_scored
-            bet.calculate_payout()
-            bet.is_settled = True
-            bet.save()
-            
-            # Update player match stats
-            PlayerMatchStats.objects.update_or_create(
-                player=bet.picked_player.player,
-                match=session.match,
-                defaults={
-                    'runs_scored': runs_scored,
-                    'balls_faced': balls_faced
-                }
-            )
-            
-            # Add runs to respective better's total
-            if bet.better == session.better_a:
-                better_a_total_runs += runs_scored
-            else:
-                better_b_total_runs += runs_scored
-        
-        # Calculate total value: (total_runs × bet_amount) for each better
-        better_a_total_value = Decimal(str(better_a_total_runs)) * session.fixed_bet_amount
-        better_b_total_value = Decimal(str(better_b_total_runs)) * session.fixed_bet_amount
-        
-        # Calculate difference
-        difference = abs(better_a_total_value - better_b_total_value)
-        
-        # Determine winner (player with higher total value)
-        winner = None
-        winner_winnings = Decimal('0.00')
-        
-        if better_a_total_value > better_b_total_value:
-            winner = session.better_a
-            winner_winnings = difference
-            session.better_a_total_winnings = difference
-            session.better_b_total_winnings = Decimal('0.00')
-        elif better_b_total_value > better_a_total_value:
-            winner = session.better_b
-            winner_winnings = difference
-            session.better_a_total_winnings = Decimal('0.00')
-            session.better_b_total_winnings = difference
-        else:
-            # Tie - no winner, no winnings
-            winner = None
-            session.better_a_total_winnings = Decimal('0.00')
-            session.better_b_total_winnings = Decimal('0.00')
-        
-        # Store winner and totals
-        session.status = 'completed'
-        session.save()
+    # Same bulk path as the settle_match command, for this session only
+    store_scorecard(session.match, scorecard)
+    settlement.settle_sessions([session.id], scorecard)
     
     messages.success(request, "Session settled successfully!")
     return redirect('core:session_detail', session_id=session_id)
@@ -960,17 +626,7 @@ def add_winnings_to_wallet(request, session_id):
     winnings = difference
     
     try:
-        wallet, _ = Wallet.objects.get_or_create(user=request.user)
-        
-        with db_transaction.atomic():
-            wallet.deposit(winnings)
-            Transaction.objects.create(
-                user=request.user,
-                transaction_type='bet_won',
-                amount=winnings,
-                balance_after=wallet.balance,
-                description=f'Winnings from betting session #{session.id}'
-            )
+        wallet_ops.credit(request.user, winnings, 'bet_won', f'Winnings from betting session #{session.id}')
         
         messages.success(request, f'Successfully added ₹{winnings} to your wallet!')
     except Exception as e:
@@ -1022,91 +678,79 @@ def withdraw_winnings(request, session_id):
 
 @login_required
 def check_session_updates(request, session_id):
-    """API endpoint to check for session state changes (for real-time updates)"""
-    session = get_object_or_404(BettingSession, id=session_id)
+    """
+    API endpoint to check for session state changes (for real-time updates)
+    Answers 304 after a single lookup when the client already has the current state:
+    its If-None-Match ETag or ?version= matches the session version, or ?last_update= is
+    not older than the last change.
+    """
+    state = BettingSession.objects.filter(id=session_id).values(
+        'version', 'updated_at', 'better_a_id', 'better_b_id'
+    ).first()
+    if state is None:
+        raise Http404("Session not found")
     
     # Check if user is part of this session
-    if session.better_a != request.user and session.better_b != request.user:
+    if request.user.id not in (state['better_a_id'], state['better_b_id']):
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
+    etag = f'"session-{session_id}-v{state["version"]}"'
+    
     # Get last update timestamp from request
     last_update = request.GET.get('last_update')
     
-    # Get current session state
-    better_a_picks = PickedPlayer.objects.filter(session=session, better=session.better_a).select_related('player', 'player__team')
-    better_b_picks = PickedPlayer.objects.filter(session=session, better=session.better_b).select_related('player', 'player__team')
-    
-    # Count picks per team for each better
-    better_a_team_a_count = better_a_picks.filter(player__team=session.match.team_a).count()
-    better_a_team_b_count = better_a_picks.filter(player__team=session.match.team_b).count()
-    better_b_team_a_count = better_b_picks.filter(player__team=session.match.team_a).count()
-    better_b_team_b_count = better_b_picks.filter(player__team=session.match.team_b).count()
-    
-    # Get recently picked players (in last 30 seconds) for notifications
-    from datetime import timedelta
-    recent_picks = PickedPlayer.objects.filter(
-        session=session,
-        picked_at__gte=timezone.now() - timedelta(seconds=30)
-    ).select_related('player', 'better').order_by('-picked_at')
-    
-    # Check if session was updated since last check
-    session_updated = True
-    if last_update:
+    unchanged = (
+        etag in request.headers.get('If-None-Match', '')
+        or request.GET.get('version') == str(state['version'])
+    )
+    if not unchanged and last_update:
+        from django.utils.dateparse import parse_datetime
         try:
-            from django.utils.dateparse import parse_datetime
             last_update_dt = parse_datetime(last_update)
-            if last_update_dt and session.updated_at <= last_update_dt:
-                session_updated = False
-        except:
-            pass
+        except ValueError:
+            last_update_dt = None
+        if last_update_dt and timezone.is_naive(last_update_dt):
+            last_update_dt = timezone.make_aware(last_update_dt)
+        unchanged = bool(last_update_dt) and state['updated_at'] <= last_update_dt
+    if unchanged:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
     
-    # Build response with full pick lists
-    response_data = {
-        'session_id': session.id,
-        'status': session.status,
-        'current_turn': session.current_turn.username if session.current_turn else None,
-        'current_turn_id': session.current_turn.id if session.current_turn else None,
-        'is_my_turn': session.current_turn == request.user if session.current_turn else False,
-        'updated_at': session.updated_at.isoformat(),
-        'picks_completed': session.picks_completed,
-        'better_a_picks_count': better_a_picks.count(),
-        'better_b_picks_count': better_b_picks.count(),
-        'better_a_team_a_count': better_a_team_a_count,
-        'better_a_team_b_count': better_a_team_b_count,
-        'better_b_team_a_count': better_b_team_a_count,
-        'better_b_team_b_count': better_b_team_b_count,
-        'better_a_username': session.better_a.username,
-        'better_b_username': session.better_b.username,
-        'session_updated': session_updated,
-        'better_a_picks': [
-            {
-                'player_id': pick.player.id,
-                'player_name': pick.player.name,
-                'team_name': pick.player.team.name
-            }
-            for pick in better_a_picks
-        ],
-        'better_b_picks': [
-            {
-                'player_id': pick.player.id,
-                'player_name': pick.player.name,
-                'team_name': pick.player.team.name
-            }
-            for pick in better_b_picks
-        ],
-        'recent_picks': [
-            {
-                'player_id': pick.player.id,
-                'player_name': pick.player.name,
-                'better_username': pick.better.username,
-                'picked_at': pick.picked_at.isoformat(),
-                'is_opponent': pick.better != request.user
-            }
-            for pick in recent_picks[:5]  # Last 5 picks
-        ]
-    }
+    view = build_session_view(session_id, details=False)
     
-    return JsonResponse(response_data)
+    # Unchanged sessions were answered with 304 above
+    response_data = view.as_json(request.user)
+    response_data['session_updated'] = True
+    
+    response = JsonResponse(response_data)
+    response['ETag'] = f'"session-{view.session.id}-v{view.session.version}"'
+    return response
+
+
+@login_required
+async def session_events(request, session_id):
+    """
+    Server-Sent Events stream announcing changes to a session; the page then fetches
+    check_session_updates once per change instead of polling it.
+    Only streamed under ASGI with a shared non-database cache (session_events.streams_enabled);
+    otherwise it answers 204 and the page keeps polling.
+    """
+    if not isinstance(request, ASGIRequest) or not streams_enabled():
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    session = await BettingSession.objects.filter(id=session_id).values('better_a_id', 'better_b_id').afirst()
+    if session is None:
+        raise Http404("Session not found")
+    if user.id not in (session['better_a_id'], session['better_b_id']):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    response = StreamingHttpResponse(session_event_stream(session_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies (nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -1327,6 +971,7 @@ def accept_invite(request, session_id, invite_code):
     
     # Accept the invite
     if invite.accept(request.user):
+        publish_session_event(session.id, 'joined')
         messages.success(request, f"You've joined {invite.inviter.username}'s betting session!")
         return redirect('core:session_detail', session_id=session_id)
     else:
@@ -1959,23 +1604,14 @@ def dl_credit_end_user(request, end_user_id):
             messages.error(request, f"Insufficient balance. Your balance: ₹{dl_wallet.balance}")
             return redirect('core:dl_credit_end_user', end_user_id=end_user_id)
         
-        # Debit from DL wallet
-        if not dl_wallet.debit(amount, f'Credit to {end_user.username}'):
-            messages.error(request, "Failed to debit from DL wallet")
-            return redirect('core:dl_credit_end_user', end_user_id=end_user_id)
-        
-        # Credit to end user wallet
-        end_user_wallet, _ = Wallet.objects.get_or_create(user=end_user)
-        end_user_wallet.deposit(amount)
-        
-        # Create transaction record
-        Transaction.objects.create(
-            user=end_user,
-            transaction_type='deposit',
-            amount=amount,
-            balance_after=end_user_wallet.balance,
-            description=description or f'Credited by DL: {request.user.username}'
-        )
+        with db_transaction.atomic():
+            # Debit from DL wallet
+            if not wallet_ops.dl_debit(request.user, amount, f'Credit to {end_user.username}', related_user=end_user):
+                messages.error(request, "Failed to debit from DL wallet")
+                return redirect('core:dl_credit_end_user', end_user_id=end_user_id)
+            
+            # Credit to end user wallet
+            wallet_ops.credit(end_user, amount, 'deposit', description or f'Credited by DL: {request.user.username}')
         
         messages.success(request, f'₹{amount} credited to {end_user.username} successfully')
         return redirect('core:dl_dashboard')
@@ -2022,21 +1658,15 @@ def dl_withdraw_end_user(request, end_user_id):
             messages.error(request, f"Insufficient balance. User balance: ₹{end_user_wallet.balance}")
             return redirect('core:dl_dashboard')
         
-        # Withdraw from end user wallet
-        end_user_wallet.withdraw(amount)
-        
-        # Credit to DL wallet
-        dl_wallet, _ = DLWallet.objects.get_or_create(dl_user=request.user)
-        dl_wallet.credit(amount, f'Withdrawal from {end_user.username}')
-        
-        # Create transaction record
-        Transaction.objects.create(
-            user=end_user,
-            transaction_type='withdrawal',
-            amount=amount,
-            balance_after=end_user_wallet.balance,
-            description=description or f'Withdrawn by DL: {request.user.username}'
-        )
+        with db_transaction.atomic():
+            # Withdraw from end user wallet
+            if not wallet_ops.debit(end_user, amount, 'withdrawal',
+                                    description or f'Withdrawn by DL: {request.user.username}'):
+                messages.error(request, "Insufficient balance in user wallet")
+                return redirect('core:dl_dashboard')
+            
+            # Credit to DL wallet
+            wallet_ops.dl_credit(request.user, amount, f'Withdrawal from {end_user.username}', related_user=end_user)
         
         messages.success(request, f'₹{amount} withdrawn from {end_user.username} successfully')
         return redirect('core:dl_dashboard')
@@ -2355,24 +1985,15 @@ def dl_add_user(request):
                 profile.save()
                 
                 # Create wallet
-                wallet, _ = Wallet.objects.get_or_create(user=user)
+                Wallet.objects.get_or_create(user=user)
                 
                 # Credit initial balance if provided
                 if initial_balance > 0:
-                    wallet.deposit(initial_balance)
-                    Transaction.objects.create(
-                        user=user,
-                        transaction_type='deposit',
-                        amount=initial_balance,
-                        balance_after=wallet.balance,
-                        description=f'Initial credit from DL {request.user.username}'
-                    )
+                    wallet_ops.credit(user, initial_balance, 'deposit', f'Initial credit from DL {request.user.username}')
                     
                     # Deduct from DL wallet
-                    dl_wallet, _ = DLWallet.objects.get_or_create(dl_user=request.user)
-                    if dl_wallet.balance >= initial_balance:
-                        dl_wallet.debit(initial_balance, f'Initial credit for {username}')
-                    else:
+                    if not wallet_ops.dl_debit(request.user, initial_balance, f'Initial credit for {username}',
+                                               related_user=user):
                         messages.warning(request, f'User created but insufficient DL balance to credit initial amount')
                 
                 messages.success(request, f'Client {username} created successfully')
@@ -3009,8 +2630,12 @@ def dl_match_detail(request, match_id):
 
 @login_required
 @require_http_methods(["POST"])
+@db_transaction.atomic
 def dl_place_match_bet(request, match_id):
-    """API endpoint to place a match bet from the dropdown"""
+    """
+    API endpoint to place a match bet from the dropdown.
+    Runs in one transaction, so a bet that fails part-way leaves no balance or wallet change.
+    """
     match = get_object_or_404(Match, id=match_id)
     
     # Check if user is DL or end user
@@ -3123,16 +2748,12 @@ def dl_place_match_bet(request, match_id):
             
             # Deduct remaining amount from wallet (if any)
             if remaining_stake > 0:
-                wallet.withdraw(remaining_stake)
+                if not wallet_ops.debit(user, remaining_stake, 'bet_placed',
+                                        f'Match bet: {bet_type.upper()} {selection} @ {odds} for match {match.id}'):
+                    # A concurrent bet spent the balance since the check above
+                    db_transaction.set_rollback(True)
+                    return JsonResponse({'success': False, 'error': 'Insufficient balance. Please add more funds to your wallet.'})
                 exposure_amount = remaining_stake
-                
-                Transaction.objects.create(
-                    user=user,
-                    transaction_type='bet_placed',
-                    amount=remaining_stake,
-                    balance_after=wallet.balance,
-                    description=f'Match bet: {bet_type.upper()} {selection} @ {odds} for match {match.id}'
-                )
             
             # Add to exposure only the amount deducted from wallet
             if exposure_amount > 0:
@@ -3285,6 +2906,7 @@ def dl_place_match_bet(request, match_id):
     except Exception as e:
         import traceback
         traceback.print_exc()
+        db_transaction.set_rollback(True)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
@@ -3292,95 +2914,18 @@ def dl_place_match_bet(request, match_id):
 @require_http_methods(["POST"])
 def settle_match_bets(request, match_id):
     """Settle all bets for a completed match and calculate winnings/losses"""
-    match = get_object_or_404(Match, id=match_id)
-    
-    if match.status != 'completed':
-        return JsonResponse({'success': False, 'error': 'Match is not completed yet'})
-    
-    if match.is_settled:
-        return JsonResponse({'success': False, 'error': 'Match bets have already been settled'})
-    
-    if not match.winner:
-        return JsonResponse({'success': False, 'error': 'Match winner must be set before settling bets'})
+    match = get_object_or_404(Match.objects.select_related('team_a', 'team_b', 'winner'), id=match_id)
     
     try:
-        with db_transaction.atomic():
-            # Get all users with exposure for this match
-            exposures = MatchUserExposure.objects.filter(match=match, is_settled=False)
-            
-            for exposure in exposures:
-                user = exposure.user
-                
-                # Get all balances for this user in this match
-                balances = MatchBetBalance.objects.filter(match=match, user=user)
-                
-                # Calculate total profit/loss based on winner
-                total_pnl = Decimal('0.00')
-                
-                for balance in balances:
-                    # Skip session bets for now - they need separate logic
-                    if balance.bet_type == 'session':
-                        continue
-                    
-                    # Check if this selection is the winner
-                    selection_won = (balance.selection == match.winner.name)
-                    
-                    if selection_won:
-                        # Selection won
-                        if balance.balance > 0:
-                            # User backed the winner - they win the profit
-                            total_pnl += balance.balance
-                        elif balance.balance < 0:
-                            # User laid the winner - they lose the liability
-                            total_pnl += balance.balance  # balance is already negative
-                    else:
-                        # Selection lost
-                        if balance.balance > 0:
-                            # User backed the loser - they lose (stake was already deducted)
-                            total_pnl -= abs(balance.balance)
-                        elif balance.balance < 0:
-                            # User laid the loser - they win the stake
-                            total_pnl += abs(balance.balance)
-                
-                # Update wallet for end users only
-                from accounts.models import UserProfile
-                if hasattr(user, 'profile') and user.profile.user_type == 'end_user':
-                    wallet, _ = Wallet.objects.get_or_create(user=user)
-                    
-                    if total_pnl > 0:
-                        # User won - add winnings to wallet
-                        wallet.deposit(total_pnl)
-                        Transaction.objects.create(
-                            user=user,
-                            transaction_type='bet_won',
-                            amount=total_pnl,
-                            balance_after=wallet.balance,
-                            description=f'Match bet winnings for {match.team_a.name} vs {match.team_b.name} - Winner: {match.winner.name}'
-                        )
-                    elif total_pnl < 0:
-                        # User lost - stake was already deducted, just record the loss
-                        Transaction.objects.create(
-                            user=user,
-                            transaction_type='bet_lost',
-                            amount=abs(total_pnl),
-                            balance_after=wallet.balance,
-                            description=f'Match bet loss for {match.team_a.name} vs {match.team_b.name} - Winner: {match.winner.name}'
-                        )
-                
-                # Mark exposure as settled
-                exposure.is_settled = True
-                exposure.save()
-            
-            # Mark match as settled
-            match.is_settled = True
-            match.save()
-            
-            return JsonResponse({'success': True, 'message': 'Match bets settled successfully'})
-            
+        settlement.settle_match_bets(match)
+    except settlement.SettlementError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    
+    return JsonResponse({'success': True, 'message': 'Match bets settled successfully'})
 
 
 @login_required
@@ -3415,4 +2960,19 @@ def dl_get_match_balances(request, match_id):
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return JsonResponse({'success': False, 'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@staff_member_required
+def provider_status(request):
+    """Circuit breaker state of each score provider (staff only)"""
+    from .services import circuit_breaker, cricket_api, odds_api, entitysport_api
+    
+    providers = [entitysport_api.provider, cricket_api.provider, odds_api.provider]
+    status = circuit_breaker.status(providers)
+    for provider, state in status.items():
+        state['config'] = circuit_breaker.get_config(provider)
+        if state['state'] == 'open' and state['opened_at']:
+            state['retry_in'] = max(0, round(state['config']['reset_timeout'] - (timezone.now().timestamp() - state['opened_at']), 1))
+    
+    return JsonResponse({'providers': status})
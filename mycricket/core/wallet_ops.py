@@ -0,0 +1,117 @@
+"""
+Atomic wallet mutations.
+
+Every balance change is a single conditional UPDATE (balance = balance + x,
+or balance = balance - x WHERE balance >= x), followed by an immediate
+re-read of the new balance and the matching Transaction / DLTransaction row,
+all in one database transaction. Balances are never written back from an
+instance loaded earlier, so concurrent bets, approvals and settlements
+cannot lose each other's updates.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Wallet, Transaction, DLWallet, DLTransaction
+
+
+def _apply(model, lookup, amount, totals=()):
+    """
+    Add amount (negative to take money out) to the balance of the wallet matching lookup;
+    money is only taken out if the balance covers it. totals: running-total fields that
+    grow by the absolute amount. Returns the new balance, or None if no row was updated.
+    The UPDATE locks the row until the surrounding transaction ends, so the re-read
+    returns exactly this change's result.
+    """
+    rows = model.objects.filter(**lookup)
+    guarded = rows.filter(balance__gte=-amount) if amount < 0 else rows
+    changes = {field: F(field) + abs(amount) for field in totals}
+    if not guarded.update(balance=F('balance') + amount, updated_at=timezone.now(), **changes):
+        return None
+    return rows.values_list('balance', flat=True).get()
+
+
+def change_balance(wallet, amount):
+    """
+    Apply amount to a Wallet or DLWallet instance's row and set the instance's balance
+    to the result. Returns False (nothing changed) if a debit is not covered.
+    No transaction row is written; see credit/debit for that.
+    """
+    with transaction.atomic():
+        balance = _apply(type(wallet), {'pk': wallet.pk}, amount)
+    if balance is None:
+        return False
+    wallet.balance = balance
+    return True
+
+
+def credit(user, amount, transaction_type='deposit', description=None):
+    """Add amount to the user's wallet (created if missing); returns the Transaction recording it"""
+    with transaction.atomic():
+        balance = _apply(Wallet, {'user': user}, amount)
+        if balance is None:
+            # No wallet yet
+            Wallet.objects.bulk_create([Wallet(user=user)], ignore_conflicts=True)
+            balance = _apply(Wallet, {'user': user}, amount)
+        return Transaction.objects.create(
+            user=user,
+            transaction_type=transaction_type,
+            amount=amount,
+            balance_after=balance,
+            description=description
+        )
+
+
+def debit(user, amount, transaction_type='withdrawal', description=None):
+    """
+    Take amount from the user's wallet if its balance covers it.
+    Returns the Transaction recording it, or None (nothing written) if funds are insufficient.
+    """
+    with transaction.atomic():
+        balance = _apply(Wallet, {'user': user}, -amount)
+        if balance is None:
+            return None
+        return Transaction.objects.create(
+            user=user,
+            transaction_type=transaction_type,
+            amount=amount,
+            balance_after=balance,
+            description=description
+        )
+
+
+def dl_credit(dl_user, amount, description, related_user=None):
+    """Credit a DL wallet (created if missing), counted in total_credited; returns the DLTransaction"""
+    with transaction.atomic():
+        balance = _apply(DLWallet, {'dl_user': dl_user}, amount, totals=['total_credited'])
+        if balance is None:
+            DLWallet.objects.bulk_create([DLWallet(dl_user=dl_user)], ignore_conflicts=True)
+            balance = _apply(DLWallet, {'dl_user': dl_user}, amount, totals=['total_credited'])
+        return DLTransaction.objects.create(
+            dl_user=dl_user,
+            transaction_type='credit',
+            amount=amount,
+            balance_after=balance,
+            description=description,
+            related_user=related_user
+        )
+
+
+def dl_debit(dl_user, amount, description, distributed=True, related_user=None):
+    """
+    Debit a DL wallet if its balance covers it. distributed: money passed on to an end user
+    (counted in total_distributed) rather than withdrawn by the Master DL.
+    Returns the DLTransaction, or None (nothing written) if funds are insufficient.
+    """
+    with transaction.atomic():
+        balance = _apply(DLWallet, {'dl_user': dl_user}, -amount, totals=['total_distributed'] if distributed else ())
+        if balance is None:
+            return None
+        return DLTransaction.objects.create(
+            dl_user=dl_user,
+            transaction_type='debit',
+            amount=amount,
+            balance_after=balance,
+            description=description,
+            related_user=related_user
+        )
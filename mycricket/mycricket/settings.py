@@ -89,6 +89,27 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by all web workers and management commands (provider responses, locks).
+# Uses Redis when REDIS_URL is set, otherwise a database table
+# (run `python manage.py createcachetable` once after migrate).
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cricket_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -176,6 +197,81 @@ ENTITYSPORT_API_BASE_URL = os.environ.get('ENTITYSPORT_API_BASE_URL', 'https://r
 ODDS_API_KEY = os.environ.get('ODDS_API_KEY', '5218daaaf239f6111130008841138480')
 ODDS_API_BASE_URL = os.environ.get('ODDS_API_BASE_URL', 'https://api.the-odds-api.com/v4')
 
+# Provider HTTP transport (core.services.ProviderTransport)
+# One pooled keep-alive session per provider; 'default' applies to all providers
+PROVIDER_HTTP = {
+    'default': {
+        'pool_connections': int(os.environ.get('PROVIDER_HTTP_POOL_CONNECTIONS', 4)),
+        'pool_maxsize': int(os.environ.get('PROVIDER_HTTP_POOL_MAXSIZE', 10)),
+        'timeout': int(os.environ.get('PROVIDER_HTTP_TIMEOUT', 10)),
+        # Max requests in flight per provider per process (caps sync_matches --workers)
+        'max_concurrency': int(os.environ.get('PROVIDER_HTTP_MAX_CONCURRENCY', 4)),
+    },
+    'entitysport': {
+        'timeout': int(os.environ.get('ENTITYSPORT_HTTP_TIMEOUT', 30)),
+    },
+}
+
+# Provider circuit breakers (core.services.CircuitBreaker), state shared through the cache
+# A provider is skipped for 'reset_timeout' seconds after 'failure_threshold' consecutive
+# failures (errors, 5xx, or responses slower than 'latency_threshold' seconds)
+PROVIDER_CIRCUIT_BREAKER = {
+    'default': {
+        'failure_threshold': int(os.environ.get('PROVIDER_BREAKER_FAILURES', 5)),
+        'latency_threshold': float(os.environ.get('PROVIDER_BREAKER_LATENCY', 5)),
+        'reset_timeout': int(os.environ.get('PROVIDER_BREAKER_RESET', 30)),
+    },
+}
+
+# Provider rate limits (core.services.RateLimiter), shared by all processes through the cache
+# 'rate': requests per second, 'burst': requests that may be sent at once after idling
+PROVIDER_RATE_LIMITS = {
+    'entitysport': {
+        'rate': float(os.environ.get('ENTITYSPORT_RATE_LIMIT', 5)),
+        'burst': int(os.environ.get('ENTITYSPORT_RATE_BURST', 10)),
+    },
+}
+
+# sync_matches --daemon: seconds between polls of one match, by match state
+# (imminent = starts within the hour, today = within 24 hours); 'discovery' is how
+# often the fixture lists are re-fetched to find new matches
+MATCH_POLL_INTERVALS = {
+    'live': int(os.environ.get('MATCH_POLL_LIVE', 10)),
+    'imminent': 60,
+    'today': 10 * 60,
+    'upcoming': 60 * 60,
+    'discovery': int(os.environ.get('MATCH_POLL_DISCOVERY', 10 * 60)),
+}
+
+# Provider record/replay (core.services.ProviderFixtures) for offline load testing
+# 'live': normal requests, 'record': also save every response to PROVIDER_FIXTURE_DIR,
+# 'replay': serve the saved responses only, PROVIDER_REPLAY_SPEED times faster than recorded
+PROVIDER_HTTP_MODE = os.environ.get('PROVIDER_HTTP_MODE', 'live')
+PROVIDER_FIXTURE_DIR = os.environ.get('PROVIDER_FIXTURE_DIR', BASE_DIR / 'provider_fixtures')
+PROVIDER_REPLAY_SPEED = float(os.environ.get('PROVIDER_REPLAY_SPEED', 1))
+
+# Session page Server-Sent Events (core.session_events), used when served through ASGI
+# and only with the Redis cache (REDIS_URL): with the DatabaseCache every open stream
+# would query the database each check_interval, so the page polls instead
+# 'check_interval': seconds between cache checks for events published by other processes
+# 'enabled': False turns the streams off even with Redis
+SESSION_EVENTS = {
+    'enabled': os.environ.get('SESSION_EVENTS_ENABLED', 'True') == 'True',
+    'check_interval': int(os.environ.get('SESSION_EVENTS_CHECK_INTERVAL', 5)),
+    'keepalive': 15,
+    'max_age': 300,
+}
+
+# Provider response cache (core.services.ProviderCache), in seconds
+# 'ttl': how long an entry is fresh; 'stale': how long it may still be served
+# after that while one background refresh runs
+PROVIDER_CACHE = {
+    'squads': {'ttl': 6 * 60 * 60, 'stale': 24 * 60 * 60},
+    'live': {'ttl': int(os.environ.get('PROVIDER_CACHE_LIVE_TTL', 5)), 'stale': 60},
+    'score': {'ttl': int(os.environ.get('PROVIDER_CACHE_SCORE_TTL', 10)), 'stale': 120},
+    'sports': {'ttl': 6 * 60 * 60, 'stale': 24 * 60 * 60},
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,